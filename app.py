@@ -1,8 +1,14 @@
 import streamlit as st
-from jd_agent.agent import agent
+from jd_agent.agent import get_agent
+from jd_agent.utils.logger import new_run_id
+from jd_agent.utils.fields import format_user_input, regeneration_inputs
+from jd_agent.utils.renderer import SECTION_HEADINGS
+from jd_agent.utils.state import plain_result
+from jd_agent.utils.streaming import STREAMED_NODES, branch_path, stream_events
 from dotenv import load_dotenv
 import os
 import json
+import time
 
 load_dotenv()
 
@@ -22,6 +28,18 @@ st.set_page_config(page_title="JD Generator Agent", layout="wide", page_icon="
 st.title("📄 AI-Powered Job Description Generator")
 st.write("Fill in the details below and let our AI agent generate a professional, ATS-ready job description.")
 
+# Status line shown while each graph node runs
+NODE_STATUS = {
+    "validation": "✔️ Validating input...",
+    "draft": "✍️ Drafting job description...",
+    "adapt": "🔁 Adapting a similar past job description...",
+    "quality_check": "📊 Running quality check...",
+    "rewrite": "🔄 Rewriting draft...",
+    "review": "👁️ Reviewing for ATS readiness...",
+    "final_output": "🎯 Formatting final outputs...",
+    "regenerate": "♻️ Regenerating changed sections...",
+}
+
 # ---------------------------------------------------------------
 # SIDEBAR INPUT FIELDS
 # ---------------------------------------------------------------
@@ -71,37 +89,92 @@ if generate_btn:
         st.stop()
 
     # Prepare user input
-    user_input = f"""
-    Client: {client}
-    Job ID: {job_id}
-    Job Title: {job_title}
-    Description: {description}
-    Department: {department}
-    Experience: {experience}
-    Relevant Experience: {relevant_exp}
-    Skills: {skills}
-    Max Salary: {salary}
-    Work Mode: {work_mode}
-    Location: {location}
-    Employment Type: {employment_type}
-    Positions Filled: {positions_filled}
-    Education: {education}
-    """
+    fields = {
+        "client": client,
+        "job_id": job_id,
+        "job_title": job_title,
+        "description": description,
+        "department": department,
+        "experience": experience,
+        "relevant_experience": relevant_exp,
+        "skills": skills,
+        "max_salary": salary,
+        "work_mode": work_mode,
+        "location": location,
+        "employment_type": employment_type,
+        "positions_filled": positions_filled,
+        "education": education,
+    }
+    user_input = format_user_input(fields)
+
+    # A small edit to the last generated JD only regenerates the sections it affects
+    previous = st.session_state.get("last_run")
+    inputs = regeneration_inputs(previous["result"], previous["fields"], fields) if previous else None
+    if inputs is None:
+        inputs = {"user_input": user_input}
 
     # Progress tracking
     progress_bar = st.progress(0)
     status_text = st.empty()
+    live_header = st.empty()
+    live_output = st.empty()
+
+    # Built once per process on the first generation, not on every rerun
+    agent = get_agent()
+    from jd_agent.utils.checkpoint import thread_config
+    from jd_agent.utils.scheduler import llm_priority
+
+    # Progress follows the nodes of the branch this run takes as they start and finish
+    stages = branch_path(inputs)
     
     try:
         status_text.text("🔄 Initializing AI agent...")
-        progress_bar.progress(10)
         
-        status_text.text("✔️ Validating input...")
-        progress_bar.progress(20)
+        result = {}
+        progress = 0
+        # One buffer per LLM call, so parallel section rewrites do not interleave
+        streams = {}
+        last_render = 0.0
+        
+        # Run the agent, streaming node transitions and draft/review tokens
+        # Each generation is its own checkpoint thread (when checkpointing is on)
+        run_id = new_run_id()
+        # A user is waiting: these calls go ahead of queued batch work
+        with llm_priority("interactive"):
+            for event in stream_events(agent, {**inputs, "run_id": run_id},
+                                       config=thread_config(run_id)):
+                kind = event[0]
+            
+                if kind == "start":
+                    node = event[1]
+                    if node not in stages:
+                        stages = branch_path(node=node)
+                    status_text.text(NODE_STATUS.get(node, f"⏳ Running {node}..."))
+                    if node in STREAMED_NODES:
+                        streams = {}
+                        live_header.markdown(f"#### {NODE_STATUS[node]}")
+                        live_output.empty()
+            
+                elif kind == "token":
+                    streams[event[3]] = streams.get(event[3], "") + event[2]
+                    # Re-rendering markdown per token is slow; refresh ~10x per second
+                    if time.monotonic() - last_render > 0.1:
+                        live_output.markdown("\n\n".join(streams.values()))
+                        last_render = time.monotonic()
+            
+                elif kind == "end":
+                    node = event[1]
+                    if node in stages:
+                        progress = max(progress, int(100 * (stages.index(node) + 1) / len(stages)))
+                        progress_bar.progress(progress)
+                    if node in STREAMED_NODES:
+                        live_output.markdown("\n\n".join(streams.values()))
+            
+                else:
+                    result = plain_result(event[1] or {})
         
-        # Run the agent
-        with st.spinner("⏳ AI agent is working on your job description..."):
-            result = agent.invoke({"user_input": user_input})
+        live_header.empty()
+        live_output.empty()
         
         # Check if validation failed
         if result.get("validation_result") and not result.get("validation_result").upper().startswith("VALID"):
@@ -113,15 +186,27 @@ if generate_btn:
         
         progress_bar.progress(100)
         status_text.text("✅ Job Description Generated Successfully!")
+        st.session_state["last_run"] = {"fields": fields, "result": result}
+        if inputs.get("regenerate"):
+            st.info(f"♻️ Updated the previous JD — regenerated only: "
+                    f"{', '.join(SECTION_HEADINGS[key] for key in inputs['regenerate'])}")
         
         # Extract results
         final_markdown = result.get("final_markdown", "No output generated")
         final_json = result.get("final_json", "{}")
         final_text = result.get("final_text", "No output generated")
-        quality_check = result.get("quality_check", "{}")
+        quality_data = result.get("quality_check")
         rewrite_attempts = result.get("rewrite_attempts", 0)
 
         st.success("🎉 Your job description is ready!")
+
+        # Steps the run skipped or did locally to stay within its token/cost budget
+        budget = result.get("budget") or {}
+        degraded = [step for step in budget.get("degraded", []) if step != "input"]
+        if "input" in budget.get("degraded", []):
+            st.warning("✂️ The input was too long and has been truncated")
+        if degraded:
+            st.warning(f"💸 The run budget was reached — skipped or rendered locally: {', '.join(degraded)}")
         
         # ---------------------------------------------------------------
         # TABS FOR DIFFERENT VIEWS
@@ -181,9 +266,8 @@ if generate_btn:
             
             # Quality Check Results
             with st.expander("📊 Quality Check Results", expanded=True):
-                try:
-                    quality_data = json.loads(quality_check)
-                    
+                # quality_check arrives already parsed (QualityScore fields)
+                if quality_data:
                     col1, col2, col3 = st.columns(3)
                     with col1:
                         st.metric("Overall Score", f"{quality_data.get('score', 0)}/100")
@@ -191,7 +275,7 @@ if generate_btn:
                         st.metric("Status", "✅ PASS" if quality_data.get('pass') else "❌ FAIL")
                     with col3:
                         st.metric("Rewrite Attempts", rewrite_attempts)
-                    
+                
                     st.markdown("#### Detailed Scores")
                     col1, col2 = st.columns(2)
                     with col1:
@@ -200,23 +284,58 @@ if generate_btn:
                     with col2:
                         st.metric("Realism", f"{quality_data.get('realism_score', 0)}/25")
                         st.metric("Clarity", f"{quality_data.get('clarity_score', 0)}/20")
-                    
+                
                     if quality_data.get('issues'):
                         st.markdown("#### Issues Identified")
                         for issue in quality_data.get('issues', []):
                             st.warning(issue)
-                            
-                except:
-                    st.text(quality_check)
+                elif inputs.get("regenerate"):
+                    st.info("♻️ Only the edited sections were regenerated — the quality loop did not run")
+                elif result.get("reference_similarity") is not None:
+                    st.info(
+                        f"🔁 Adapted from a similar past job description "
+                        f"({result['reference_similarity']:.0%} input match) — no quality loop was needed"
+                    )
+                else:
+                    st.warning("⚠️ The quality check result could not be parsed")
             
             # Rewrite History
             with st.expander("🔄 Rewrite History"):
                 if rewrite_attempts > 0:
                     st.warning(f"The draft was rewritten {rewrite_attempts} time(s) to meet quality standards.")
                     st.info("Each rewrite addressed specific issues identified in the quality check.")
+
+                    history = result.get("score_history") or []
+                    if history:
+                        st.table([
+                            {
+                                "Attempt": record["attempt"],
+                                "Score": record["score"],
+                                "Passed": "✅" if record["passed"] else "❌",
+                                "Source": record["source"],
+                                "Elapsed (s)": record["elapsed_s"],
+                            }
+                            for record in history
+                        ])
+                    best_score = result.get("best_score")
+                    if (best_score is not None and history and result.get("best_source") == history[-1]["source"]
+                            and best_score > history[-1]["score"]):
+                        st.info(f"↩️ The last rewrite scored lower — the best draft ({best_score}/100) was reviewed instead.")
+                elif inputs.get("regenerate"):
+                    st.info("No rewrites: the previous JD was updated in place.")
                 else:
                     st.success("Draft passed quality check on first attempt! No rewrites needed.")
             
+            # Token usage
+            with st.expander("💰 Token Usage"):
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.metric("Prompt Tokens", budget.get("prompt_tokens", 0))
+                with col2:
+                    st.metric("Completion Tokens", budget.get("completion_tokens", 0))
+                with col3:
+                    st.metric("Estimated Cost", f"${budget.get('cost_usd', 0.0):.4f}")
+
             # Validation
             with st.expander("✅ Input Validation"):
                 validation_result = result.get("validation_result", "Unknown")
@@ -0,0 +1,52 @@
+"""Result records shared by the benchmarks: one JSON line per invocation."""
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+
+def git_rev():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def make_record(benchmark, config, results, label=None):
+    return {
+        "benchmark": benchmark,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_rev": git_rev(),
+        "label": label,
+        "python": platform.python_version(),
+        "config": config,
+        "results": results,
+    }
+
+
+def load_baseline(path):
+    """Last record of a results file, or None if there is none yet."""
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        lines = [line for line in f if line.strip()]
+    return json.loads(lines[-1]) if lines else None
+
+
+def append_record(path, record):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+    print(f"\n💾 Results appended to {path}", file=sys.stderr)
+
+
+def change(before, after):
+    """Relative change as a signed percentage string."""
+    if not before or after is None:
+        return "n/a"
+    return f"{(after - before) / before * 100:+.1f}%"
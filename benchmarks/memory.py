@@ -0,0 +1,167 @@
+"""
+Memory benchmark: many JD runs in flight at once on the offline FakeJDModel.
+
+    python -m benchmarks.memory
+    python -m benchmarks.memory -n 1000 -d 0,3 --compare .benchmarks/memory.jsonl
+
+All runs are started together on one event loop, so every run's state is
+alive at the same time. Python allocations are traced (tracemalloc), which
+slows the runs down: compare memory across records, not latency.
+"""
+from benchmarks.common import append_record, change, load_baseline, make_record
+from benchmarks.pipeline import BENCH_INPUT
+import argparse
+import asyncio
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+# Same settings as the pipeline benchmark (read at import time)
+os.environ.setdefault("JD_AGENT_CACHE", "0")
+os.environ.setdefault("JD_AGENT_PRESCORE", "0")
+
+DEFAULT_OUTPUT = ".benchmarks/memory.jsonl"
+
+
+def _ints(value):
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def _rss_kb():
+    """Current resident set size in KB (Linux), or None."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError):
+        return None
+
+
+def _deep_size(value, seen=None):
+    """Bytes held by a result: containers, strings and model fields, each object once."""
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_deep_size(k, seen) + _deep_size(v, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set)):
+        size += sum(_deep_size(item, seen) for item in value)
+    elif hasattr(value, "__pydantic_fields__"):
+        size += sum(_deep_size(getattr(value, name), seen) for name in type(value).__pydantic_fields__)
+    return size
+
+
+def run_cell(agent, fake, runs, depth):
+    """Start `runs` JDs at once with `depth` rewrites each; returns one result row."""
+    from jd_agent.utils.fields import format_user_input
+
+    inputs = {"user_input": format_user_input(BENCH_INPUT)}
+    fake.rewrite_depth = depth
+    fake.reset()
+
+    async def all_runs():
+        return await asyncio.gather(*(agent.ainvoke(inputs) for _ in range(runs)), return_exceptions=True)
+
+    gc.collect()
+    rss_before = _rss_kb()
+    tracemalloc.start()
+    traced_before, _ = tracemalloc.get_traced_memory()
+    started = time.perf_counter()
+
+    results = asyncio.run(all_runs())
+
+    wall = time.perf_counter() - started
+    traced_after, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_after = _rss_kb()
+
+    ok = [result for result in results if not isinstance(result, BaseException)]
+    peak_kb = (traced_peak - traced_before) / 1024
+    return {
+        "runs": runs,
+        "rewrite_depth": depth,
+        "errors": runs - len(ok),
+        "wall_s": round(wall, 3),
+        "peak_kb": round(peak_kb, 1),
+        "peak_kb_per_run": round(peak_kb / runs, 2),
+        "retained_kb": round((traced_after - traced_before) / 1024, 1),
+        "result_kb_per_run": round(sum(map(_deep_size, ok)) / 1024 / max(1, len(ok)), 2),
+        "rss_growth_kb": rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+    }
+
+
+def print_table(record, baseline=None):
+    previous = {(row["runs"], row["rewrite_depth"]): row for row in baseline["results"]} if baseline else {}
+
+    header = f"{'runs':>5} {'depth':>5} {'err':>4} {'wall s':>7} {'peak MB':>8} {'KB/run':>7} {'result KB':>9}"
+    if previous:
+        header += f" {'Δ peak':>8} {'Δ result':>9}"
+    print(header)
+
+    for row in record["results"]:
+        line = (
+            f"{row['runs']:>5} {row['rewrite_depth']:>5} {row['errors']:>4} {row['wall_s']:>7.2f} "
+            f"{row['peak_kb'] / 1024:>8.1f} {row['peak_kb_per_run']:>7.1f} {row['result_kb_per_run']:>9.1f}"
+        )
+        before = previous.get((row["runs"], row["rewrite_depth"]))
+        if before:
+            line += (
+                f" {change(before['peak_kb'], row['peak_kb']):>8}"
+                f" {change(before['result_kb_per_run'], row['result_kb_per_run']):>9}"
+            )
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Measure the memory of many concurrent JD runs on the offline fake LLM."
+    )
+    parser.add_argument("-n", "--runs", type=_ints, default=[1000],
+                        help="Comma-separated numbers of runs started at once (default: 1000)")
+    parser.add_argument("-d", "--depths", type=_ints, default=[0, 3],
+                        help="Comma-separated rewrite-loop depths (default: 0,3)")
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="Fake LLM seconds before the first token (default: 0.05)")
+    parser.add_argument("--label", default=None, help="Free-form note stored with the results")
+    parser.add_argument("-o", "--output", default=DEFAULT_OUTPUT,
+                        help=f"JSONL file results are appended to (default: {DEFAULT_OUTPUT})")
+    parser.add_argument("--compare", metavar="PATH",
+                        help="Show the change against the last record in PATH")
+    args = parser.parse_args(argv)
+
+    baseline = load_baseline(args.compare)
+
+    from jd_agent.agent import get_agent
+    from jd_agent.utils.fake_llm import FakeJDModel
+    from jd_agent.utils.llm import use_llm
+
+    agent = get_agent()
+    fake = FakeJDModel(latency=args.latency)
+    results = []
+    with use_llm(fake):
+        # One small warm-up run, so imports and caches are not counted
+        run_cell(agent, fake, 2, 0)
+        for depth in args.depths:
+            for runs in args.runs:
+                results.append(run_cell(agent, fake, runs, depth))
+
+    config = {
+        "latency_s": args.latency,
+        "cache": os.environ["JD_AGENT_CACHE"],
+        "prescore": os.environ["JD_AGENT_PRESCORE"],
+        "checkpoint": os.getenv("JD_AGENT_CHECKPOINT", "0"),
+    }
+    record = make_record("memory", config, results, label=args.label)
+
+    print_table(record, baseline)
+
+    append_record(args.output, record)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
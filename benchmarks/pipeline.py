@@ -0,0 +1,243 @@
+"""
+End-to-end throughput/latency benchmark of jd_agent.agent.agent on the
+offline FakeJDModel (no API calls, no cost).
+
+    python -m benchmarks.pipeline
+    python -m benchmarks.pipeline -c 1,8,32 -d 0,3 --latency 0.2 --compare .benchmarks/pipeline.jsonl
+
+Each invocation appends one JSON line (config + one row per
+concurrency/rewrite-depth cell) to the output file, so runs from different
+commits can be compared with --compare.
+"""
+from benchmarks.common import append_record, change, load_baseline, make_record
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+# Benchmarks measure the pipeline, not the response cache or the pre-scorer;
+# both read their settings at import time
+os.environ.setdefault("JD_AGENT_CACHE", "0")
+os.environ.setdefault("JD_AGENT_PRESCORE", "0")
+
+DEFAULT_OUTPUT = ".benchmarks/pipeline.jsonl"
+
+BENCH_INPUT = {
+    "client": "TechCorp",
+    "job_id": "BENCH-001",
+    "job_title": "Senior Python Developer",
+    "department": "Engineering",
+    "experience": "6+ years",
+    "skills": "Python, FastAPI, AWS, Docker, PostgreSQL, Redis",
+    "work_mode": "Hybrid",
+    "location": "Bangalore, India",
+    "employment_type": "Full-time",
+    "education": "Bachelor's in Computer Science or related field",
+}
+
+
+def _ints(value):
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def _latency_stats(samples):
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+
+    def pct(q):
+        return ordered[min(len(ordered) - 1, round(q * (len(ordered) - 1)))]
+
+    return {
+        "mean": round(statistics.fmean(ordered), 2),
+        "p50": round(pct(0.5), 2),
+        "p95": round(pct(0.95), 2),
+        "p99": round(pct(0.99), 2),
+    }
+
+
+# ---------------------------------------------------------------
+# RUNNERS
+# ---------------------------------------------------------------
+def _run_sync(agent, inputs, runs, concurrency):
+    def one(_):
+        started = time.perf_counter()
+        try:
+            agent.invoke(inputs)
+            return (time.perf_counter() - started) * 1000, None
+        except Exception as e:
+            return (time.perf_counter() - started) * 1000, e
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(one, range(runs)))
+
+
+async def _run_async(agent, inputs, runs, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await agent.ainvoke(inputs)
+                return (time.perf_counter() - started) * 1000, None
+            except Exception as e:
+                return (time.perf_counter() - started) * 1000, e
+
+    return await asyncio.gather(*(one() for _ in range(runs)))
+
+
+def run_cell(agent, fake, mode, concurrency, depth, runs, fast=None):
+    """
+    Run `runs` JDs at `concurrency` with `depth` rewrites each; returns one
+    result row. `fast` is the fake serving the fast model tier, if separate.
+    """
+    from jd_agent.utils.fields import format_user_input
+    from jd_agent.utils.metrics import registry
+
+    inputs = {"user_input": format_user_input(BENCH_INPUT)}
+    fakes = [fake] if fast is None else [fake, fast]
+    for model in fakes:
+        model.rewrite_depth = depth
+        model.reset()
+    registry.reset()
+
+    started = time.perf_counter()
+    if mode == "async":
+        outcomes = asyncio.run(_run_async(agent, inputs, runs, concurrency))
+    else:
+        outcomes = _run_sync(agent, inputs, runs, concurrency)
+    wall = time.perf_counter() - started
+
+    latencies = [ms for ms, error in outcomes if error is None]
+    errors = [error for _, error in outcomes if error is not None]
+    calls = Counter()
+    for model in fakes:
+        calls.update(model.calls)
+    nodes = registry.snapshot().values()
+    prompt_tokens = sum(node["prompt_tokens"] for node in nodes)
+    cached_tokens = sum(node["cached_tokens"] for node in nodes)
+
+    return {
+        "mode": mode,
+        "concurrency": concurrency,
+        "rewrite_depth": depth,
+        "runs": runs,
+        "errors": len(errors),
+        "wall_s": round(wall, 3),
+        "throughput_per_s": round(len(latencies) / wall, 3) if wall else 0.0,
+        "latency_ms": _latency_stats(latencies),
+        "llm_calls_per_run": round(sum(calls.values()) / runs, 2),
+        "llm_calls": dict(calls),
+        "cached_token_ratio": round(cached_tokens / prompt_tokens, 4) if prompt_tokens else 0.0,
+    }
+
+
+# ---------------------------------------------------------------
+# REPORTING
+# ---------------------------------------------------------------
+def _cell_key(row):
+    return (row["mode"], row["concurrency"], row["rewrite_depth"])
+
+
+def print_table(record, baseline=None):
+    previous = {_cell_key(row): row for row in baseline["results"]} if baseline else {}
+
+    header = f"{'mode':<6} {'conc':>5} {'depth':>5} {'runs':>5} {'err':>4} {'JD/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'calls':>6} {'cached':>7}"
+    if previous:
+        header += f" {'Δ JD/s':>8} {'Δ p95':>8}"
+    print(header)
+
+    for row in record["results"]:
+        line = (
+            f"{row['mode']:<6} {row['concurrency']:>5} {row['rewrite_depth']:>5} {row['runs']:>5} "
+            f"{row['errors']:>4} {row['throughput_per_s']:>9.2f} {row['latency_ms'].get('p50', 0):>9.1f} "
+            f"{row['latency_ms'].get('p95', 0):>9.1f} {row['llm_calls_per_run']:>6.1f} "
+            f"{row.get('cached_token_ratio', 0):>7.1%}"
+        )
+        before = previous.get(_cell_key(row))
+        if before:
+            line += (
+                f" {change(before['throughput_per_s'], row['throughput_per_s']):>8}"
+                f" {change(before['latency_ms'].get('p95'), row['latency_ms'].get('p95')):>8}"
+            )
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the JD pipeline end to end on the offline fake LLM."
+    )
+    parser.add_argument("-c", "--concurrency", type=_ints, default=[1, 4, 16],
+                        help="Comma-separated concurrency levels (default: 1,4,16)")
+    parser.add_argument("-d", "--depths", type=_ints, default=[0, 1, 3],
+                        help="Comma-separated rewrite-loop depths (default: 0,1,3)")
+    parser.add_argument("-n", "--runs", type=int, default=None,
+                        help="JDs per cell (default: 4x concurrency, at least 8)")
+    parser.add_argument("--mode", choices=["async", "sync"], default="async",
+                        help="agent.ainvoke on one event loop, or agent.invoke on threads (default: async)")
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="Fake LLM seconds before the first token (default: 0.05)")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0,
+                        help="Fake LLM output token rate; 0 = instant (default: 0)")
+    parser.add_argument("--rewrite-mode", choices=["section", "full"], default=None,
+                        help="Override JD_AGENT_REWRITE_MODE (default: section)")
+    parser.add_argument("--structured-review", action="store_true",
+                        help="Single-shot structured review (JD_AGENT_STRUCTURED_REVIEW=1)")
+    parser.add_argument("--fast-latency", type=float, default=None,
+                        help="Serve the fast model tier (validation, quality check, "
+                             "conversions) from a second fake with this latency")
+    parser.add_argument("--label", default=None, help="Free-form note stored with the results")
+    parser.add_argument("-o", "--output", default=DEFAULT_OUTPUT,
+                        help=f"JSONL file results are appended to (default: {DEFAULT_OUTPUT})")
+    parser.add_argument("--compare", metavar="PATH",
+                        help="Show the change against the last record in PATH")
+    args = parser.parse_args(argv)
+
+    # Read before this run appends to the same file
+    baseline = load_baseline(args.compare)
+
+    if args.rewrite_mode:
+        os.environ["JD_AGENT_REWRITE_MODE"] = args.rewrite_mode
+    if args.structured_review:
+        os.environ["JD_AGENT_STRUCTURED_REVIEW"] = "1"
+
+    from jd_agent.agent import get_agent
+    from jd_agent.utils.fake_llm import FakeJDModel
+    from jd_agent.utils.llm import use_llm
+
+    agent = get_agent()
+    fake = FakeJDModel(latency=args.latency, tokens_per_second=args.tokens_per_second)
+    fast = None
+    if args.fast_latency is not None:
+        fast = FakeJDModel(latency=args.fast_latency, tokens_per_second=args.tokens_per_second)
+    results = []
+    with use_llm(fake), use_llm(fast or fake, tier="fast"):
+        for depth in args.depths:
+            for concurrency in args.concurrency:
+                runs = args.runs or max(8, 4 * concurrency)
+                results.append(run_cell(agent, fake, args.mode, concurrency, depth, runs, fast))
+
+    config = {
+        "mode": args.mode,
+        "latency_s": args.latency,
+        "tokens_per_second": args.tokens_per_second,
+        "cache": os.environ["JD_AGENT_CACHE"],
+        "prescore": os.environ["JD_AGENT_PRESCORE"],
+        "rewrite_mode": os.getenv("JD_AGENT_REWRITE_MODE", "section"),
+        "structured_review": os.getenv("JD_AGENT_STRUCTURED_REVIEW", "0"),
+        "fast_latency_s": args.fast_latency,
+    }
+    record = make_record("pipeline", config, results, label=args.label)
+
+    print_table(record, baseline)
+
+    append_record(args.output, record)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
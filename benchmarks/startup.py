@@ -0,0 +1,113 @@
+"""
+Cold start benchmark: import and build times in fresh interpreters.
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup -n 10 --compare .benchmarks/startup.jsonl
+
+Every target runs in a new `python -c` process (no warm module cache), so the
+numbers match what a CLI invocation or a fresh Streamlit worker pays.
+"""
+from benchmarks.common import append_record, change, load_baseline, make_record
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+DEFAULT_OUTPUT = ".benchmarks/startup.jsonl"
+
+# name -> code timed inside a fresh interpreter
+TARGETS = {
+    "import jd_agent": "import jd_agent",
+    "import jd_agent.agent": "import jd_agent.agent",
+    "import jd_agent.batch": "import jd_agent.batch",
+    "build agent": "from jd_agent.agent import get_agent; get_agent()",
+    "main.py --help": "import sys, runpy; sys.argv = ['main.py', '--help']; runpy.run_path('main.py', run_name='__main__')",
+}
+
+# Runs `code` and prints the elapsed milliseconds, excluding interpreter startup
+_HARNESS = """
+import contextlib, io, time
+started = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    try:
+        exec({code!r})
+    except SystemExit:
+        pass
+print((time.perf_counter() - started) * 1000)
+"""
+
+
+def time_target(code, repeat):
+    samples = []
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", _HARNESS.format(code=code)],
+            capture_output=True, text=True, check=True
+        ).stdout
+        samples.append(float(out.strip().splitlines()[-1]))
+    return {
+        "runs": repeat,
+        "min_ms": round(min(samples), 1),
+        "median_ms": round(statistics.median(samples), 1),
+        "max_ms": round(max(samples), 1),
+    }
+
+
+def heaviest_imports(code, top):
+    """Modules with the largest cumulative import time (python -X importtime)."""
+    err = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True
+    ).stderr
+    rows = []
+    for line in err.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            rows.append((int(parts[1]), parts[2].rstrip()))
+    rows.sort(reverse=True)
+    return [{"module": name.strip(), "cumulative_ms": round(us / 1000, 1)} for us, name in rows[:top]]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Measure cold import and agent build time in fresh interpreters."
+    )
+    parser.add_argument("-n", "--repeat", type=int, default=5,
+                        help="Fresh interpreters per target (default: 5)")
+    parser.add_argument("--top", type=int, default=0,
+                        help="Also list the N heaviest imports of `import jd_agent.agent`")
+    parser.add_argument("--label", default=None, help="Free-form note stored with the results")
+    parser.add_argument("-o", "--output", default=DEFAULT_OUTPUT,
+                        help=f"JSONL file results are appended to (default: {DEFAULT_OUTPUT})")
+    parser.add_argument("--compare", metavar="PATH",
+                        help="Show the change against the last record in PATH")
+    args = parser.parse_args(argv)
+
+    baseline = load_baseline(args.compare)
+    previous = {row["target"]: row for row in baseline["results"]} if baseline else {}
+
+    # The build target must not need credentials or touch the response cache
+    os.environ.setdefault("JD_AGENT_CACHE", "0")
+
+    print(f"{'target':<24} {'min ms':>9} {'median ms':>10} {'max ms':>9}" + (f" {'Δ median':>9}" if previous else ""))
+    results = []
+    for name, code in TARGETS.items():
+        row = {"target": name, **time_target(code, args.repeat)}
+        results.append(row)
+        line = f"{name:<24} {row['min_ms']:>9.1f} {row['median_ms']:>10.1f} {row['max_ms']:>9.1f}"
+        if name in previous:
+            line += f" {change(previous[name]['median_ms'], row['median_ms']):>9}"
+        print(line)
+
+    if args.top:
+        print(json.dumps(heaviest_imports("import jd_agent.agent", args.top), indent=2))
+
+    record = make_record("startup", {"repeat": args.repeat}, results, label=args.label)
+    append_record(args.output, record)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
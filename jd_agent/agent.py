@@ -1,29 +1,30 @@
-from langgraph.graph import StateGraph, START, END
 from jd_agent.utils.state import JDState
-from jd_agent.utils.nodes import (
-    validation_node,
-    draft_node,
-    quality_check_node,
-    rewrite_node,
-    review_node,
-    final_output_node
-)
-import json
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
 
 
 def should_proceed_after_validation(state: JDState):
     """
     Route after validation.
     Returns:
+        "regenerate" - if input is valid and only some sections of a previous JD changed
+        "adapt" - if input is valid and a similar past JD was found
         "draft" - if input is valid
         "end" - if input is invalid
     """
     if state.validation_result and state.validation_result.upper().startswith("VALID"):
-        print("✅ Input validated successfully. Proceeding to draft.")
+        if state.regenerate and state.reviewed:
+            logger.info("♻️ Input validated. Regenerating changed sections: %s", ", ".join(state.regenerate))
+            return "regenerate"
+        if state.reference_jd:
+            logger.info("✅ Input validated successfully. Adapting a similar past JD.")
+            return "adapt"
+        logger.info("✅ Input validated successfully. Proceeding to draft.")
         return "draft"
     else:
-        print(f"❌ Validation failed: {state.validation_result}")
-        print("⛔ Ending workflow due to invalid input.")
+        logger.warning("❌ Validation failed: %s — ending workflow.", state.validation_result)
         return "end"
 
 
@@ -31,87 +32,119 @@ def should_rewrite_or_review(state: JDState):
     """
     Route after quality check.
     Returns:
-        "rewrite" - if quality check fails and attempts < 3
-        "review" - if quality check passes or max attempts reached
+        "rewrite" - if quality check fails and the loop may continue
+        "review" - if quality check passes, or the loop hit its attempt cap,
+                   stopped improving or spent its time/token budget
     """
-    
-    # Prevent infinite loops
-    if state.rewrite_attempts >= 3:
-        print("⚠️ MAX REWRITE ATTEMPTS (3) REACHED — Proceeding to review.")
+    from jd_agent.utils.nodes import MAX_REWRITES, rewrite_stop_reason
+
+    check = state.quality_check
+
+    # The score is parsed in quality_check_node; an unparseable verdict is
+    # not evidence of a bad draft, so it never triggers a rewrite
+    if check is None:
+        logger.warning("⚠️ Quality check could not be parsed or was skipped — proceeding to review.")
+        return "review"
+
+    logger.info(
+        "📊 Quality check: %s/100 (structure %s/30, tone %s/25, realism %s/25, clarity %s/20)",
+        check.score, check.structure_score, check.tone_score, check.realism_score, check.clarity_score
+    )
+
+    if check.passed:
+        logger.info("✅ Quality check PASSED. Proceeding to review.")
         return "review"
-    
-    try:
-        # Clean and parse JSON
-        check_content = state.quality_check.strip()
-        
-        if check_content.startswith("```"):
-            lines = check_content.split("```")
-            if len(lines) >= 2:
-                check_content = lines[1]
-                if check_content.startswith("json"):
-                    check_content = check_content[4:]
-        
-        check_content = check_content.strip()
-        check = json.loads(check_content)
-        
-        score = check.get("score", 0)
-        passes = check.get("pass", False)
-        issues = check.get("issues", [])
-        
-        print(f"\n📊 Quality Check Results:")
-        print(f"   Score: {score}/100")
-        print(f"   Structure: {check.get('structure_score', 0)}/30")
-        print(f"   Tone: {check.get('tone_score', 0)}/25")
-        print(f"   Realism: {check.get('realism_score', 0)}/25")
-        print(f"   Clarity: {check.get('clarity_score', 0)}/20")
-        
-        if passes:
-            print("✅ Quality check PASSED. Proceeding to review.")
-            return "review"
-        else:
-            print(f"❌ Quality check FAILED. Issues: {', '.join(issues)}")
-            print(f"🔄 Rewrite attempt {state.rewrite_attempts + 1}/3")
-            return "rewrite"
-            
-    except json.JSONDecodeError as e:
-        print(f"⚠️ Failed to parse quality_check JSON: {e}")
-        print(f"Raw content (first 200 chars): {state.quality_check[:200]}")
-        
-        # Default: rewrite on first attempt, review after
-        if state.rewrite_attempts < 1:
-            print("🔄 Attempting rewrite due to parse error")
-            return "rewrite"
-        else:
-            print("⚠️ Parse error on retry - proceeding to review")
-            return "review"
-            
-    except Exception as e:
-        print(f"⚠️ Unexpected error in routing: {e}")
+
+    # Prevent infinite (and unprofitable) loops
+    reason = rewrite_stop_reason(state)
+    if reason:
+        logger.warning("⏹️ Rewrite loop stopped: %s — proceeding to review.", reason)
         return "review"
+    else:
+        logger.info(
+            "❌ Quality check FAILED. Issues: %s — rewrite attempt %s/%s",
+            ", ".join(check.issues), state.rewrite_attempts + 1, MAX_REWRITES
+        )
+        return "rewrite"
 
 
-def build_agent():
-    """Build the LangGraph agent with the new flow."""
-    
+def _node(name, func, afunc):
+    """
+    Wrap a node's sync and async implementations in one runnable:
+    agent.invoke runs `func`, agent.ainvoke awaits `afunc`.
+    Both are instrumented, so every execution emits a metrics event and
+    adds its LLM spend to state.budget, and run under the run's
+    correlation id, so its logs and metrics carry it.
+    """
+    from langchain_core.runnables import RunnableLambda
+    from jd_agent.utils.budget import metered, ametered
+    from jd_agent.utils.logger import bind_run_id, abind_run_id
+    from jd_agent.utils.metrics import instrument, ainstrument
+
+    return RunnableLambda(
+        bind_run_id(instrument(name, metered(func))),
+        afunc=abind_run_id(ainstrument(name, ametered(afunc))),
+        name=func.__name__
+    )
+
+
+def build_agent(checkpointer=None):
+    """
+    Build the LangGraph agent with the new flow.
+    With a `checkpointer`, state is saved after every node and runs are
+    keyed (and resumable) by the thread_id in their config.
+    """
+    # Imported here: LangGraph and the LangChain node stack dominate import
+    # time, and most importers (UI reruns, CLI --help) never build the graph
+    from dotenv import load_dotenv
+
+    # .env settings (JD_AGENT_*) must be in place before the nodes read them
+    load_dotenv()
+
+    from langgraph.graph import StateGraph, START, END
+    from jd_agent.utils.nodes import (
+        validation_node,
+        draft_node,
+        quality_check_node,
+        rewrite_node,
+        review_node,
+        final_output_node,
+        regenerate_node,
+        adapt_node,
+        avalidation_node,
+        adraft_node,
+        aquality_check_node,
+        arewrite_node,
+        areview_node,
+        afinal_output_node,
+        aregenerate_node,
+        aadapt_node
+    )
+    from jd_agent.utils.logger import bind_run_id
+
     graph = StateGraph(JDState)
 
     # Add nodes
-    graph.add_node("validation", validation_node)
-    graph.add_node("draft", draft_node)
-    graph.add_node("quality_check", quality_check_node)
-    graph.add_node("rewrite", rewrite_node)
-    graph.add_node("review", review_node)
-    graph.add_node("final_output", final_output_node)
+    graph.add_node("validation", _node("validation", validation_node, avalidation_node))
+    graph.add_node("draft", _node("draft", draft_node, adraft_node))
+    graph.add_node("adapt", _node("adapt", adapt_node, aadapt_node))
+    graph.add_node("quality_check", _node("quality_check", quality_check_node, aquality_check_node))
+    graph.add_node("rewrite", _node("rewrite", rewrite_node, arewrite_node))
+    graph.add_node("review", _node("review", review_node, areview_node))
+    graph.add_node("final_output", _node("final_output", final_output_node, afinal_output_node))
+    graph.add_node("regenerate", _node("regenerate", regenerate_node, aregenerate_node))
 
     # Flow: START -> Validation
     graph.add_edge(START, "validation")
 
-    # Conditional: Validation -> Draft or END
+    # Conditional: Validation -> Draft, Adapt (similar past JD), Regenerate (incremental run) or END
     graph.add_conditional_edges(
         "validation",
-        should_proceed_after_validation,
+        bind_run_id(should_proceed_after_validation),
         {
             "draft": "draft",
+            "adapt": "adapt",
+            "regenerate": "regenerate",
             "end": END
         }
     )
@@ -122,7 +155,7 @@ def build_agent():
     # Conditional: Quality Check -> Rewrite or Review
     graph.add_conditional_edges(
         "quality_check",
-        should_rewrite_or_review,
+        bind_run_id(should_rewrite_or_review),
         {
             "rewrite": "rewrite",
             "review": "review"
@@ -132,12 +165,41 @@ def build_agent():
     # Flow: Rewrite -> Quality Check (loop back)
     graph.add_edge("rewrite", "quality_check")
 
-    # Flow: Review -> Final Output -> END
+    # Flow: Adapt -> Review (the past JD already passed the quality loop)
+    graph.add_edge("adapt", "review")
+
+    # Flow: Review (or Regenerate) -> Final Output -> END
     graph.add_edge("review", "final_output")
+    graph.add_edge("regenerate", "final_output")
     graph.add_edge("final_output", END)
 
-    return graph.compile()
+    return graph.compile(checkpointer=checkpointer)
+
+
+_agent = None
+_agent_lock = threading.Lock()
 
 
-# Create the agent instance
-agent = build_agent()
\ No newline at end of file
+def get_agent():
+    """
+    The compiled agent, built on first use and shared afterwards.
+    Checkpointing follows JD_AGENT_CHECKPOINT (see build_checkpointer).
+    """
+    global _agent
+    if _agent is None:
+        with _agent_lock:
+            if _agent is None:
+                from dotenv import load_dotenv
+                from jd_agent.utils.checkpoint import build_checkpointer
+
+                # JD_AGENT_CHECKPOINT* may come from .env
+                load_dotenv()
+                _agent = build_agent(build_checkpointer())
+    return _agent
+
+
+def __getattr__(name):
+    # `from jd_agent.agent import agent` still works, building on first access
+    if name == "agent":
+        return get_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,189 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from jd_agent.agent import get_agent
+from jd_agent.utils.fields import format_user_input
+from jd_agent.utils.logger import new_run_id
+from jd_agent.utils.state import plain_result
+import csv
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+# State keys copied into each output record, with defaults for unset channels
+RESULT_FIELDS = {
+    "validation_result": None,
+    "quality_check": None,
+    "rewrite_attempts": 0,
+    "final_markdown": None,
+    "final_json": None,
+    "final_text": None,
+}
+
+
+def read_records(path):
+    """
+    Read job records from a JSONL or CSV file.
+    Returns a list of (record_id, fields) tuples. The id comes from a
+    `record_id` or `id` column, falling back to the row number, so it is
+    stable across reruns of the same file.
+    """
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+    else:
+        with open(path, encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+
+    records = []
+    for index, row in enumerate(rows):
+        fields = dict(row)
+        # Pop both so an unused `id` column doesn't leak into the prompt
+        record_id = fields.pop("record_id", None)
+        fallback_id = fields.pop("id", None)
+        record_id = record_id or fallback_id or index
+        records.append((str(record_id), fields))
+    return records
+
+
+def load_completed(output_path):
+    """Ids of records a previous run finished (valid or rejected by validation)."""
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Partial line from a crash mid-write
+                continue
+            if record.get("status") in ("ok", "invalid"):
+                completed.add(str(record.get("record_id")))
+    return completed
+
+
+def thread_id_for(record_id, user_input):
+    """
+    Checkpoint thread of a record: stable across reruns of the same file,
+    but new if the record's input changed.
+    """
+    digest = hashlib.sha256(user_input.encode("utf-8")).hexdigest()[:12]
+    return f"batch:{record_id}:{digest}"
+
+
+def run_record(record_id, fields):
+    """
+    Run the agent for one record and return the output row. With
+    checkpointing enabled, a run that failed part-way in an earlier batch
+    resumes from its last completed node. Any failure (building the agent,
+    reading its checkpoints, the run itself) becomes an "error" row.
+    """
+    # Imported here, like the graph itself, to keep `import jd_agent.batch` light
+    from jd_agent.utils.checkpoint import resume_point, thread_config
+    from jd_agent.utils.scheduler import llm_priority
+
+    started = time.perf_counter()
+    run_id = None
+    try:
+        agent = get_agent()
+        user_input = fields.get("user_input") or format_user_input(fields)
+        config = thread_config(thread_id_for(record_id, user_input))
+
+        snapshot = resume_point(agent, config)
+        if snapshot is not None:
+            logger.info("⏯️ [%s] resuming at %s", record_id, ", ".join(snapshot.next))
+            run_id, inputs = snapshot.values.get("run_id"), None
+        else:
+            # Set up front so error rows can also be matched to logs/metrics
+            run_id = new_run_id()
+            inputs = {"user_input": user_input, "run_id": run_id}
+
+        # Queued behind interactive (UI) calls when the rate limits bind
+        with llm_priority("batch"):
+            result = agent.invoke(inputs, config)
+
+        validation = result.get("validation_result") or ""
+        row = {
+            "record_id": record_id,
+            "run_id": run_id,
+            "status": "ok" if validation.upper().startswith("VALID") else "invalid",
+            "elapsed_s": round(time.perf_counter() - started, 3),
+        }
+        result = plain_result(result)
+        row.update({key: result.get(key, default) for key, default in RESULT_FIELDS.items()})
+
+        # The output row is the durable result; the checkpoints are no longer needed
+        if agent.checkpointer is not None:
+            agent.checkpointer.delete_thread(config["configurable"]["thread_id"])
+    except Exception as e:
+        return {
+            "record_id": record_id,
+            "run_id": run_id,
+            "status": "error",
+            "error": f"{type(e).__name__}: {e}",
+            "elapsed_s": round(time.perf_counter() - started, 3),
+        }
+    return row
+
+
+def _ensure_trailing_newline(path):
+    """Terminate a partial last line left by a crash so appends start clean."""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return
+    with open(path, "rb+") as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+            f.write(b"\n")
+
+
+def run_batch(input_path, output_path, concurrency=4, resume=True):
+    """
+    Generate JDs for every record in `input_path`, at most `concurrency`
+    at a time. Each result is appended to `output_path` (JSONL) as soon as
+    it finishes. With `resume`, records already written with status "ok"
+    or "invalid" are skipped (errors are retried), so a crashed batch can simply be restarted.
+    Returns a summary dict of counts.
+    """
+    records = read_records(input_path)
+
+    if resume:
+        completed = load_completed(output_path)
+        _ensure_trailing_newline(output_path)
+    else:
+        completed = set()
+        open(output_path, "w").close()
+
+    pending = [(rid, fields) for rid, fields in records if rid not in completed]
+    summary = {"total": len(records), "skipped": len(records) - len(pending),
+               "ok": 0, "invalid": 0, "error": 0}
+
+    logger.info("📦 Batch: %d records, %d already done, %d to run (concurrency=%d)",
+                len(records), summary["skipped"], len(pending), concurrency)
+
+    lock = threading.Lock()
+    started = time.perf_counter()
+
+    with open(output_path, "a", encoding="utf-8") as out, \
+            ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        futures = [pool.submit(run_record, rid, fields) for rid, fields in pending]
+
+        for future in as_completed(futures):
+            row = future.result()
+            with lock:
+                out.write(json.dumps(row) + "\n")
+                out.flush()
+                os.fsync(out.fileno())
+                summary[row["status"]] += 1
+
+            icon = {"ok": "✅", "invalid": "❌", "error": "⚠️"}[row["status"]]
+            logger.info("%s [%s] %s in %ss", icon, row["record_id"], row["status"], row["elapsed_s"])
+
+    summary["elapsed_s"] = round(time.perf_counter() - started, 3)
+    logger.info("🏁 Batch finished: %s", summary)
+    return summary
@@ -0,0 +1,32 @@
+"""
+Prompt registry: the static system prompt of every LLM call, one text file
+per prompt, read once per process.
+
+Everything that varies per call goes in the messages after the system
+prompt (most stable first), so consecutive calls share a long identical
+prefix and the provider's automatic prefix caching can serve it.
+"""
+from functools import lru_cache
+from importlib import resources
+
+PROMPT_NAMES = (
+    "validation",
+    "draft",
+    "adapt",
+    "quality_check",
+    "rewrite",
+    "section_rewrite",
+    "review",
+    "review_structured",
+    "final_markdown",
+    "final_json",
+    "final_text",
+)
+
+
+@lru_cache(maxsize=None)
+def get_prompt(name: str) -> str:
+    """The system prompt registered as `name` (jd_agent/prompts/<name>.txt)."""
+    if name not in PROMPT_NAMES:
+        raise KeyError(f"Unknown prompt {name!r}, expected one of {PROMPT_NAMES}")
+    return resources.files(__name__).joinpath(f"{name}.txt").read_text(encoding="utf-8").strip()
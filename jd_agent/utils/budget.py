@@ -0,0 +1,257 @@
+from contextvars import ContextVar
+from functools import lru_cache, wraps
+from jd_agent.utils.cache import is_cache_hit
+from jd_agent.utils.validators import RunBudget
+from typing import Optional
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------------
+# SETTINGS
+# ---------------------------------------------------------------
+# Per-run limits (0 = no limit). Once a run reaches one, the remaining
+# steps degrade instead of calling the LLM: no more quality checks or
+# rewrites, the best draft is taken as the reviewed JD, and every output
+# format is rendered locally
+RUN_TOKEN_BUDGET = int(os.getenv("JD_AGENT_RUN_TOKEN_BUDGET", "0"))
+RUN_COST_BUDGET = float(os.getenv("JD_AGENT_RUN_COST_BUDGET", "0"))
+
+# Longer user input is truncated before validation (0 = no limit)
+MAX_INPUT_TOKENS = int(os.getenv("JD_AGENT_MAX_INPUT_TOKENS", "2000"))
+
+# Model name prefix -> USD per 1M (prompt, completion) tokens. Models not
+# listed count towards the token budget only
+MODEL_PRICES = {
+    "gpt-4-turbo": (10.0, 30.0),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.0),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.0, 8.0),
+}
+
+
+def _parse_prices(text):
+    """'gpt-4o=2.5/10,my-model=1/2' -> {model: (prompt, completion)}."""
+    prices = {}
+    for item in (text or "").split(","):
+        if not item.strip():
+            continue
+        model, _, price = item.partition("=")
+        try:
+            prompt, completion = (float(part) for part in price.split("/"))
+        except ValueError:
+            raise ValueError(f"Invalid JD_AGENT_MODEL_PRICES entry {item.strip()!r}") from None
+        prices[model.strip()] = (prompt, completion)
+    return prices
+
+
+# JD_AGENT_MODEL_PRICES adds or overrides prices, e.g. "gpt-4o=2.5/10"
+MODEL_PRICES.update(_parse_prices(os.getenv("JD_AGENT_MODEL_PRICES")))
+
+
+# ---------------------------------------------------------------
+# TOKEN COUNTING
+# ---------------------------------------------------------------
+@lru_cache(maxsize=1)
+def _encoding():
+    """The cl100k tokenizer, or None when tiktoken cannot load it (e.g. offline)."""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning("⚠️ tiktoken unavailable (%s) — estimating tokens at ~4 characters each.", e.__class__.__name__)
+        return None
+
+
+def count_tokens(text: Optional[str]) -> int:
+    """Tokens in `text` with the local tokenizer."""
+    if not text:
+        return 0
+    encoding = _encoding()
+    if encoding is None:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, limit: int) -> str:
+    """The first `limit` tokens of `text`."""
+    encoding = _encoding()
+    if encoding is None:
+        return text[:limit * 4]
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:limit])
+
+
+def _message_text(message) -> str:
+    """Text a model read or wrote: content plus any tool-call arguments."""
+    if isinstance(message, dict):
+        message = message.get("raw")
+    content = getattr(message, "content", "") or ""
+    if not isinstance(content, str):
+        content = json.dumps(content, ensure_ascii=False)
+    for call in getattr(message, "tool_calls", None) or []:
+        content += json.dumps(call.get("args", {}), ensure_ascii=False)
+    return content
+
+
+def count_messages(messages) -> int:
+    """Prompt tokens of a message list (plus a few per message for the chat format)."""
+    return sum(count_tokens(_message_text(message)) + 4 for message in messages)
+
+
+def truncate_input(text: str, limit: int = MAX_INPUT_TOKENS) -> tuple[str, bool]:
+    """
+    `text` cut down to about `limit` tokens, and whether it was cut.
+    The longest lines are shortened first, so a pasted wall of text in one
+    field does not push the other `Key: value` lines out of the input.
+    """
+    if not limit or not text:
+        return text, False
+
+    lines = text.split("\n")
+    counts = [count_tokens(line) for line in lines]
+    if sum(counts) <= limit:
+        return text, False
+
+    # Largest per-line cap that fits: lines under it are kept whole
+    remaining, cap = limit, 0
+    for index, count in enumerate(sorted(counts)):
+        share = remaining // (len(counts) - index)
+        if count > share:
+            cap = share
+            break
+        remaining -= count
+
+    if cap < 8:
+        # Too many lines to keep a useful part of each: keep the head
+        return truncate_tokens(text, limit) + " […]", True
+    return "\n".join(
+        line if count <= cap else truncate_tokens(line, cap) + " […]"
+        for line, count in zip(lines, counts)
+    ), True
+
+
+# ---------------------------------------------------------------
+# PER-NODE METER
+# ---------------------------------------------------------------
+def price_for(model) -> Optional[tuple[float, float]]:
+    """USD per 1M (prompt, completion) tokens of a chat model, if known."""
+    name = getattr(model, "model_name", None) or getattr(model, "model", None)
+    if not isinstance(name, str):
+        return None
+    for prefix in sorted(MODEL_PRICES, key=len, reverse=True):
+        if name.startswith(prefix):
+            return MODEL_PRICES[prefix]
+    return None
+
+
+def estimate_cost(model, prompt_tokens: int, completion_tokens: int) -> float:
+    """USD for a call to `model` of this size (0 when its price is unknown)."""
+    price = price_for(model)
+    if price is None:
+        return 0.0
+    return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000
+
+
+class _Meter:
+    """Tokens, cost and degraded steps of one node execution."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost_usd = 0.0
+        self.degraded = []
+
+    def spend(self, budget: RunBudget) -> RunBudget:
+        """`budget` plus what this node spent."""
+        return RunBudget(
+            prompt_tokens=budget.prompt_tokens + self.prompt_tokens,
+            completion_tokens=budget.completion_tokens + self.completion_tokens,
+            cost_usd=round(budget.cost_usd + self.cost_usd, 6),
+            degraded=budget.degraded + self.degraded
+        )
+
+
+# The meter of the node currently executing (copied into the worker
+# threads and tasks a node fans out to)
+_current_meter = ContextVar("jd_agent_budget_meter", default=None)
+
+
+def charge(model, messages, result) -> None:
+    """
+    Count one LLM call against the current node's meter (no-op outside the
+    graph, and for responses served by the response cache).
+    """
+    meter = _current_meter.get()
+    if meter is None or is_cache_hit(result.get("raw") if isinstance(result, dict) else result):
+        return
+
+    prompt = count_messages(messages)
+    completion = count_tokens(_message_text(result))
+    cost = estimate_cost(model, prompt, completion)
+    with meter._lock:
+        meter.prompt_tokens += prompt
+        meter.completion_tokens += completion
+        meter.cost_usd += cost
+
+
+def degrade(step: str, message: str) -> None:
+    """Log and record that `step` was truncated, skipped or done locally to stay within budget."""
+    logger.warning("💸 %s", message)
+    meter = _current_meter.get()
+    if meter is not None:
+        with meter._lock:
+            meter.degraded.append(step)
+
+
+def budget_exceeded(budget: RunBudget, prompt_tokens: int = 0, completion_tokens: int = 0, model=None) -> Optional[str]:
+    """
+    Why the run cannot afford its next call (estimated at `prompt_tokens`
+    read and `completion_tokens` written by `model`), or None while it
+    stays within its limits.
+    """
+    spent = budget.prompt_tokens + budget.completion_tokens
+    upcoming = prompt_tokens + completion_tokens
+    if RUN_TOKEN_BUDGET and spent + upcoming > RUN_TOKEN_BUDGET:
+        return f"run token budget spent ({spent} used, next call ~{upcoming}, limit {RUN_TOKEN_BUDGET})"
+
+    cost = estimate_cost(model, prompt_tokens, completion_tokens)
+    if RUN_COST_BUDGET and budget.cost_usd + cost > RUN_COST_BUDGET:
+        return (
+            f"run cost budget spent (${budget.cost_usd:.4f} used, next call ~${cost:.4f}, "
+            f"limit ${RUN_COST_BUDGET:g})"
+        )
+    return None
+
+
+def metered(func):
+    """Wrap a sync node so the tokens and cost of its LLM calls are added to state.budget."""
+    @wraps(func)
+    def wrapper(state):
+        meter = _Meter()
+        token = _current_meter.set(meter)
+        try:
+            updates = func(state)
+        finally:
+            _current_meter.reset(token)
+        return {**updates, "budget": meter.spend(state.budget)}
+    return wrapper
+
+
+def ametered(afunc):
+    """Async version of metered."""
+    @wraps(afunc)
+    async def wrapper(state):
+        meter = _Meter()
+        token = _current_meter.set(meter)
+        try:
+            updates = await afunc(state)
+        finally:
+            _current_meter.reset(token)
+        return {**updates, "budget": meter.spend(state.budget)}
+    return wrapper
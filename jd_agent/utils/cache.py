@@ -0,0 +1,222 @@
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.load import dumps, loads
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+
+# Forced regeneration for the current run/thread (see bypass_cache())
+_bypass = ContextVar("jd_agent_cache_bypass", default=False)
+
+# response_metadata flag on messages served from the cache (no API call made)
+CACHE_HIT = "cache_hit"
+
+
+def is_cache_hit(message) -> bool:
+    """Whether `message` was served by the response cache rather than the API."""
+    return bool((getattr(message, "response_metadata", None) or {}).get(CACHE_HIT))
+
+
+@contextmanager
+def bypass_cache():
+    """
+    Skip cache lookups for LLM calls made inside this block.
+    Fresh responses are still written back, so the cache is refreshed.
+    """
+    token = _bypass.set(True)
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+
+def _env_flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+class SQLiteResponseCache(BaseCache):
+    """
+    Persistent, content-addressed LLM response cache.
+
+    Plugged into the chat model via `ChatOpenAI(cache=...)`, so every node
+    goes through it. LangChain passes the serialized messages (system prompt
+    included) as `prompt` and the model name/parameters as `llm_string`;
+    the SHA-256 of both is the key.
+
+    Eviction:
+        - entries older than `ttl_seconds` are treated as misses and dropped
+        - once over `max_entries`, least recently used entries are dropped
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttl_seconds: Optional[float] = 7 * 24 * 3600,
+        max_entries: Optional[int] = 10_000,
+        bypass: bool = False,
+    ):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.bypass = bypass
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(prompt: str, llm_string: str) -> str:
+        """Content address for a (model + params, messages) pair."""
+        digest = hashlib.sha256()
+        digest.update(llm_string.encode("utf-8"))
+        digest.update(b"\x00")
+        digest.update(prompt.encode("utf-8"))
+        return digest.hexdigest()
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        if self.bypass or _bypass.get():
+            with self._lock:
+                self.misses += 1
+            return None
+
+        key = self.make_key(prompt, llm_string)
+        now = time.time()
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            value, created_at = row
+            if self._expired(created_at, now):
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                self.evictions += 1
+                self.misses += 1
+                return None
+
+            self._conn.execute(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            self.hits += 1
+
+        generations = loads(value, allowed_objects=[ChatGeneration, AIMessage])
+        for generation in generations:
+            message = getattr(generation, "message", None)
+            if message is not None:
+                message.response_metadata[CACHE_HIT] = True
+        return generations
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key = self.make_key(prompt, llm_string)
+        now = time.time()
+        value = dumps(list(return_val))
+
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO responses (key, value, created_at, accessed_at)
+                VALUES (?, ?, ?, ?)
+                """,
+                (key, value, now, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float) -> None:
+        """Drop expired entries, then LRU entries beyond max_entries. Caller holds the lock."""
+        if self.ttl_seconds is not None:
+            cursor = self._conn.execute(
+                "DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,)
+            )
+            self.evictions += max(cursor.rowcount, 0)
+
+        if self.max_entries is not None:
+            cursor = self._conn.execute(
+                """
+                DELETE FROM responses WHERE key IN (
+                    SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            )
+            self.evictions += max(cursor.rowcount, 0)
+
+    def clear(self, **kwargs) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        """Hit/miss counters for this process plus the current entry count."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+        }
+
+
+def build_response_cache() -> Optional[SQLiteResponseCache]:
+    """
+    Create the shared response cache from environment settings.
+
+    JD_AGENT_CACHE          - "0" disables caching (default: enabled)
+    JD_AGENT_CACHE_PATH     - SQLite file (default: .cache/jd_agent_llm.sqlite)
+    JD_AGENT_CACHE_TTL      - seconds before an entry expires (default: 7 days, 0 = never)
+    JD_AGENT_CACHE_MAX      - max entries kept (default: 10000, 0 = unbounded)
+    JD_AGENT_CACHE_BYPASS   - "1" forces regeneration for every call
+    """
+    if not _env_flag("JD_AGENT_CACHE", "1"):
+        return None
+
+    ttl = float(os.getenv("JD_AGENT_CACHE_TTL", str(7 * 24 * 3600)))
+    max_entries = int(os.getenv("JD_AGENT_CACHE_MAX", "10000"))
+
+    return SQLiteResponseCache(
+        path=os.getenv("JD_AGENT_CACHE_PATH", os.path.join(".cache", "jd_agent_llm.sqlite")),
+        ttl_seconds=ttl or None,
+        max_entries=max_entries or None,
+        bypass=_env_flag("JD_AGENT_CACHE_BYPASS", "0"),
+    )
@@ -0,0 +1,369 @@
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from typing import Optional
+import os
+import sqlite3
+import threading
+import time
+
+
+# Models the state holds as instances (nodes no longer dump them to dicts):
+# the only non-builtin types a checkpoint may deserialize
+STATE_MODELS = tuple(
+    ("jd_agent.utils.validators", name)
+    for name in ("QualityScore", "ScoreRecord", "RunBudget", "StructuredJD")
+)
+
+
+def _env_flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+class SQLiteCheckpointer(BaseCheckpointSaver):
+    """
+    On-disk LangGraph checkpointer, so an interrupted run resumes from the
+    last completed node instead of paying for validation, draft and rewrites
+    again.
+
+    Runs are keyed by `config["configurable"]["thread_id"]`. After every
+    node the graph stores a checkpoint (the full state); the writes of nodes
+    that finished inside a failed step are kept as pending writes.
+
+    Retention:
+        - only the newest `keep_last` checkpoints of a thread are kept
+          (resuming needs just the latest one)
+        - threads untouched for `ttl_seconds` are dropped by compact(),
+          which also runs when the store is opened
+        - callers delete a thread once its result is stored elsewhere
+          (see delete_thread)
+    """
+
+    def __init__(
+        self,
+        path: str,
+        keep_last: Optional[int] = 2,
+        ttl_seconds: Optional[float] = 7 * 24 * 3600,
+    ):
+        super().__init__(serde=JsonPlusSerializer(allowed_msgpack_modules=STATE_MODELS))
+        self.path = path
+        self.keep_last = keep_last
+        self.ttl_seconds = ttl_seconds
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL,
+                checkpoint_id TEXT NOT NULL,
+                parent_checkpoint_id TEXT,
+                type TEXT NOT NULL,
+                checkpoint BLOB NOT NULL,
+                metadata_type TEXT NOT NULL,
+                metadata BLOB NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+            );
+            CREATE TABLE IF NOT EXISTS writes (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL,
+                checkpoint_id TEXT NOT NULL,
+                task_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                channel TEXT NOT NULL,
+                type TEXT NOT NULL,
+                value BLOB NOT NULL,
+                task_path TEXT NOT NULL,
+                PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+            );
+            CREATE INDEX IF NOT EXISTS checkpoints_created_at ON checkpoints (created_at);
+            """
+        )
+        self._conn.commit()
+        self.compact()
+
+    # -----------------------------------------------------------
+    # READ
+    # -----------------------------------------------------------
+    def _tuple(self, row) -> CheckpointTuple:
+        (thread_id, checkpoint_ns, checkpoint_id, parent_id,
+         type_, checkpoint, metadata_type, metadata) = row
+
+        writes = self._conn.execute(
+            """
+            SELECT task_id, channel, type, value FROM writes
+            WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?
+            ORDER BY task_path, task_id, idx
+            """,
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+
+        def config(checkpoint_id):
+            return {"configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint_id,
+            }}
+
+        return CheckpointTuple(
+            config=config(checkpoint_id),
+            checkpoint=self.serde.loads_typed((type_, checkpoint)),
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            parent_config=config(parent_id) if parent_id else None,
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed((value_type, value)))
+                for task_id, channel, value_type, value in writes
+            ],
+        )
+
+    def get_tuple(self, config) -> Optional[CheckpointTuple]:
+        """The checkpoint named in `config`, or the thread's latest one."""
+        configurable = config["configurable"]
+        query = """
+            SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id,
+                   type, checkpoint, metadata_type, metadata
+            FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?
+        """
+        params = [configurable["thread_id"], configurable.get("checkpoint_ns", "")]
+
+        checkpoint_id = get_checkpoint_id(config)
+        if checkpoint_id:
+            query += " AND checkpoint_id = ?"
+            params.append(checkpoint_id)
+        else:
+            # Checkpoint ids are time-ordered (uuid6)
+            query += " ORDER BY checkpoint_id DESC LIMIT 1"
+
+        with self._lock:
+            row = self._conn.execute(query, params).fetchone()
+            return self._tuple(row) if row else None
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        """Checkpoints matching `config`, newest first."""
+        query = """
+            SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id,
+                   type, checkpoint, metadata_type, metadata
+            FROM checkpoints WHERE 1 = 1
+        """
+        params = []
+        if config:
+            configurable = config["configurable"]
+            query += " AND thread_id = ?"
+            params.append(configurable["thread_id"])
+            if configurable.get("checkpoint_ns") is not None:
+                query += " AND checkpoint_ns = ?"
+                params.append(configurable["checkpoint_ns"])
+            if get_checkpoint_id(config):
+                query += " AND checkpoint_id = ?"
+                params.append(get_checkpoint_id(config))
+        if before and get_checkpoint_id(before):
+            query += " AND checkpoint_id < ?"
+            params.append(get_checkpoint_id(before))
+        query += " ORDER BY checkpoint_id DESC"
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+
+        for row in rows:
+            if limit is not None and limit <= 0:
+                break
+            with self._lock:
+                item = self._tuple(row)
+            if filter and any(item.metadata.get(key) != value for key, value in filter.items()):
+                continue
+            if limit is not None:
+                limit -= 1
+            yield item
+
+    # -----------------------------------------------------------
+    # WRITE
+    # -----------------------------------------------------------
+    def put(self, config, checkpoint, metadata, new_versions):
+        configurable = config["configurable"]
+        thread_id = configurable["thread_id"]
+        checkpoint_ns = configurable.get("checkpoint_ns", "")
+
+        type_, blob = self.serde.dumps_typed(checkpoint)
+        metadata_type, metadata_blob = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO checkpoints (
+                    thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id,
+                    type, checkpoint, metadata_type, metadata, created_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (thread_id, checkpoint_ns, checkpoint["id"], configurable.get("checkpoint_id"),
+                 type_, blob, metadata_type, metadata_blob, time.time()),
+            )
+            self._trim(thread_id, checkpoint_ns)
+            self._conn.commit()
+
+        return {"configurable": {
+            "thread_id": thread_id,
+            "checkpoint_ns": checkpoint_ns,
+            "checkpoint_id": checkpoint["id"],
+        }}
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        configurable = config["configurable"]
+        key = (configurable["thread_id"], configurable.get("checkpoint_ns", ""), configurable["checkpoint_id"])
+
+        rows = []
+        for index, (channel, value) in enumerate(writes):
+            idx = WRITES_IDX_MAP.get(channel, index)
+            rows.append((*key, task_id, idx, channel, *self.serde.dumps_typed(value), task_path))
+
+        with self._lock:
+            # Special channels (errors, interrupts) are overwritten; regular
+            # writes are kept from the first attempt
+            self._conn.executemany(
+                """
+                INSERT OR IGNORE INTO writes (
+                    thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value, task_path
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                [row for row in rows if row[4] >= 0],
+            )
+            self._conn.executemany(
+                """
+                INSERT OR REPLACE INTO writes (
+                    thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value, task_path
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                [row for row in rows if row[4] < 0],
+            )
+            self._conn.commit()
+
+    def delete_thread(self, thread_id: str) -> None:
+        """Drop every checkpoint and write of a thread (e.g. once its result is saved)."""
+        with self._lock:
+            self._conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+            self._conn.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+            self._conn.commit()
+
+    # The store is local and each call is short, so the async API runs inline
+    async def aget_tuple(self, config):
+        return self.get_tuple(config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        for item in self.list(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return self.put_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        return self.delete_thread(thread_id)
+
+    # -----------------------------------------------------------
+    # RETENTION
+    # -----------------------------------------------------------
+    def _trim(self, thread_id: str, checkpoint_ns: str) -> None:
+        """Keep the newest `keep_last` checkpoints of a thread. Caller holds the lock."""
+        if self.keep_last is None:
+            return
+        stale = self._conn.execute(
+            """
+            SELECT checkpoint_id FROM checkpoints
+            WHERE thread_id = ? AND checkpoint_ns = ?
+            ORDER BY checkpoint_id DESC LIMIT -1 OFFSET ?
+            """,
+            (thread_id, checkpoint_ns, self.keep_last),
+        ).fetchall()
+        for (checkpoint_id,) in stale:
+            for table in ("checkpoints", "writes"):
+                self._conn.execute(
+                    f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                )
+
+    def compact(self, vacuum: bool = False) -> int:
+        """
+        Drop threads with no checkpoint newer than `ttl_seconds`; with
+        `vacuum`, also give the freed pages back to the filesystem.
+        Returns the number of threads removed.
+        """
+        removed = 0
+        with self._lock:
+            if self.ttl_seconds is not None:
+                stale = self._conn.execute(
+                    "SELECT thread_id FROM checkpoints GROUP BY thread_id HAVING MAX(created_at) < ?",
+                    (time.time() - self.ttl_seconds,),
+                ).fetchall()
+                for (thread_id,) in stale:
+                    self._conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+                    self._conn.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+                removed = len(stale)
+                self._conn.commit()
+            if vacuum:
+                self._conn.execute("VACUUM")
+        return removed
+
+    def stats(self) -> dict:
+        """Threads, checkpoints and pending writes currently stored."""
+        with self._lock:
+            threads, checkpoints = self._conn.execute(
+                "SELECT COUNT(DISTINCT thread_id), COUNT(*) FROM checkpoints"
+            ).fetchone()
+            writes = self._conn.execute("SELECT COUNT(*) FROM writes").fetchone()[0]
+        return {"threads": threads, "checkpoints": checkpoints, "writes": writes}
+
+
+def build_checkpointer() -> Optional[SQLiteCheckpointer]:
+    """
+    Create the shared checkpointer from environment settings.
+
+    JD_AGENT_CHECKPOINT        - "1" enables checkpointing (default: disabled;
+                                 every run then needs a thread_id in its config)
+    JD_AGENT_CHECKPOINT_PATH   - SQLite file (default: .cache/jd_agent_checkpoints.sqlite)
+    JD_AGENT_CHECKPOINT_KEEP   - checkpoints kept per thread (default: 2, 0 = all)
+    JD_AGENT_CHECKPOINT_TTL    - seconds before an idle thread is dropped (default: 7 days, 0 = never)
+    """
+    if not _env_flag("JD_AGENT_CHECKPOINT", "0"):
+        return None
+
+    keep_last = int(os.getenv("JD_AGENT_CHECKPOINT_KEEP", "2"))
+    ttl = float(os.getenv("JD_AGENT_CHECKPOINT_TTL", str(7 * 24 * 3600)))
+
+    return SQLiteCheckpointer(
+        path=os.getenv("JD_AGENT_CHECKPOINT_PATH", os.path.join(".cache", "jd_agent_checkpoints.sqlite")),
+        keep_last=keep_last or None,
+        ttl_seconds=ttl or None,
+    )
+
+
+def thread_config(thread_id: str) -> dict:
+    """Run config for `thread_id` (ignored when the agent has no checkpointer)."""
+    return {"configurable": {"thread_id": thread_id}}
+
+
+def resume_point(agent, config):
+    """
+    The state of an unfinished run stored under `config`, or None when
+    there is nothing to resume (no checkpointer, new thread, or a run that
+    already reached the end). Resume by invoking the agent with `None`
+    as input and the same config.
+    """
+    if agent.checkpointer is None:
+        return None
+    snapshot = agent.get_state(config)
+    if not snapshot.values or not snapshot.next:
+        return None
+    return snapshot
@@ -0,0 +1,316 @@
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+from pydantic import Field, PrivateAttr
+from jd_agent.utils.validators import PASS_THRESHOLD
+from collections import Counter
+import asyncio
+import json
+import re
+import threading
+import time
+
+
+# ---------------------------------------------------------------
+# CANNED RESPONSES
+# ---------------------------------------------------------------
+# Which pipeline step a request belongs to, keyed by a phrase of its system prompt
+STAGE_MARKERS = [
+    ("input validator", "validation"),
+    ("Rewrite ONLY the", "section_rewrite"),
+    ("adaptation specialist", "adapt"),
+    ("Job Description writer", "draft"),
+    ("quality evaluator", "quality_check"),
+    ("improvement specialist", "rewrite"),
+    ("senior HR reviewer", "review"),
+    ("clean Markdown", "final_markdown"),
+    ("structured JSON", "final_json"),
+    ("plain text", "final_text"),
+]
+
+# A realistic JD; {revision} counts the rewrites its summary has been through
+CANNED_JD = """**Job Title and Metadata**
+Job Title: Senior Python Developer | Job ID: BENCH-001 | Location: Bangalore, India | Work Mode: Hybrid
+
+**About Us**
+TechCorp builds data platforms for logistics companies across Asia. Our teams ship small, well-tested services and review each other's work in the open.
+
+We value clear writing, steady delivery and people who enjoy teaching what they know.
+
+**Job Summary**
+You will design and run the Python services behind our shipment tracking APIs. You will work with product managers and other engineers to plan, build and operate features end to end. Revision: {revision}.
+
+**Key Responsibilities**
+- Design, build and maintain REST APIs with FastAPI
+- Write automated tests and keep the build green
+- Review pull requests and give actionable feedback
+- Improve query performance on PostgreSQL and Redis
+- Deploy and monitor services on AWS with Docker
+- Mentor two junior engineers on the team
+
+**Required Skills**
+- Strong Python and asynchronous programming
+- Experience with FastAPI or a similar web framework
+- Working knowledge of PostgreSQL and Redis
+- Comfort with Docker and AWS
+- Clear written and spoken communication
+
+**Preferred Qualifications**
+- Experience with Kubernetes
+- Open-source contributions
+
+**Education**
+Bachelor's degree in Computer Science or a related field, or equivalent practical experience.
+
+**Experience**
+6+ years of software development, including 4+ years building Python backends.
+"""
+
+CANNED_JSON = json.dumps({
+    "job_title": "Senior Python Developer",
+    "job_id": "BENCH-001",
+    "company": "TechCorp",
+    "location": "Bangalore, India",
+    "work_mode": "Hybrid",
+    "employment_type": "Full-time",
+    "about_us": "TechCorp builds data platforms for logistics companies across Asia.",
+    "summary": "You will design and run the Python services behind our shipment tracking APIs.",
+    "responsibilities": ["Design, build and maintain REST APIs with FastAPI"],
+    "required_skills": ["Python", "FastAPI", "PostgreSQL", "Redis"],
+    "preferred_qualifications": ["Kubernetes"],
+    "education": "Bachelor's degree in Computer Science or a related field",
+    "experience": "6+ years"
+}, indent=2)
+
+# Quality answer that is not valid JSON (prose around a python-style dict)
+MALFORMED_QUALITY = "Here is my evaluation: {'score': 55, 'pass': False, 'issues': ['Too generic'],"
+
+_REVISION_RE = re.compile(r"Revision: (\d+)")
+_SECTION_RE = re.compile(r"Current Section:\n(.*?)\n\nIssues:", re.DOTALL)
+_DRAFT_RE = re.compile(r"Current Draft:\n(.*?)\n\nQuality Check Result:", re.DOTALL)
+
+# Prefix-cache granularity of the provider being imitated (OpenAI: 128-token steps)
+CACHE_BLOCK_TOKENS = 128
+
+
+class FakeJDModel(BaseChatModel):
+    """
+    Deterministic stand-in chat model for offline benchmarks and load tests.
+
+    Answers each pipeline step with a canned (or templated) response, sleeps
+    `latency` seconds plus one second per `tokens_per_second` output tokens,
+    and reports approximate token usage. Quality checks fail until the draft
+    has been rewritten `rewrite_depth` times, so the rewrite loop depth is
+    scriptable per run.
+    """
+    latency: float = Field(default=0.0, description="Seconds before the first token")
+    tokens_per_second: float = Field(default=0.0, description="Output token rate; 0 returns the answer at once")
+    rewrite_depth: int = Field(default=0, description="Failing quality checks before a pass")
+    pass_score: int = Field(default=85, description="Score reported once the draft passes")
+    fail_score: int = Field(default=55, description="Score reported while the draft fails")
+    fail_step: int = Field(
+        default=5,
+        description="Points a failing score gains per rewrite (0 = the loop plateaus)"
+    )
+    malformed_quality: bool = Field(default=False, description="Answer quality checks with unparseable JSON")
+    fail_sections: list[str] = Field(
+        default_factory=lambda: ["summary"],
+        description="Sections failing quality checks blame ('general' forces a full rewrite)"
+    )
+    fail_stages: list[str] = Field(default_factory=list, description="Stages whose calls raise RuntimeError")
+    transient_failures: dict[str, int] = Field(
+        default_factory=dict,
+        description="Stage -> number of calls raising ConnectionError (retryable) before it answers"
+    )
+    responses: dict[str, str] = Field(
+        default_factory=dict,
+        description="Stage -> template overriding the canned answer ({input}, {revision} available)"
+    )
+    prefix_cache: bool = Field(default=True, description="Report repeated prompt prefixes as cached input tokens")
+    cache_min_tokens: int = Field(
+        default=0,
+        description="Shortest prompt eligible for prefix caching (OpenAI: 1024)"
+    )
+
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _calls: Counter = PrivateAttr(default_factory=Counter)
+    _prefixes: set = PrivateAttr(default_factory=set)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-jd"
+
+    @property
+    def calls(self) -> dict:
+        """Number of calls served per stage."""
+        with self._lock:
+            return dict(self._calls)
+
+    def reset(self):
+        with self._lock:
+            self._calls.clear()
+            self._prefixes.clear()
+
+    # -----------------------------------------------------------
+    # RESPONSES
+    # -----------------------------------------------------------
+    def _stage(self, messages) -> str:
+        system = messages[0].content if messages else ""
+        for marker, stage in STAGE_MARKERS:
+            if marker in system:
+                return stage
+        return "unknown"
+
+    def _respond(self, messages, structured=False) -> tuple[str, str]:
+        stage = self._stage(messages)
+        with self._lock:
+            self._calls[stage] += 1
+            flaky = self._calls[stage] <= self.transient_failures.get(stage, 0)
+
+        if stage in self.fail_stages:
+            raise RuntimeError(f"FakeJDModel: scripted failure in {stage}")
+        if flaky:
+            raise ConnectionError(f"FakeJDModel: scripted transient failure in {stage}")
+
+        user_input = messages[-1].content if messages else ""
+        revision = int(max(_REVISION_RE.findall(user_input), default=0, key=int))
+
+        if stage in self.responses:
+            return stage, self.responses[stage].format(input=user_input, revision=revision)
+
+        if stage == "validation":
+            return stage, "VALIDATION: VALID\n\nNORMALIZED INPUT:\n" + user_input.split("\n", 1)[-1]
+        if stage == "draft":
+            return stage, CANNED_JD.format(revision=0)
+        if stage == "adapt":
+            # The reference JD back unchanged
+            return stage, user_input.split("Reference JD:\n", 1)[-1]
+        if stage == "quality_check":
+            if self.malformed_quality:
+                return stage, MALFORMED_QUALITY
+            return stage, self._quality_answer(revision)
+        if stage == "rewrite":
+            # Revision of the draft quoted in the prompt (after the original input)
+            draft = _DRAFT_RE.search(user_input)
+            draft = draft.group(1) if draft else user_input
+            current = int(max(_REVISION_RE.findall(draft), default=0, key=int))
+            return stage, CANNED_JD.format(revision=current + 1)
+        if stage == "section_rewrite":
+            # Same section back, with its own revision marker bumped (or added)
+            section = _SECTION_RE.search(user_input)
+            section = section.group(1) if section else ""
+            if not _REVISION_RE.search(section):
+                return stage, section.rstrip() + "\nRevision: 1."
+            return stage, _REVISION_RE.sub(lambda m: f"Revision: {int(m.group(1)) + 1}", section)
+        if stage == "review" and structured:
+            return stage, CANNED_JSON
+        if stage == "review":
+            return stage, user_input.split("\n", 1)[-1]
+        if stage == "final_json":
+            return stage, f"```json\n{CANNED_JSON}\n```"
+        # Markdown/text conversions (and unknown prompts) echo their input
+        return stage, user_input
+
+    def _quality_answer(self, revision: int) -> str:
+        passed = revision >= self.rewrite_depth
+        score = self.pass_score if passed else min(self.fail_score + self.fail_step * revision, PASS_THRESHOLD - 1)
+        return json.dumps({
+            "score": score,
+            "structure_score": round(score * 0.30),
+            "tone_score": round(score * 0.25),
+            "realism_score": round(score * 0.25),
+            "clarity_score": score - round(score * 0.30) - 2 * round(score * 0.25),
+            "pass": passed,
+            "issues": [] if passed else [f"Revision {revision} is too generic"],
+            "section_issues": {} if passed else {
+                key: [f"Revision {revision} is too generic"] for key in self.fail_sections
+            },
+        })
+
+    def _delay(self, text: str) -> float:
+        delay = self.latency
+        if self.tokens_per_second > 0:
+            delay += _count_tokens(text) / self.tokens_per_second
+        return delay
+
+    def _cached_tokens(self, messages) -> int:
+        """
+        Input tokens a prefix-caching provider would serve from cache: the
+        leading 128-token blocks of the prompt already seen in earlier calls.
+        """
+        prompt = "".join(f"{m.type}:{m.content}\n" for m in messages if isinstance(m.content, str))
+        if not self.prefix_cache or _count_tokens(prompt) < self.cache_min_tokens:
+            return 0
+
+        block = CACHE_BLOCK_TOKENS * 4
+        cached = 0
+        with self._lock:
+            for end in range(block, len(prompt) + 1, block):
+                key = hash(prompt[:end])
+                if key in self._prefixes:
+                    cached = end // 4
+                else:
+                    self._prefixes.add(key)
+        return cached
+
+    def _usage(self, messages, text: str) -> dict:
+        usage = _usage(messages, text)
+        usage["input_token_details"] = {"cache_read": self._cached_tokens(messages)}
+        return usage
+
+    def _result(self, messages, text: str) -> ChatResult:
+        message = AIMessage(content=text, usage_metadata=self._usage(messages, text))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    # -----------------------------------------------------------
+    # BaseChatModel
+    # -----------------------------------------------------------
+    def with_structured_output(self, schema, *, include_raw=False, **kwargs):
+        """Parse the (JSON) answer into `schema`, like a tool-calling model."""
+        def parse(message):
+            try:
+                parsed, error = schema.model_validate(json.loads(message.content)), None
+            except (ValueError, TypeError) as e:
+                parsed, error = None, e
+            if include_raw:
+                return {"raw": message, "parsed": parsed, "parsing_error": error}
+            if error is not None:
+                raise error
+            return parsed
+
+        return self.bind(structured=True) | RunnableLambda(parse)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        _, text = self._respond(messages, kwargs.get("structured", False))
+        time.sleep(self._delay(text))
+        return self._result(messages, text)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        _, text = self._respond(messages, kwargs.get("structured", False))
+        await asyncio.sleep(self._delay(text))
+        return self._result(messages, text)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        _, text = self._respond(messages, kwargs.get("structured", False))
+        time.sleep(self.latency)
+        pieces = re.findall(r"\S+\s*|\s+", text)
+        for i, piece in enumerate(pieces):
+            if self.tokens_per_second > 0:
+                time.sleep(_count_tokens(piece) / self.tokens_per_second)
+            usage = self._usage(messages, text) if i == len(pieces) - 1 else None
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=piece, usage_metadata=usage))
+            if run_manager:
+                run_manager.on_llm_new_token(piece, chunk=chunk)
+            yield chunk
+
+
+def _count_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token)."""
+    return max(1, len(text) // 4)
+
+
+def _usage(messages, text: str) -> dict:
+    prompt = sum(_count_tokens(m.content) for m in messages if isinstance(m.content, str))
+    completion = _count_tokens(text)
+    return {"input_tokens": prompt, "output_tokens": completion, "total_tokens": prompt + completion}
@@ -0,0 +1,269 @@
+from jd_agent.utils.renderer import SECTION_HEADINGS, split_section_text
+from jd_agent.utils.validators import ValidationNodeOutput
+from typing import Optional
+import re
+
+
+# ---------------------------------------------------------------
+# JOB INPUT FIELDS
+# ---------------------------------------------------------------
+# (record key, label) in the order app.py lays out the user_input block
+JOB_FIELDS = [
+    ("client", "Client"),
+    ("job_id", "Job ID"),
+    ("job_title", "Job Title"),
+    ("description", "Description"),
+    ("department", "Department"),
+    ("experience", "Experience"),
+    ("relevant_experience", "Relevant Experience"),
+    ("skills", "Skills"),
+    ("max_salary", "Max Salary"),
+    ("work_mode", "Work Mode"),
+    ("location", "Location"),
+    ("employment_type", "Employment Type"),
+    ("positions_filled", "Positions Filled"),
+    ("education", "Education"),
+]
+
+REQUIRED_FIELDS = ("client", "job_title")
+RECOMMENDED_FIELDS = ("experience", "skills")
+
+_LABEL_TO_KEY = {label.lower(): key for key, label in JOB_FIELDS}
+_LABELS = dict(JOB_FIELDS)
+
+# Extra spellings seen in ATS exports and hand-typed input
+_LABEL_TO_KEY.update({
+    "client/company name": "client",
+    "company": "client",
+    "company name": "client",
+    "title": "job_title",
+    "role": "job_title",
+    "total experience required": "experience",
+    "required skills": "skills",
+    "salary": "max_salary",
+    "maximum salary/budget": "max_salary",
+    "number of positions": "positions_filled",
+    "education qualification": "education",
+})
+
+_KEY_VALUE_RE = re.compile(r"^([A-Za-z][A-Za-z0-9 /&()'_-]{0,40}):\s*(.*)$")
+_PLACEHOLDERS = {"", "-", "n/a", "na", "none", "null", "tbd", "tba", "not specified"}
+
+
+def field_key(name: str) -> str:
+    """Map a label ('Job Title') or key ('job_title') to the record key."""
+    name = name.strip()
+    lowered = name.lower()
+    if lowered in _LABEL_TO_KEY:
+        return _LABEL_TO_KEY[lowered]
+    return lowered.replace(" ", "_").replace("-", "_")
+
+
+def format_user_input(fields: dict) -> str:
+    """
+    Build the `Key: value` user_input block the agent expects.
+    Known fields come first in JOB_FIELDS order; extra fields follow as-is.
+    List values are joined with ", "; empty values are skipped.
+    """
+    by_key = {
+        field_key(str(k)): ", ".join(map(str, v)) if isinstance(v, (list, tuple)) else v
+        for k, v in fields.items()
+    }
+    known = {key for key, _ in JOB_FIELDS}
+
+    lines = []
+    for key, label in JOB_FIELDS:
+        value = by_key.get(key)
+        if value not in (None, ""):
+            lines.append(f"{label}: {value}")
+
+    for key, value in by_key.items():
+        if key not in known and value not in (None, ""):
+            lines.append(f"{key.replace('_', ' ').title()}: {value}")
+
+    return "\n".join(lines)
+
+
+# ---------------------------------------------------------------
+# RULE-BASED VALIDATION
+# ---------------------------------------------------------------
+def parse_user_input(text: str) -> Optional[dict]:
+    """
+    Parse a `Key: value` block into {record key: value}.
+    Lines that are not `Key: value` continue the previous field's value
+    (multi-line descriptions). Returns None for free-form or malformed
+    input: text before the first key, or fewer than two known fields.
+    """
+    fields = {}
+    current = None
+
+    for raw in (text or "").splitlines():
+        line = raw.strip()
+        if not line:
+            continue
+
+        match = _KEY_VALUE_RE.match(line)
+        if match:
+            current = field_key(match.group(1))
+            value = match.group(2).strip()
+            if current in fields and fields[current]:
+                value = f"{fields[current]} {value}".strip()
+            fields[current] = value
+        elif current is None:
+            return None
+        else:
+            fields[current] = f"{fields[current]} {line}".strip()
+
+    known = [key for key in fields if key in _LABELS]
+    if len(known) < 2:
+        return None
+    return fields
+
+
+def _normalize_value(key: str, value: str) -> str:
+    value = re.sub(r"\s+", " ", value).strip().strip(",;")
+    if value.lower() in _PLACEHOLDERS:
+        return ""
+    if key == "skills":
+        # De-duplicate comma-separated skills, keeping the first spelling
+        seen = {}
+        for skill in re.split(r"\s*[,;]\s*", value):
+            if skill and skill.lower() not in seen:
+                seen[skill.lower()] = skill
+        value = ", ".join(seen.values())
+    return value
+
+
+def validate_structured_input(text: str) -> Optional[ValidationNodeOutput]:
+    """
+    Deterministic validation + normalization for `Key: value` input.
+    Returns None when the input is not structured, so the caller can fall
+    back to the LLM validator.
+    """
+    fields = parse_user_input(text)
+    if fields is None:
+        return None
+
+    fields = {key: _normalize_value(key, value) for key, value in fields.items()}
+    normalized = format_user_input(fields)
+
+    missing = [_LABELS[key] for key in REQUIRED_FIELDS if not fields.get(key)]
+    if missing:
+        return ValidationNodeOutput(
+            validation_result=f"INVALID: Missing required field(s): {', '.join(missing)}",
+            normalized_input=normalized
+        )
+
+    result = "VALID"
+    missing_recommended = [_LABELS[key] for key in RECOMMENDED_FIELDS if not fields.get(key)]
+    if missing_recommended:
+        result += f" (missing recommended: {', '.join(missing_recommended)})"
+
+    return ValidationNodeOutput(validation_result=result, normalized_input=normalized)
+
+
+# ---------------------------------------------------------------
+# INCREMENTAL REGENERATION
+# ---------------------------------------------------------------
+# Field -> JD sections (renderer keys) written from it. None: the field
+# shapes the whole JD, so changing it needs a full run.
+FIELD_SECTIONS = {
+    "client": ("title", "about"),
+    "job_id": ("title",),
+    "job_title": None,
+    "description": ("summary", "responsibilities"),
+    "department": ("about", "summary"),
+    "experience": ("experience",),
+    "relevant_experience": ("experience", "skills"),
+    "skills": ("skills", "preferred", "responsibilities"),
+    "max_salary": ("title",),
+    "work_mode": ("title",),
+    "location": ("title",),
+    "employment_type": ("title",),
+    "positions_filled": ("title",),
+    "education": ("education",),
+}
+
+# Previous-run state carried into an incremental run. The quality verdict,
+# rewrite attempts and score history are left behind together: they judged
+# the previous JD, and an incremental run does not re-check
+CARRIED_STATE = ("draft", "reviewed")
+
+
+def changed_fields(previous: dict, fields: dict) -> dict:
+    """Record key -> new value for every field whose normalized value changed."""
+    before = {field_key(str(k)): _normalize_value(field_key(str(k)), str(v or "")) for k, v in previous.items()}
+    after = {field_key(str(k)): _normalize_value(field_key(str(k)), str(v or "")) for k, v in fields.items()}
+    return {
+        key: after.get(key, "")
+        for key in list(after) + [key for key in before if key not in after]
+        if before.get(key, "") != after.get(key, "")
+    }
+
+
+def stale_sections(reviewed: str, previous: dict, fields: dict) -> dict:
+    """
+    Body sections (not the title block) of a previous reviewed JD that
+    still quote the old value of an edited field, e.g. "this Pune-based
+    role" in the summary, as section key -> changes to apply. These are
+    stale after the edit even when FIELD_SECTIONS does not map the field
+    to them. Values under 3 characters are not searched.
+    """
+    before = {field_key(str(k)): _normalize_value(field_key(str(k)), str(v or "")) for k, v in previous.items()}
+    chunks = [(key, text.lower()) for key, text in split_section_text(reviewed) if key != "title"]
+
+    plan = {}
+    for key, value in changed_fields(previous, fields).items():
+        old = before.get(key, "").strip().lower()
+        if len(old) < 3:
+            continue
+        pattern = re.compile(r"(?<!\w)" + re.escape(old) + r"(?!\w)")
+        label = _LABELS.get(key, key)
+        change = f"{label} changed to: {value}" if value else f"{label} was removed"
+        for section, text in chunks:
+            if pattern.search(text) and change not in plan.get(section, []):
+                plan.setdefault(section, []).append(change)
+    return {key: plan[key] for key in SECTION_HEADINGS if key in plan}
+
+
+def plan_regeneration(previous: dict, fields: dict) -> Optional[dict]:
+    """
+    Sections to regenerate after an edit, as section key -> changes to apply
+    (in document order). Returns None when a change needs a full run (job
+    title or an unmapped field), and {} when nothing changed.
+    """
+    plan = {}
+    for key, value in changed_fields(previous, fields).items():
+        sections = FIELD_SECTIONS.get(key)
+        if sections is None:
+            return None
+        label = _LABELS.get(key, key)
+        change = f"{label} changed to: {value}" if value else f"{label} was removed"
+        for section in sections:
+            plan.setdefault(section, []).append(change)
+    return {key: plan[key] for key in SECTION_HEADINGS if key in plan}
+
+
+def regeneration_inputs(previous_result: dict, previous_fields: dict, fields: dict) -> Optional[dict]:
+    """
+    Agent input that reuses a previous run and regenerates only the
+    sections the edited fields feed. None when a full run is needed:
+    the previous run did not finish, a change touches the whole JD,
+    or nothing changed.
+    """
+    validation = (previous_result or {}).get("validation_result") or ""
+    if not validation.upper().startswith("VALID") or not previous_result.get("reviewed"):
+        return None
+
+    plan = plan_regeneration(previous_fields, fields)
+    if not plan:
+        return None
+
+    # Sections that quote an old value are rewritten too
+    for section, changes in stale_sections(previous_result["reviewed"], previous_fields, fields).items():
+        plan.setdefault(section, []).extend(change for change in changes if change not in plan[section])
+    plan = {key: plan[key] for key in SECTION_HEADINGS if key in plan}
+
+    inputs = {key: previous_result[key] for key in CARRIED_STATE if previous_result.get(key) is not None}
+    inputs.update(user_input=format_user_input(fields), regenerate=plan)
+    return inputs
@@ -0,0 +1,99 @@
+from contextlib import contextmanager
+import os
+import threading
+
+# Model tiers: "strong" writes and reviews, "fast" does mechanical work
+# (see utils/routing.py for which stage uses which)
+TIERS = ("strong", "fast")
+
+# Tier -> chat model the nodes call; filled on first use or by set_llm()
+_llms = {}
+_lock = threading.RLock()
+_cache = None
+
+
+def _response_cache():
+    """The response cache shared by every tier's client (built once)."""
+    global _cache
+    if _cache is None:
+        from jd_agent.utils.cache import build_response_cache
+        _cache = build_response_cache()
+    return _cache
+
+
+def default_llm(tier="strong"):
+    """
+    The production model of a tier at temperature 0, behind the response cache:
+    JD_AGENT_STRONG_MODEL (default gpt-4-turbo) or JD_AGENT_FAST_MODEL
+    (default gpt-4o-mini; empty = use the strong model for everything).
+    """
+    from langchain_openai import ChatOpenAI
+    from dotenv import load_dotenv
+
+    # Load environment variables (OPENAI_API_KEY, cache and model settings)
+    load_dotenv()
+
+    if tier == "fast":
+        model = os.getenv("JD_AGENT_FAST_MODEL", "gpt-4o-mini").strip()
+        if not model:
+            return get_llm("strong")
+    else:
+        model = os.getenv("JD_AGENT_STRONG_MODEL", "gpt-4-turbo").strip()
+
+    # Identical prompts at temperature=0 are served from the on-disk cache.
+    # Retries and backoff are the scheduler's job; the client timeout bounds
+    # a single (possibly stalled) request
+    return ChatOpenAI(
+        model=model,
+        temperature=0,
+        cache=_response_cache(),
+        timeout=float(os.getenv("JD_AGENT_LLM_TIMEOUT", "120")) or None,
+        max_retries=0
+    )
+
+
+def get_llm(tier="strong"):
+    """
+    The chat model the nodes of a tier currently call. Default clients are
+    built on first use, so injected models never need OpenAI credentials.
+    """
+    if tier not in TIERS:
+        raise ValueError(f"Unknown model tier {tier!r}, expected one of {TIERS}")
+    model = _llms.get(tier)
+    if model is None:
+        with _lock:
+            model = _llms.get(tier)
+            if model is None:
+                model = _llms[tier] = default_llm(tier)
+    return model
+
+
+def set_llm(model, tier=None):
+    """
+    Make the nodes call `model` (any LangChain chat model, e.g. a local
+    stand-in or FakeJDModel): for every tier, or only for `tier`. None
+    restores the default. Returns the previous model (of `tier`, or the
+    strong one).
+    """
+    with _lock:
+        previous = _llms.get(tier or "strong")
+        for name in ([tier] if tier else TIERS):
+            if model is None:
+                _llms.pop(name, None)
+            else:
+                _llms[name] = model
+    return previous
+
+
+@contextmanager
+def use_llm(model, tier=None):
+    """Temporarily route the LLM calls of every tier (or of `tier`) to `model`."""
+    with _lock:
+        saved = dict(_llms)
+    set_llm(model, tier)
+    try:
+        yield model
+    finally:
+        with _lock:
+            _llms.clear()
+            _llms.update(saved)
@@ -1,18 +1,214 @@
+from contextvars import ContextVar
+from functools import wraps
+import json
+import logging
+import os
+import sys
+import uuid
+
+
+# ---------------------------------------------------------------
+# SETTINGS
+# ---------------------------------------------------------------
+# DEBUG (state summaries + value previews), INFO (node progress + field
+# diffs), WARNING (default: problems only) or OFF
+LOG_LEVEL = os.getenv("JD_AGENT_LOG_LEVEL", "WARNING").strip().upper()
+
+# "text" for humans, "json" for one JSON object per line
+LOG_FORMAT = os.getenv("JD_AGENT_LOG_FORMAT", "text").strip().lower()
+
+# Characters of a value shown in DEBUG previews
+PREVIEW_CHARS = 120
+
+logger = logging.getLogger("jd_agent")
+
+
+# ---------------------------------------------------------------
+# RUN CORRELATION ID
+# ---------------------------------------------------------------
+# Id of the pipeline run the current node belongs to; copied into every log
+# record and metrics event so interleaved concurrent runs can be told apart
+_run_id = ContextVar("jd_agent_run_id", default=None)
+
+
+def new_run_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+def current_run_id():
+    """Correlation id of the run executing in this context, or None."""
+    return _run_id.get()
+
+
+def _bind(state, updates, run_id):
+    # The first node of a run stores the id in the state for the nodes after it
+    if state.run_id is None and isinstance(updates, dict):
+        updates = {**updates, "run_id": run_id}
+    return updates
+
+
+def bind_run_id(func):
+    """Wrap a sync node so it runs under the state's run id (creating one on the first node)."""
+    @wraps(func)
+    def wrapper(state):
+        run_id = state.run_id or new_run_id()
+        token = _run_id.set(run_id)
+        try:
+            return _bind(state, func(state), run_id)
+        finally:
+            _run_id.reset(token)
+    return wrapper
+
+
+def abind_run_id(afunc):
+    """Async version of bind_run_id."""
+    @wraps(afunc)
+    async def wrapper(state):
+        run_id = state.run_id or new_run_id()
+        token = _run_id.set(run_id)
+        try:
+            return _bind(state, await afunc(state), run_id)
+        finally:
+            _run_id.reset(token)
+    return wrapper
+
+
+# ---------------------------------------------------------------
+# HANDLER SETUP
+# ---------------------------------------------------------------
+class _RunIdFilter(logging.Filter):
+    def filter(self, record):
+        record.run_id = _run_id.get() or "-"
+        return True
+
+
+class _JSONFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "run_id": getattr(record, "run_id", "-"),
+            "message": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields is not None:
+            entry["fields"] = fields
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level=LOG_LEVEL, fmt=LOG_FORMAT, stream=None):
+    """
+    (Re)configure the "jd_agent" logger: level name or number ("OFF"
+    disables it entirely), "text" or "json" output, and the stream
+    (default stderr).
+    """
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.propagate = False
+
+    # Above CRITICAL, so every jd_agent.* logger skips its calls outright
+    if isinstance(level, str) and level.upper() == "OFF":
+        logger.setLevel(logging.CRITICAL + 1)
+        return logger
+
+    logger.setLevel(level.upper() if isinstance(level, str) else level)
+
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.addFilter(_RunIdFilter())
+    if fmt == "json":
+        handler.setFormatter(_JSONFormatter())
+    else:
+        handler.setFormatter(logging.Formatter(
+            "%(asctime)s %(levelname)-7s [%(run_id)s] %(name)s: %(message)s"
+        ))
+    logger.addHandler(handler)
+    return logger
+
+
+configure_logging()
+
+
+# ---------------------------------------------------------------
+# STATE LOGGING
+# ---------------------------------------------------------------
+class _Lazy:
+    """Defers building a log message until a handler actually formats it."""
+
+    def __init__(self, build, *args):
+        self._build = build
+        self._args = args
+
+    def __str__(self):
+        return self._build(*self._args)
+
+
+def _summary(value, preview=False):
+    if value is None:
+        return "None"
+    if isinstance(value, str):
+        text = f"{len(value)} chars"
+        if preview and value:
+            text += f" {value[:PREVIEW_CHARS]!r}"
+        return text
+    if hasattr(value, "model_dump"):
+        value = value.model_dump(by_alias=True)
+    if isinstance(value, dict) and preview:
+        return repr(value)[:PREVIEW_CHARS]
+    if isinstance(value, dict):
+        # Scalars inline (score, pass, ...), containers by name only
+        return "{" + ", ".join(
+            f"{key}={item}" if isinstance(item, (bool, int, float)) else key
+            for key, item in value.items()
+        ) + "}"
+    return repr(value)[:PREVIEW_CHARS]
+
+
+def _state_message(label, state, preview):
+    # Reads fields in place: no model_dump()/dict() copy of the drafts
+    fields = ", ".join(
+        f"{name}={_summary(getattr(state, name), preview)}"
+        for name in type(state).model_fields
+        if getattr(state, name) not in (None, "", 0)
+    )
+    return f"{label}: {fields}"
+
+
+def _changes(updates, state):
+    return {
+        key: (getattr(state, key, None), value)
+        for key, value in updates.items()
+        if state is None or getattr(state, key, None) != value
+    }
+
+
+def _diff_message(label, updates, state, preview):
+    changes = _changes(updates, state)
+    if not changes:
+        return f"{label}: no changes"
+    parts = [
+        f"{key}: {_summary(old, preview)} -> {_summary(new, preview)}"
+        for key, (old, new) in changes.items()
+    ]
+    return f"{label}: " + "; ".join(parts)
+
+
 def log_state(label: str, state):
-    """Log the current state before a node executes."""
-    print("\n--------------------------------------------")
-    print(f"STATE BEFORE: [{label}]")
-    print("--------------------------------------------")
-    for k, v in state.dict().items():
-        print(f"{k}: {repr(v)[:180]}")  
-    print("--------------------------------------------\n")
-
-
-def log_update(label: str, updates: dict):
-    """Log the updates returned by a node."""
-    print("\n>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>")
-    print(f"STATE UPDATE FROM NODE: [{label}]")
-    print(">>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>")
-    for k, v in updates.items():
-        print(f"{k}: {repr(v)[:180]}")
-    print(">>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>\n")
\ No newline at end of file
+    """Log the node start, with a per-field state summary at DEBUG."""
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("%s", _Lazy(_state_message, label, state, True))
+    else:
+        logger.info("%s", label)
+
+
+def log_update(label: str, updates: dict, state=None):
+    """Log which fields a node changed (sizes at INFO, value previews at DEBUG)."""
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    preview = logger.isEnabledFor(logging.DEBUG)
+    logger.info(
+        "%s", _Lazy(_diff_message, label, updates, state, preview),
+        extra={"fields": sorted(updates)}
+    )
@@ -0,0 +1,311 @@
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.tracers.context import register_configure_hook
+from jd_agent.utils.logger import current_run_id
+from collections import defaultdict, deque
+from contextvars import ContextVar
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import threading
+import time
+
+
+# ---------------------------------------------------------------
+# SETTINGS
+# ---------------------------------------------------------------
+# JSONL file that receives one event per node execution (unset = no file)
+METRICS_LOG_PATH = os.getenv("JD_AGENT_METRICS_LOG")
+
+# Samples kept per node for percentile estimates
+MAX_SAMPLES = 10_000
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+# ---------------------------------------------------------------
+# PER-NODE LLM CALL RECORDER
+# ---------------------------------------------------------------
+# The recorder for the node currently executing. Registered as a configure
+# hook, so LangChain attaches it to every LLM call made while it is set,
+# including calls on worker threads and asyncio tasks spawned by the node.
+_current_recorder = ContextVar("jd_agent_node_recorder", default=None)
+register_configure_hook(_current_recorder, inheritable=True)
+
+
+class LLMCallRecorder(BaseCallbackHandler):
+    """Collects latency, token usage and cache hits for the LLM calls of one node run."""
+
+    # Record in the caller's thread/loop instead of a callback executor
+    run_inline = True
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = {}
+        self.calls = 0
+        self.llm_ms = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.cache_hits = 0
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        started = self._started.pop(run_id, None)
+        elapsed = (time.perf_counter() - started) * 1000 if started else 0.0
+
+        usage = {}
+        generations = response.generations[0] if response.generations else []
+        message = getattr(generations[0], "message", None) if generations else None
+        if message is not None and getattr(message, "usage_metadata", None):
+            usage = message.usage_metadata
+
+        # LangChain zeroes total_cost on responses served from the cache
+        cached = usage.get("total_cost") == 0
+
+        with self._lock:
+            self.calls += 1
+            self.llm_ms += elapsed
+            if cached:
+                self.cache_hits += 1
+            else:
+                self.prompt_tokens += usage.get("input_tokens", 0)
+                self.completion_tokens += usage.get("output_tokens", 0)
+                # Prompt tokens the provider served from its prefix cache
+                self.cached_tokens += (usage.get("input_token_details") or {}).get("cache_read", 0)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        started = self._started.pop(run_id, None)
+        with self._lock:
+            self.calls += 1
+            if started:
+                self.llm_ms += (time.perf_counter() - started) * 1000
+
+
+# ---------------------------------------------------------------
+# AGGREGATE
+# ---------------------------------------------------------------
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class MetricsRegistry:
+    """In-process aggregate of node events: counters plus recent latency samples."""
+
+    def __init__(self, max_samples=MAX_SAMPLES):
+        self._lock = threading.Lock()
+        self._wall = defaultdict(lambda: deque(maxlen=max_samples))
+        self._llm = defaultdict(lambda: deque(maxlen=max_samples))
+        self._counters = defaultdict(lambda: defaultdict(float))
+
+    def record(self, event):
+        node = event["node"]
+        with self._lock:
+            self._wall[node].append(event["wall_ms"])
+            if event["llm_calls"]:
+                self._llm[node].append(event["llm_ms"])
+            counters = self._counters[node]
+            counters["runs"] += 1
+            counters["errors"] += event["status"] == "error"
+            counters["wall_ms_sum"] += event["wall_ms"]
+            counters["llm_calls"] += event["llm_calls"]
+            counters["llm_ms_sum"] += event["llm_ms"]
+            counters["prompt_tokens"] += event["prompt_tokens"]
+            counters["completion_tokens"] += event["completion_tokens"]
+            counters["cached_tokens"] += event["cached_tokens"]
+            counters["cache_hits"] += event["cache_hits"]
+
+    def snapshot(self):
+        """
+        Per-node counters, p50/p95/p99 of wall time and LLM latency (ms), and
+        the share of prompt tokens served from the provider's prefix cache.
+        """
+        with self._lock:
+            result = {}
+            for node, counters in self._counters.items():
+                result[node] = {
+                    **{key: round(value, 3) for key, value in counters.items()},
+                    "cached_token_ratio": round(
+                        counters["cached_tokens"] / counters["prompt_tokens"], 4
+                    ) if counters["prompt_tokens"] else 0.0,
+                    "wall_ms": {f"p{int(q * 100)}": round(_percentile(self._wall[node], q), 3)
+                                for q in QUANTILES},
+                    "llm_ms": {f"p{int(q * 100)}": round(_percentile(self._llm[node], q), 3)
+                               for q in QUANTILES},
+                }
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._wall.clear()
+            self._llm.clear()
+            self._counters.clear()
+
+    def render_prometheus(self):
+        """Prometheus text exposition of the current aggregate."""
+        snapshot = self.snapshot()
+        lines = []
+
+        def summary(name, help_text, key, sum_key, count_key):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} summary")
+            for node, data in snapshot.items():
+                for q in QUANTILES:
+                    value = round(data[key][f"p{int(q * 100)}"] / 1000, 6)
+                    lines.append(f'{name}{{node="{node}",quantile="{q}"}} {value}')
+                lines.append(f'{name}_sum{{node="{node}"}} {round(data[sum_key] / 1000, 6)}')
+                lines.append(f'{name}_count{{node="{node}"}} {int(data[count_key])}')
+
+        def counter(name, help_text, key, label=None):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for node, data in snapshot.items():
+                labels = f'node="{node}"' + (f',{label}' if label else "")
+                lines.append(f"{name}{{{labels}}} {int(data[key])}")
+
+        summary("jd_agent_node_duration_seconds", "Wall time per node execution.",
+                "wall_ms", "wall_ms_sum", "runs")
+        summary("jd_agent_llm_duration_seconds", "LLM time per node execution.",
+                "llm_ms", "llm_ms_sum", "runs")
+        counter("jd_agent_node_runs_total", "Node executions.", "runs")
+        counter("jd_agent_node_errors_total", "Node executions that raised.", "errors")
+        counter("jd_agent_llm_calls_total", "LLM calls.", "llm_calls")
+        lines.append("# HELP jd_agent_llm_tokens_total Tokens billed (response cache hits excluded); cached_prompt is the part of prompt served from the provider's prefix cache.")
+        lines.append("# TYPE jd_agent_llm_tokens_total counter")
+        for node, data in snapshot.items():
+            lines.append(f'jd_agent_llm_tokens_total{{node="{node}",kind="prompt"}} {int(data["prompt_tokens"])}')
+            lines.append(f'jd_agent_llm_tokens_total{{node="{node}",kind="completion"}} {int(data["completion_tokens"])}')
+            lines.append(f'jd_agent_llm_tokens_total{{node="{node}",kind="cached_prompt"}} {int(data["cached_tokens"])}')
+        counter("jd_agent_llm_cache_hits_total", "LLM calls served from the response cache.", "cache_hits")
+
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+_log_lock = threading.Lock()
+
+
+def emit(event):
+    """Record a node event in the aggregate and append it to METRICS_LOG_PATH."""
+    registry.record(event)
+    if METRICS_LOG_PATH:
+        with _log_lock, open(METRICS_LOG_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(event) + "\n")
+
+
+# ---------------------------------------------------------------
+# NODE WRAPPERS
+# ---------------------------------------------------------------
+def _event(name, state, started, recorder, status):
+    return {
+        "ts": time.time(),
+        "run_id": current_run_id(),
+        "node": name,
+        "status": status,
+        "rewrite_iteration": getattr(state, "rewrite_attempts", 0),
+        "wall_ms": round((time.perf_counter() - started) * 1000, 3),
+        "llm_calls": recorder.calls,
+        "llm_ms": round(recorder.llm_ms, 3),
+        "prompt_tokens": recorder.prompt_tokens,
+        "completion_tokens": recorder.completion_tokens,
+        "cached_tokens": recorder.cached_tokens,
+        "cache_hits": recorder.cache_hits,
+    }
+
+
+def instrument(name, func):
+    """Wrap a sync node so each execution emits a metrics event."""
+    @wraps(func)
+    def wrapper(state):
+        recorder = LLMCallRecorder()
+        token = _current_recorder.set(recorder)
+        started = time.perf_counter()
+        status = "error"
+        try:
+            updates = func(state)
+            status = "ok"
+            return updates
+        finally:
+            _current_recorder.reset(token)
+            emit(_event(name, state, started, recorder, status))
+    return wrapper
+
+
+def ainstrument(name, afunc):
+    """Async version of instrument."""
+    @wraps(afunc)
+    async def wrapper(state):
+        recorder = LLMCallRecorder()
+        token = _current_recorder.set(recorder)
+        started = time.perf_counter()
+        status = "error"
+        try:
+            updates = await afunc(state)
+            status = "ok"
+            return updates
+        finally:
+            _current_recorder.reset(token)
+            emit(_event(name, state, started, recorder, status))
+    return wrapper
+
+
+# ---------------------------------------------------------------
+# EXPORT
+# ---------------------------------------------------------------
+def render_all():
+    """Node metrics plus the LLM scheduler's queue and model routing metrics, as Prometheus text."""
+    from jd_agent.utils import routing
+    from jd_agent.utils.scheduler import get_scheduler
+    return registry.render_prometheus() + get_scheduler().render_prometheus() + routing.render_prometheus()
+
+
+def dump_prometheus(path):
+    """Write the Prometheus text exposition to a file (for batch runs / node_exporter)."""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(render_all())
+
+
+def serve_metrics(port=9464, host="127.0.0.1"):
+    """
+    Serve /metrics (Prometheus text), /metrics.json (per node) and
+    /scheduler.json (LLM queue) from a daemon thread.
+    Returns the server; call .shutdown() to stop it.
+    """
+    from jd_agent.utils.scheduler import get_scheduler
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics":
+                body = render_all().encode("utf-8")
+                content_type = "text/plain; version=0.0.4"
+            elif self.path == "/metrics.json":
+                body = json.dumps(registry.snapshot()).encode("utf-8")
+                content_type = "application/json"
+            elif self.path == "/scheduler.json":
+                body = json.dumps(get_scheduler().stats()).encode("utf-8")
+                content_type = "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
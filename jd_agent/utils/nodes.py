@@ -1,68 +1,216 @@
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import SystemMessage, HumanMessage
+from jd_agent.prompts import get_prompt
+from jd_agent.utils.routing import acall_stage, call_stage, model_for
+from jd_agent.utils.budget import MAX_INPUT_TOKENS, budget_exceeded, count_messages, count_tokens, degrade, truncate_input
 from jd_agent.utils.logger import log_state, log_update
+from jd_agent.utils.renderer import (
+    SECTION_HEADINGS,
+    parse_sections,
+    parsed_from_structured,
+    render_markdown,
+    render_text,
+    splice_sections,
+    split_section_text,
+    structured_from_parsed
+)
+from jd_agent.utils.fields import validate_structured_input
+from jd_agent.utils.scoring import PRESCORE_ENABLED, estimate_quality, log_score_sample
+from jd_agent.utils.similar import get_similar_index
 from jd_agent.utils.validators import (
     ValidationNodeOutput,
     DraftNodeOutput,
     QualityCheckOutput,
+    QualityScore,
+    PASS_THRESHOLD,
+    ScoreRecord,
     RewriteNodeOutput,
     ReviewNodeOutput,
+    RegenerateNodeOutput,
+    AdaptNodeOutput,
+    StructuredJD,
     FinalOutputNodeOutput
 )
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+import asyncio
+import logging
+import os
 import re
 import json
+import sqlite3
+import time
+
+logger = logging.getLogger(__name__)
+
+# Number of format conversions final_output_node runs at once (1 = sequential)
+FINAL_OUTPUT_WORKERS = int(os.getenv("JD_AGENT_FINAL_OUTPUT_WORKERS", "3"))
+
+# "section": rewrite only the sections the quality check blamed, in parallel;
+# "full": regenerate the whole draft every time
+REWRITE_MODE = os.getenv("JD_AGENT_REWRITE_MODE", "section").strip().lower()
+SECTION_REWRITE_WORKERS = int(os.getenv("JD_AGENT_SECTION_REWRITE_WORKERS", "4"))
+
+# Beyond this many blamed sections a full rewrite costs about the same
+MAX_SECTION_REWRITES = 4
+
+# Rewrite loop control: at most JD_AGENT_MAX_REWRITES rewrites, and stop
+# early once a rewrite gains less than JD_AGENT_REWRITE_MIN_DELTA points or
+# the loop has used its time (seconds) or token budget (0 = off / no budget)
+MAX_REWRITES = int(os.getenv("JD_AGENT_MAX_REWRITES", "3"))
+REWRITE_MIN_DELTA = int(os.getenv("JD_AGENT_REWRITE_MIN_DELTA", "0"))
+REWRITE_TIME_BUDGET = float(os.getenv("JD_AGENT_REWRITE_TIME_BUDGET", "0"))
+REWRITE_TOKEN_BUDGET = int(os.getenv("JD_AGENT_REWRITE_TOKEN_BUDGET", "0"))
+
+# Typical size of a quality check verdict, for the run budget's estimates
+VERDICT_TOKENS = 300
+
+# Single-shot review: review_node returns a StructuredJD through tool calling
+# and final_output_node renders Markdown, JSON and text from it locally
+STRUCTURED_REVIEW = os.getenv("JD_AGENT_STRUCTURED_REVIEW", "0").strip().lower() in ("1", "true", "yes", "on")
+
+
+def _updates(validated):
+    """
+    A node output model as state updates: its fields as they are, so nested
+    models (QualityScore, StructuredJD, ...) reach the state without a
+    model_dump() and re-validation round-trip.
+    """
+    return dict(validated)
+
+
+def _strip_code_fence(content):
+    """Remove a surrounding ```/```json fence from an LLM response."""
+    content = content.strip()
+    if content.startswith("```"):
+        content = content.split("```")[1]
+        if content.startswith("json"):
+            content = content[4:]
+    return content.strip()
+
+
+def _conversion_messages(prompt, reviewed):
+    return [
+        SystemMessage(content=prompt),
+        HumanMessage(content=reviewed)
+    ]
+
+
+def _collect_conversions(outcomes, fallback=False):
+    """
+    Turn per-format call outcomes (message or exception) into contents.
+    A failed format maps to None; raises only if every format failed and
+    there is no local `fallback` for them.
+    """
+    results = {}
+    errors = {}
+    for name, outcome in outcomes.items():
+        if isinstance(outcome, Exception):
+            logger.warning("⚠️ %s conversion failed: %s", name, outcome)
+            results[name] = None
+            errors[name] = outcome
+        else:
+            results[name] = outcome.content
+
+    if errors and len(errors) == len(outcomes) and not fallback:
+        raise next(iter(errors.values()))
+
+    return results
+
+
+def _has_content(result):
+    return bool(result.content.strip())
+
+
+def _is_json(result):
+    try:
+        json.loads(_strip_code_fence(result.content))
+    except ValueError:
+        return False
+    return True
+
+
+# Output checks for the format conversions (a failed check escalates the call)
+_CONVERSION_CHECKS = {"markdown": _has_content, "json": _is_json, "text": _has_content}
+
 
-from dotenv import load_dotenv
+def _invoke_all(requests, workers, stage, checks=None):
+    """
+    Make one LLM call per named message list, at most `workers` at once,
+    routed as `stage` ("{name}" is replaced by the request name) and
+    checked with checks[name] when given.
+    Returns name -> response message, or the exception the call raised.
+    """
+    workers = max(1, min(workers, len(requests)))
+    checks = checks or {}
+
+    # ContextThreadPoolExecutor keeps the LangGraph run config (callbacks,
+    # tracing) attached to the calls made from worker threads
+    with ContextThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            name: pool.submit(call_stage, stage.format(name=name), messages, checks.get(name))
+            for name, messages in requests.items()
+        }
+
+    outcomes = {}
+    for name, future in futures.items():
+        try:
+            outcomes[name] = future.result()
+        except Exception as e:
+            outcomes[name] = e
+    return outcomes
+
+
+async def _ainvoke_all(requests, workers, stage, checks=None):
+    """Async version of _invoke_all (same worker bound)."""
+    semaphore = asyncio.Semaphore(max(1, workers))
+    checks = checks or {}
+
+    async def call(name, messages):
+        async with semaphore:
+            return await acall_stage(stage.format(name=name), messages, checks.get(name))
+
+    outcomes = await asyncio.gather(
+        *(call(name, messages) for name, messages in requests.items()),
+        return_exceptions=True
+    )
+    return dict(zip(requests, outcomes))
 
-# Load environment variables
-load_dotenv()
 
-llm = ChatOpenAI(model="gpt-4-turbo", temperature=0)
+def _run_format_conversions(prompts, reviewed, fallback=False):
+    """
+    Run one LLM conversion per format over the reviewed JD.
+    Returns a dict of format name -> converted content, or None for a format
+    whose call failed. Raises only if every format failed and `fallback`
+    (the formats can be rendered locally instead) is off.
+    """
+    requests = {name: _conversion_messages(prompt, reviewed) for name, prompt in prompts.items()}
+    return _collect_conversions(
+        _invoke_all(requests, FINAL_OUTPUT_WORKERS, "final_{name}", _CONVERSION_CHECKS), fallback
+    )
+
+
+async def _arun_format_conversions(prompts, reviewed, fallback=False):
+    """Async version of _run_format_conversions (same worker bound)."""
+    requests = {name: _conversion_messages(prompt, reviewed) for name, prompt in prompts.items()}
+    return _collect_conversions(
+        await _ainvoke_all(requests, FINAL_OUTPUT_WORKERS, "final_{name}", _CONVERSION_CHECKS), fallback
+    )
 
 
 # ---------------------------------------------------------------
 # 1. VALIDATION NODE
 # ---------------------------------------------------------------
-def validation_node(state):
-    print("\n========== [VALIDATION NODE] ==========\n")
-    log_state("VALIDATION NODE (START)", state)
+def _validation_messages(state):
+    return [
+        SystemMessage(content=get_prompt("validation")),
+        HumanMessage(content=f"User Input:\n{state.user_input}")
+    ]
 
-    system_prompt = """
-    You are a job description input validator.
-    
-    TASK:
-    1. Check if required fields are present:
-       - Job Title (mandatory)
-       - Client/Company Name (mandatory)
-       - Experience (recommended)
-       - Skills (recommended)
-    
-    2. Normalize the input by:
-       - Structuring the data clearly
-       - Filling in defaults where appropriate
-       - Correcting obvious typos
-       - Ensuring consistency
-    
-    3. Respond with:
-       - "VALID" if all required fields present
-       - "INVALID: <reason>" if critical fields missing
-    
-    Then provide the normalized input in a structured format.
-    
-    Format your response as:
-    VALIDATION: <VALID or INVALID: reason>
-    
-    NORMALIZED INPUT:
-    <structured input>
-    """
 
-    result = llm.invoke([
-        SystemMessage(content=system_prompt),
-        HumanMessage(content=f"User Input:\n{state.user_input}")
-    ])
+def _validation_parsed(result):
+    return "VALIDATION:" in result.content
 
-    content = result.content
-    
+
+def _validation_updates(state, content):
     # Parse validation result
     if "VALIDATION:" in content:
         parts = content.split("NORMALIZED INPUT:", 1)
@@ -77,270 +225,761 @@ def validation_node(state):
         normalized_input=normalized
     )
     
-    updates = validated.model_dump()
-    log_update("VALIDATION NODE (END)", updates)
+    updates = _updates(validated)
+    log_update("VALIDATION NODE (END)", updates, state)
+    return updates
+
+
+def _rule_based_validation(state):
+    """
+    Validate structured `Key: value` input (as built by app.py and the batch
+    runner) without an LLM call. Returns None for free-form or malformed input.
+    """
+    validated = validate_structured_input(state.user_input)
+    if validated is None:
+        return None
+
+    logger.info("⚡ Structured input detected — validated without an LLM call.")
+
+    # Input built by format_user_input normalizes to itself: keep one copy
+    if validated.normalized_input == state.user_input:
+        validated.normalized_input = state.user_input
+
+    updates = _updates(validated)
+    log_update("VALIDATION NODE (END)", updates, state)
+    return updates
+
+
+def _with_reference(state, updates):
+    """
+    Attach the most similar past JD to valid input, for the adapt step.
+    No-op when the similar-JD index is off or this is an incremental run.
+    """
+    index = get_similar_index()
+    if index is None or state.regenerate or not updates["validation_result"].upper().startswith("VALID"):
+        return updates
+
+    try:
+        match = index.query(updates["normalized_input"])
+    except sqlite3.Error as e:
+        logger.warning("⚠️ Similar-JD lookup failed: %s — drafting from scratch.", e)
+        return updates
+    if match is None:
+        return updates
+
+    logger.info("🔁 Similar past JD found (similarity %.2f) — adapting it instead of drafting.", match.similarity)
+    return {**updates, "reference_jd": match.reviewed, "reference_similarity": match.similarity}
+
+
+def _bounded_input(state):
+    """The state with user_input cut to JD_AGENT_MAX_INPUT_TOKENS (the same state when it fits)."""
+    text, truncated = truncate_input(state.user_input)
+    if not truncated:
+        return state
+    degrade("input", f"User input is over {MAX_INPUT_TOKENS} tokens — truncated before validation.")
+    return state.model_copy(update={"user_input": text})
+
+
+def _validation_result(state, bounded, updates):
+    updates = _with_reference(bounded, updates)
+    if bounded is not state:
+        # Later nodes (and the caller) see the input that was actually used
+        updates["user_input"] = bounded.user_input
     return updates
 
 
+def validation_node(state):
+    log_state("VALIDATION NODE (START)", state)
+
+    bounded = _bounded_input(state)
+    updates = _rule_based_validation(bounded)
+    if updates is None:
+        result = call_stage("validation", _validation_messages(bounded), _validation_parsed)
+        updates = _validation_updates(bounded, result.content)
+    return _validation_result(state, bounded, updates)
+
+
+async def avalidation_node(state):
+    """Async version of validation_node."""
+    log_state("VALIDATION NODE (START)", state)
+
+    bounded = _bounded_input(state)
+    updates = _rule_based_validation(bounded)
+    if updates is None:
+        result = await acall_stage("validation", _validation_messages(bounded), _validation_parsed)
+        updates = _validation_updates(bounded, result.content)
+    return _validation_result(state, bounded, updates)
+
+
 # ---------------------------------------------------------------
 # 2. DRAFT NODE
 # ---------------------------------------------------------------
+def _draft_messages(state):
+    return [
+        SystemMessage(content=get_prompt("draft")),
+        HumanMessage(content=f"Normalized Input:\n{state.normalized_input}")
+    ]
+
+
+def _draft_updates(state, content):
+    validated = DraftNodeOutput(draft=content)
+    updates = _updates(validated)
+
+    log_update("DRAFT NODE (END)", updates, state)
+    return updates
+
+
 def draft_node(state):
-    print("\n========== [DRAFT NODE] ==========\n")
     log_state("DRAFT NODE (START)", state)
 
-    system_prompt = """
-    You are an expert HR Job Description writer.
-    
-    TASK:
-    Create a FIRST DRAFT of a professional job description with these sections:
-    
-    1. **Job Title and Metadata** (Job ID, Work Mode, Location, etc.)
-    2. **About Us** (2-3 paragraphs about the company)
-    3. **Job Summary** (Brief overview of the role)
-    4. **Key Responsibilities** (5-8 bullet points)
-    5. **Required Skills** (Technical and soft skills)
-    6. **Preferred Qualifications** (Nice-to-have)
-    7. **Education** (Educational requirements)
-    8. **Experience** (Experience requirements)
-    
-    IMPORTANT:
-    - Use the normalized input provided
-    - Keep it professional and clear
-    - Make it realistic and achievable
-    - Use action verbs for responsibilities
-    - Be specific about requirements
-    - No generic fluff or buzzwords
-    """
+    result = call_stage("draft", _draft_messages(state))
+    return _draft_updates(state, result.content)
 
-    result = llm.invoke([
-        SystemMessage(content=system_prompt),
-        HumanMessage(content=f"Normalized Input:\n{state.normalized_input}")
-    ])
 
-    validated = DraftNodeOutput(draft=result.content)
-    updates = validated.model_dump()
+async def adraft_node(state):
+    """Async version of draft_node."""
+    log_state("DRAFT NODE (START)", state)
 
-    log_update("DRAFT NODE (END)", updates)
-    return updates
+    result = await acall_stage("draft", _draft_messages(state))
+    return _draft_updates(state, result.content)
 
 
 # ---------------------------------------------------------------
 # 3. QUALITY CHECK NODE
 # ---------------------------------------------------------------
-def quality_check_node(state):
-    print("\n========== [QUALITY CHECK NODE] ==========\n")
-    log_state("QUALITY CHECK NODE (START)", state)
+def _quality_check_messages(state):
+    return [
+        SystemMessage(content=get_prompt("quality_check")),
+        HumanMessage(content=f"Draft JD:\n{state.draft}")
+    ]
 
-    system_prompt = """
-    You are a job description quality evaluator.
-    
-    TASK:
-    Evaluate the draft JD based on these criteria:
-    
-    1. **Structure** (30 points): All required sections present and well-organized
-    2. **Tone** (25 points): Professional, inclusive, engaging
-    3. **Realism** (25 points): Requirements are realistic, not overstuffed
-    4. **Clarity** (20 points): Clear, concise, no jargon overload
-    
-    SCORING:
-    - 85-100: Excellent (PASS)
-    - 70-84: Good but needs minor improvements (PASS)
-    - Below 70: Needs rewrite (FAIL)
-    
-    Respond ONLY with valid JSON:
-    {
-      "score": 85,
-      "structure_score": 28,
-      "tone_score": 23,
-      "realism_score": 22,
-      "clarity_score": 18,
-      "pass": true,
-      "issues": ["Issue 1", "Issue 2"]
-    }
-    
-    NO markdown, NO backticks, NO extra text.
+
+def _json_mode(model):
+    """
+    `model` in JSON mode, parsing straight into QualityScore. Models
+    without structured output support (local stand-ins) are returned
+    as-is; their plain answer is parsed instead.
     """
+    try:
+        return model.with_structured_output(QualityScore, method="json_mode", include_raw=True)
+    except (NotImplementedError, ValueError):
+        return model
 
-    result = llm.invoke([
-        SystemMessage(content=system_prompt),
-        HumanMessage(content=f"Draft JD:\n{state.draft}")
-    ])
 
-    # Clean JSON response
-    content = result.content.strip()
-    if content.startswith("```"):
-        content = content.split("```")[1]
-        if content.startswith("json"):
-            content = content[4:]
-    content = content.strip()
+def _parse_quality_score(content):
+    """Lenient parse of a text answer into QualityScore; None if unusable."""
+    try:
+        return QualityScore.model_validate(json.loads(_strip_code_fence(content)))
+    except (ValueError, TypeError):
+        return None
+
+
+def _tokens_used(*responses):
+    """Total tokens the providers reported for these responses (0 where unknown)."""
+    total = 0
+    for response in responses:
+        if isinstance(response, dict):
+            response = response.get("raw")
+        usage = getattr(response, "usage_metadata", None) or {}
+        total += usage.get("total_tokens", 0)
+    return total
+
 
-    validated = QualityCheckOutput(quality_check=content)
-    updates = validated.model_dump()
+def _beats_best(score, best_score, best_source):
+    """
+    Whether a verdict replaces the best draft. Pre-scorer estimates and LLM
+    verdicts are not on the same scale: scores are only compared within one
+    source, and an LLM verdict always outranks a heuristic best.
+    """
+    if best_score is None or best_source is None:
+        return True
+    if score.source != best_source:
+        return score.source == "llm"
+    return score.score > best_score
+
+
+def _quality_check_output(state, score, tokens=0):
+    """Updates for a verdict: the score joins the history, and the draft becomes the best one if it beats it."""
+    started = state.loop_started_at or time.time()
+    loop_tokens = state.loop_tokens + tokens
+    history = state.score_history
+    best_draft, best_score, best_source = state.best_draft, state.best_score, state.best_source
+
+    if score is not None:
+        history = history + [ScoreRecord(
+            attempt=state.rewrite_attempts,
+            score=score.score,
+            passed=score.passed,
+            source=score.source,
+            elapsed_s=round(time.time() - started, 3),
+            loop_tokens=loop_tokens
+        )]
+        if _beats_best(score, best_score, best_source):
+            best_draft, best_score, best_source = state.draft, score.score, score.source
+
+    validated = QualityCheckOutput(
+        quality_check=score,
+        score_history=history,
+        best_draft=best_draft,
+        best_score=best_score,
+        best_source=best_source,
+        loop_started_at=started,
+        loop_tokens=loop_tokens
+    )
+    updates = _updates(validated)
 
-    log_update("QUALITY CHECK NODE (END)", updates)
+    log_update("QUALITY CHECK NODE (END)", updates, state)
     return updates
 
 
+def _prescore(state):
+    """
+    Estimate the rubric locally. Returns (estimate, updates): updates is set
+    when the estimate is confidently above/below the threshold and the LLM
+    judge can be skipped, otherwise None.
+    """
+    if not PRESCORE_ENABLED:
+        return None, None
+
+    estimate = estimate_quality(state.draft)
+    if estimate.decision is None:
+        logger.info("🔎 Pre-score %s/100 is inconclusive — asking the LLM judge.", estimate.score.score)
+        return estimate, None
+
+    verdict = "pass" if estimate.decision else "fail"
+    logger.info("⚡ Pre-score %s/100 is a confident %s — skipping the LLM judge.", estimate.score.score, verdict)
+    estimate.score.passed = estimate.decision
+    return estimate, _quality_check_output(state, estimate.score)
+
+
+def _quality_score(response):
+    """QualityScore from a JSON-mode or plain answer; None if unusable."""
+    if isinstance(response, dict):
+        # Structured output: already parsed unless the model broke the schema
+        score = response.get("parsed")
+        if score is None:
+            score = _parse_quality_score(response["raw"].content)
+        return score
+    return _parse_quality_score(response.content)
+
+
+def _quality_check_parsed(response):
+    return _quality_score(response) is not None
+
+
+def _quality_check_updates(state, response, estimate):
+    score = _quality_score(response)
+
+    if score is None:
+        logger.warning("⚠️ Quality check answer could not be parsed.")
+    elif estimate is not None:
+        log_score_sample(state.draft, estimate, score)
+
+    return _quality_check_output(state, score, _tokens_used(response))
+
+
+def _over_budget_check(state, estimate):
+    """
+    Updates when the run cannot afford the LLM judge: the inconclusive
+    pre-score (if any) stands in for its verdict. None otherwise.
+    """
+    reason = budget_exceeded(
+        state.budget, count_messages(_quality_check_messages(state)), VERDICT_TOKENS, model_for("quality_check")
+    )
+    if reason is None:
+        return None
+
+    degrade("quality_check", f"{reason.capitalize()} — skipping the LLM quality check.")
+    score = None
+    if estimate is not None:
+        score = estimate.score
+        score.passed = score.score >= PASS_THRESHOLD
+    return _quality_check_output(state, score)
+
+
+def quality_check_node(state):
+    log_state("QUALITY CHECK NODE (START)", state)
+
+    estimate, updates = _prescore(state)
+    if updates is None:
+        updates = _over_budget_check(state, estimate)
+    if updates is not None:
+        return updates
+
+    result = call_stage("quality_check", _quality_check_messages(state), _quality_check_parsed, _json_mode)
+    return _quality_check_updates(state, result, estimate)
+
+
+async def aquality_check_node(state):
+    """Async version of quality_check_node."""
+    log_state("QUALITY CHECK NODE (START)", state)
+
+    estimate, updates = _prescore(state)
+    if updates is None:
+        updates = _over_budget_check(state, estimate)
+    if updates is not None:
+        return updates
+
+    result = await acall_stage("quality_check", _quality_check_messages(state), _quality_check_parsed, _json_mode)
+    return _quality_check_updates(state, result, estimate)
+
+
 # ---------------------------------------------------------------
 # 4. REWRITE NODE
 # ---------------------------------------------------------------
-def rewrite_node(state):
-    print("\n========== [REWRITE NODE] ==========\n")
-    log_state("REWRITE NODE (START)", state)
+def _quality_check_json(state):
+    if state.quality_check is None:
+        return "Not available"
+    return state.quality_check.model_dump_json(by_alias=True)
 
-    system_prompt = """
-    You are a job description improvement specialist.
-    
-    TASK:
-    Rewrite the draft to address all identified issues:
-    - Fix structural problems
-    - Improve tone and inclusivity
-    - Make requirements more realistic
-    - Enhance clarity and remove jargon
-    
-    Keep the same overall content but improve quality significantly.
-    Maintain all necessary sections.
-    """
 
-    result = llm.invoke([
-        SystemMessage(content=system_prompt),
-        HumanMessage(content=f"Current Draft:\n{state.draft}"),
-        HumanMessage(content=f"Quality Check Result:\n{state.quality_check}"),
-        HumanMessage(content=f"Original Input:\n{state.normalized_input}")
-    ])
+def _rewrite_messages(state):
+    # Original input first: it is identical across every rewrite of a run
+    return [
+        SystemMessage(content=get_prompt("rewrite")),
+        HumanMessage(content=(
+            f"Original Input:\n{state.normalized_input}\n\n"
+            f"Current Draft:\n{state.draft}\n\n"
+            f"Quality Check Result:\n{_quality_check_json(state)}"
+        ))
+    ]
+
 
+def rewrite_stop_reason(state):
+    """
+    Why the rewrite loop should stop although the latest check failed,
+    or None to rewrite again.
+    """
+    if state.rewrite_attempts >= MAX_REWRITES:
+        return f"max rewrite attempts ({MAX_REWRITES}) reached"
+
+    history = state.score_history
+    if REWRITE_MIN_DELTA and history:
+        # Pre-scorer estimates and LLM verdicts are not on the same scale:
+        # compare the latest score with the previous one from the same source
+        latest = history[-1]
+        previous = next((record for record in reversed(history[:-1]) if record.source == latest.source), None)
+        if previous is not None:
+            delta = latest.score - previous.score
+            if delta < REWRITE_MIN_DELTA:
+                return f"score moved {delta:+d} since attempt {previous.attempt} (< {REWRITE_MIN_DELTA})"
+
+    if REWRITE_TIME_BUDGET and history and history[-1].elapsed_s >= REWRITE_TIME_BUDGET:
+        return f"time budget spent ({history[-1].elapsed_s:.1f}s of {REWRITE_TIME_BUDGET:g}s)"
+    if REWRITE_TOKEN_BUDGET and state.loop_tokens >= REWRITE_TOKEN_BUDGET:
+        return f"token budget spent ({state.loop_tokens} of {REWRITE_TOKEN_BUDGET})"
+
+    # A rewrite reads and writes about a draft each, and the check after it reads one more
+    draft_tokens = count_tokens(state.draft)
+    return budget_exceeded(state.budget, 2 * draft_tokens, draft_tokens, model_for("rewrite"))
+
+
+def _rewrite_updates(state, content, tokens=0):
     validated = RewriteNodeOutput(
-        draft=result.content,
-        rewrite_attempts=state.rewrite_attempts + 1
+        draft=content,
+        rewrite_attempts=state.rewrite_attempts + 1,
+        loop_tokens=state.loop_tokens + tokens
     )
 
-    updates = validated.model_dump()
-    log_update("REWRITE NODE (END)", updates)
+    updates = _updates(validated)
+    log_update("REWRITE NODE (END)", updates, state)
     return updates
 
 
+def _rewrite_targets(state):
+    """
+    Sections to regenerate in section mode, as key -> issues. None when the
+    whole draft should be rewritten instead: full mode, no per-section
+    attribution, document-wide issues, too many sections blamed, or a draft
+    without recognizable section headings.
+    """
+    check = state.quality_check
+    if REWRITE_MODE != "section" or check is None:
+        return None
+
+    targets = {key: issues for key, issues in check.section_issues.items() if issues}
+    if not targets or "general" in targets or len(targets) > MAX_SECTION_REWRITES:
+        return None
+
+    found = {key for key, _ in split_section_text(state.draft)}
+    if len(found & set(SECTION_HEADINGS)) < len(SECTION_HEADINGS) // 2:
+        return None
+    return targets
+
+
+def _section_rewrite_messages(state, key, current, issues):
+    # The section name stays out of the system prompt, so every section
+    # call of a run shares the same prefix up to the end of the input
+    issue_lines = "\n".join(f"- {issue}" for issue in issues)
+    return [
+        SystemMessage(content=get_prompt("section_rewrite")),
+        HumanMessage(content=(
+            f"Original Input:\n{state.normalized_input}\n\n"
+            f"Section: {SECTION_HEADINGS[key]}\n\n"
+            f"Current Section:\n{current or '(missing - write this section)'}\n\n"
+            f"Issues:\n{issue_lines}"
+        ))
+    ]
+
+
+def _section_rewrite_requests(state, targets, text=None):
+    """Section-rewrite calls for `targets` (key -> issues) over `text` (default: the draft)."""
+    current = {}
+    for key, chunk in split_section_text(state.draft if text is None else text):
+        current.setdefault(key, chunk)
+    return {
+        key: _section_rewrite_messages(state, key, current.get(key), issues)
+        for key, issues in targets.items()
+    }
+
+
+def _splice_rewrites(text, outcomes):
+    """
+    Splice regenerated sections (key -> message or exception) into `text`.
+    A failed section keeps its current text; returns None if every section failed.
+    """
+    replacements = {}
+    for key, outcome in outcomes.items():
+        if isinstance(outcome, Exception):
+            logger.warning("⚠️ Rewrite of section %s failed: %s", key, outcome)
+        else:
+            replacements[key] = _strip_code_fence(outcome.content)
+
+    if not replacements:
+        return None
+
+    logger.info("✂️ Rewrote %s section(s): %s", len(replacements), ", ".join(replacements))
+    return splice_sections(text, replacements)
+
+
+def _section_rewrite_updates(state, outcomes):
+    """Draft with the regenerated sections spliced in, or None if every section failed."""
+    draft = _splice_rewrites(state.draft, outcomes)
+    if draft is None:
+        return None
+    tokens = _tokens_used(*(outcome for outcome in outcomes.values() if not isinstance(outcome, Exception)))
+    return _rewrite_updates(state, draft, tokens)
+
+
+def rewrite_node(state):
+    log_state("REWRITE NODE (START)", state)
+
+    targets = _rewrite_targets(state)
+    if targets is not None:
+        outcomes = _invoke_all(_section_rewrite_requests(state, targets), SECTION_REWRITE_WORKERS, "section_rewrite")
+        updates = _section_rewrite_updates(state, outcomes)
+        if updates is not None:
+            return updates
+
+    result = call_stage("rewrite", _rewrite_messages(state))
+    return _rewrite_updates(state, result.content, _tokens_used(result))
+
+
+async def arewrite_node(state):
+    """Async version of rewrite_node."""
+    log_state("REWRITE NODE (START)", state)
+
+    targets = _rewrite_targets(state)
+    if targets is not None:
+        outcomes = await _ainvoke_all(
+            _section_rewrite_requests(state, targets), SECTION_REWRITE_WORKERS, "section_rewrite"
+        )
+        updates = _section_rewrite_updates(state, outcomes)
+        if updates is not None:
+            return updates
+
+    result = await acall_stage("rewrite", _rewrite_messages(state))
+    return _rewrite_updates(state, result.content, _tokens_used(result))
+
+
 # ---------------------------------------------------------------
 # 5. REVIEW NODE
 # ---------------------------------------------------------------
-def review_node(state):
-    print("\n========== [REVIEW NODE] ==========\n")
-    log_state("REVIEW NODE (START)", state)
+def _review_draft(state):
+    """The draft to review: the best-scoring one when the last rewrite made it worse (same score source only)."""
+    history = state.score_history
+    if (state.best_draft and history and state.best_source == history[-1].source
+            and state.best_score > history[-1].score):
+        logger.info("↩️ Last rewrite scored %s < best %s — reviewing the best draft.", history[-1].score, state.best_score)
+        return state.best_draft
+    return state.draft
+
+
+def _review_messages(state, structured=False):
+    system_prompt = get_prompt("review")
+    if structured:
+        system_prompt += "\n\n" + get_prompt("review_structured")
+
+    return [
+        SystemMessage(content=system_prompt),
+        HumanMessage(content=f"Draft to Review:\n{_review_draft(state)}")
+    ]
 
-    system_prompt = """
-    You are a senior HR reviewer specializing in ATS optimization.
-    
-    TASK:
-    Polish the job description for final release:
-    
-    1. **ATS Optimization**:
-       - Use standard section headings
-       - Include relevant keywords naturally
-       - Avoid tables, columns, graphics (text-only)
-       - Use standard bullet points
-    
-    2. **Consistency Check**:
-       - Remove any contradictions
-       - Ensure tone is consistent
-       - Verify all sections align
-    
-    3. **Final Polish**:
-       - Fix any grammatical issues
-       - Improve readability
-       - Remove redundancy
-       - Strengthen weak phrases
-    
-    Maintain the structure and content, just polish and optimize.
+
+def _structured_jd(model):
+    """`model` bound to the StructuredJD tool."""
+    return model.with_structured_output(StructuredJD, method="function_calling", include_raw=True)
+
+
+def _structured_review_supported():
+    """
+    Whether to try the single-shot review: False when it is off or the
+    review model has no structured output support (local stand-ins);
+    the prose review runs instead.
     """
+    if not STRUCTURED_REVIEW:
+        return False
+    try:
+        _structured_jd(model_for("review"))
+    except (NotImplementedError, ValueError):
+        return False
+    return True
 
-    result = llm.invoke([
-        SystemMessage(content=system_prompt),
-        HumanMessage(content=f"Draft to Review:\n{state.draft}")
-    ])
 
-    validated = ReviewNodeOutput(reviewed=result.content)
-    updates = validated.model_dump()
+def _review_updates(state, content, jd=None):
+    validated = ReviewNodeOutput(reviewed=content, reviewed_jd=jd)
+    updates = _updates(validated)
 
-    log_update("REVIEW NODE (END)", updates)
+    log_update("REVIEW NODE (END)", updates, state)
     return updates
 
 
+def _structured_review_updates(state, response):
+    """Updates from a structured review, or None if the model broke the schema."""
+    jd = response.get("parsed")
+    if jd is None:
+        logger.warning("⚠️ Structured review did not match the schema — falling back to a prose review.")
+        return None
+
+    # The prose form keeps `reviewed` meaningful for fallbacks and callers
+    return _review_updates(state, render_markdown(parsed_from_structured(jd)), jd)
+
+
+def _over_budget_review(state):
+    """Updates taking the (best) draft as the reviewed JD when the run cannot afford a review, else None."""
+    draft_tokens = count_tokens(state.draft)
+    reason = budget_exceeded(
+        state.budget, count_tokens(get_prompt("review")) + draft_tokens, draft_tokens, model_for("review")
+    )
+    if reason is None:
+        return None
+
+    degrade("review", f"{reason.capitalize()} — using the draft as the reviewed JD.")
+    return _review_updates(state, _review_draft(state))
+
+
+def review_node(state):
+    log_state("REVIEW NODE (START)", state)
+
+    updates = _over_budget_review(state)
+    if updates is not None:
+        return updates
+
+    if _structured_review_supported():
+        response = call_stage("review", _review_messages(state, structured=True), prepare=_structured_jd)
+        updates = _structured_review_updates(state, response)
+        if updates is not None:
+            return updates
+
+    result = call_stage("review", _review_messages(state))
+    return _review_updates(state, result.content)
+
+
+async def areview_node(state):
+    """Async version of review_node."""
+    log_state("REVIEW NODE (START)", state)
+
+    updates = _over_budget_review(state)
+    if updates is not None:
+        return updates
+
+    if _structured_review_supported():
+        response = await acall_stage("review", _review_messages(state, structured=True), prepare=_structured_jd)
+        updates = _structured_review_updates(state, response)
+        if updates is not None:
+            return updates
+
+    result = await acall_stage("review", _review_messages(state))
+    return _review_updates(state, result.content)
+
+
 # ---------------------------------------------------------------
 # 6. FINAL OUTPUT NODE
 # ---------------------------------------------------------------
-def final_output_node(state):
-    print("\n========== [FINAL OUTPUT NODE] ==========\n")
-    log_state("FINAL OUTPUT NODE (START)", state)
-
-    # 1. Generate Markdown version
-    markdown_prompt = """
-    Format the reviewed job description in clean Markdown:
-    - Use proper heading levels (## for sections)
-    - Use bullet points (- or *) for lists
-    - Use **bold** for emphasis
-    - Keep it clean and readable
-    """
-
-    markdown_result = llm.invoke([
-        SystemMessage(content=markdown_prompt),
-        HumanMessage(content=state.reviewed)
-    ])
-
-    # 2. Generate JSON version
-    json_prompt = """
-    Convert the job description into structured JSON format:
-    {
-      "job_title": "...",
-      "job_id": "...",
-      "company": "...",
-      "location": "...",
-      "work_mode": "...",
-      "employment_type": "...",
-      "about_us": "...",
-      "summary": "...",
-      "responsibilities": ["...", "..."],
-      "required_skills": ["...", "..."],
-      "preferred_qualifications": ["...", "..."],
-      "education": "...",
-      "experience": "..."
-    }
-    
-    Respond ONLY with valid JSON.
+def _final_output_plan(state):
+    """
+    Decide which formats need an LLM conversion.
+    Returns (conversions, parsed): format name -> system prompt, and the
+    parsed sections (None when the reviewed JD could not be parsed).
     """
+    conversions = {name: get_prompt(f"final_{name}") for name in ("markdown", "json", "text")}
+
+    # A structured review already holds every field: nothing left for the LLM
+    if state.reviewed_jd is not None:
+        logger.info("🧩 Structured review — rendering all formats locally.")
+        return {}, parsed_from_structured(state.reviewed_jd)
+
+    # Markdown and plain text are pure reformatting: render them locally when
+    # the reviewed JD parses into the expected sections
+    parsed = parse_sections(state.reviewed)
+    if parsed is not None:
+        logger.info("🧩 Reviewed JD parsed into sections — rendering Markdown and text locally.")
+        del conversions["markdown"], conversions["text"]
+    else:
+        logger.warning("⚠️ Could not parse reviewed JD sections — using LLM for all formats.")
+
+    reviewed_tokens = count_tokens(state.reviewed)
+    reason = budget_exceeded(
+        state.budget,
+        sum(count_tokens(prompt) + reviewed_tokens for prompt in conversions.values()),
+        len(conversions) * reviewed_tokens,
+        model_for("final_json")
+    )
+    if reason is not None:
+        # JSON is built from the parsed sections; unparsed formats fall back to the reviewed text
+        degrade("final_output", f"{reason.capitalize()} — rendering every format locally.")
+        return {}, parsed
+
+    return conversions, parsed
 
-    json_result = llm.invoke([
-        SystemMessage(content=json_prompt),
-        HumanMessage(content=state.reviewed)
-    ])
+
+def _final_output_updates(state, parsed, results):
+    if parsed is not None:
+        results["markdown"] = render_markdown(parsed)
+        results["text"] = render_text(parsed)
+    if state.reviewed_jd is not None:
+        results["json"] = state.reviewed_jd.model_dump_json(indent=2)
+    elif parsed is not None and results.get("json") is None:
+        results["json"] = structured_from_parsed(parsed).model_dump_json(indent=2)
 
     # Clean JSON
-    json_content = json_result.content.strip()
-    if json_content.startswith("```"):
-        json_content = json_content.split("```")[1]
-        if json_content.startswith("json"):
-            json_content = json_content[4:]
-    json_content = json_content.strip()
-
-    # 3. Generate plain text version
-    text_prompt = """
-    Convert the job description to plain text format:
-    - No markdown formatting
-    - Use line breaks for readability
-    - Use simple dashes for lists
-    - Keep it clean and printable
-    """
-
-    text_result = llm.invoke([
-        SystemMessage(content=text_prompt),
-        HumanMessage(content=state.reviewed)
-    ])
+    json_content = results.get("json")
+    if json_content is not None:
+        json_content = _strip_code_fence(json_content)
 
+    # A failed format falls back to the reviewed text instead of failing the run
     validated = FinalOutputNodeOutput(
-        final_markdown=markdown_result.content,
-        final_json=json_content,
-        final_text=text_result.content
+        final_markdown=results["markdown"] if results.get("markdown") is not None else state.reviewed,
+        final_json=json_content if json_content is not None else "{}",
+        final_text=results["text"] if results.get("text") is not None else state.reviewed
     )
 
-    updates = validated.model_dump()
-    log_update("FINAL OUTPUT NODE (END)", updates)
-    return updates
\ No newline at end of file
+    updates = _updates(validated)
+    log_update("FINAL OUTPUT NODE (END)", updates, state)
+    return updates
+
+
+def _remember(state):
+    """Add the finished JD to the similar-JD index (when it is on)."""
+    index = get_similar_index()
+    if index is None or not state.normalized_input or not state.reviewed:
+        return
+    if "review" in state.budget.degraded:
+        # An unreviewed draft is no template for future requisitions
+        return
+    try:
+        index.add(state.normalized_input, state.reviewed)
+    except sqlite3.Error as e:
+        logger.warning("⚠️ Could not add the JD to the similar-JD index: %s", e)
+
+
+def final_output_node(state):
+    log_state("FINAL OUTPUT NODE (START)", state)
+
+    conversions, parsed = _final_output_plan(state)
+
+    # The remaining conversions read only `state.reviewed`, so run them together.
+    # With parsed sections, a failed JSON call falls back to the local render
+    results = _run_format_conversions(conversions, state.reviewed, parsed is not None) if conversions else {}
+    updates = _final_output_updates(state, parsed, results)
+    _remember(state)
+    return updates
+
+
+async def afinal_output_node(state):
+    """Async version of final_output_node."""
+    log_state("FINAL OUTPUT NODE (START)", state)
+
+    conversions, parsed = _final_output_plan(state)
+    results = await _arun_format_conversions(conversions, state.reviewed, parsed is not None) if conversions else {}
+    updates = _final_output_updates(state, parsed, results)
+    _remember(state)
+    return updates
+
+
+# ---------------------------------------------------------------
+# 7. REGENERATE NODE (incremental runs)
+# ---------------------------------------------------------------
+def _regenerate_updates(state, outcomes):
+    reviewed = _splice_rewrites(state.reviewed, outcomes)
+    if reviewed is None:
+        # Nothing usable came back: surface the error rather than ship a stale JD
+        raise next(iter(outcomes.values()))
+
+    validated = RegenerateNodeOutput(draft=reviewed, reviewed=reviewed)
+    updates = _updates(validated)
+
+    log_update("REGENERATE NODE (END)", updates, state)
+    return updates
+
+
+def regenerate_node(state):
+    """
+    Apply a field edit to the previous run's reviewed JD: rewrite only the
+    sections in `state.regenerate` (key -> changes), then go straight to
+    final_output. Draft, quality check and review are not re-run.
+    """
+    log_state("REGENERATE NODE (START)", state)
+
+    requests = _section_rewrite_requests(state, state.regenerate, state.reviewed)
+    outcomes = _invoke_all(requests, SECTION_REWRITE_WORKERS, "section_rewrite")
+    return _regenerate_updates(state, outcomes)
+
+
+async def aregenerate_node(state):
+    """Async version of regenerate_node."""
+    log_state("REGENERATE NODE (START)", state)
+
+    requests = _section_rewrite_requests(state, state.regenerate, state.reviewed)
+    outcomes = await _ainvoke_all(requests, SECTION_REWRITE_WORKERS, "section_rewrite")
+    return _regenerate_updates(state, outcomes)
+
+
+# ---------------------------------------------------------------
+# 8. ADAPT NODE (similar past JD)
+# ---------------------------------------------------------------
+def _adapt_messages(state):
+    return [
+        SystemMessage(content=get_prompt("adapt")),
+        HumanMessage(content=(
+            f"Original Input:\n{state.normalized_input}\n\n"
+            f"Reference JD:\n{state.reference_jd}"
+        ))
+    ]
+
+
+def _adapt_updates(state, content):
+    validated = AdaptNodeOutput(draft=content)
+    updates = _updates(validated)
+
+    log_update("ADAPT NODE (END)", updates, state)
+    return updates
+
+
+def adapt_node(state):
+    """
+    Draft by adapting the similar past JD found at validation. It was
+    already quality-checked and reviewed, so the draft goes straight to review.
+    """
+    log_state("ADAPT NODE (START)", state)
+
+    result = call_stage("adapt", _adapt_messages(state))
+    return _adapt_updates(state, result.content)
+
+
+async def aadapt_node(state):
+    """Async version of adapt_node."""
+    log_state("ADAPT NODE (START)", state)
+
+    result = await acall_stage("adapt", _adapt_messages(state))
+    return _adapt_updates(state, result.content)
@@ -0,0 +1,557 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+import re
+
+
+# ---------------------------------------------------------------
+# SECTIONS
+# ---------------------------------------------------------------
+# Section key -> heading used when rendering (same order draft_node asks for)
+SECTION_HEADINGS = {
+    "title": "Job Title and Metadata",
+    "about": "About Us",
+    "summary": "Job Summary",
+    "responsibilities": "Key Responsibilities",
+    "skills": "Required Skills",
+    "preferred": "Preferred Qualifications",
+    "education": "Education",
+    "experience": "Experience",
+}
+
+# Headings the draft/review prompts produce in practice -> section key
+SECTION_ALIASES = {
+    "job title and metadata": "title",
+    "job title & metadata": "title",
+    "job title": "title",
+    "job details": "title",
+    "job metadata": "title",
+    "about us": "about",
+    "about the company": "about",
+    "company overview": "about",
+    "who we are": "about",
+    "job summary": "summary",
+    "summary": "summary",
+    "role summary": "summary",
+    "position summary": "summary",
+    "role overview": "summary",
+    "about the role": "summary",
+    "key responsibilities": "responsibilities",
+    "responsibilities": "responsibilities",
+    "roles and responsibilities": "responsibilities",
+    "what you'll do": "responsibilities",
+    "what you will do": "responsibilities",
+    "required skills": "skills",
+    "skills": "skills",
+    "required skills and qualifications": "skills",
+    "skills and qualifications": "skills",
+    "required qualifications": "skills",
+    "requirements": "skills",
+    "preferred qualifications": "preferred",
+    "preferred skills": "preferred",
+    "nice to have": "preferred",
+    "nice-to-have": "preferred",
+    "education": "education",
+    "education requirements": "education",
+    "educational requirements": "education",
+    "education qualification": "education",
+    "experience": "experience",
+    "experience requirements": "experience",
+    "required experience": "experience",
+    "work experience": "experience",
+}
+
+# Sections that must be found for the local render to be trusted
+REQUIRED_SECTIONS = ("about", "summary", "responsibilities", "skills", "education", "experience")
+
+# Key of sections with a heading none of the above match (Benefits, How to Apply, ...)
+OTHER_SECTION = "other"
+
+_BULLET_RE = re.compile(r"^\s*(?:[-*•●▪]|\d+[.)])\s+")
+_HEADING_NUMBER_RE = re.compile(r"^(?:\d+[.)]|[ivx]+[.)])\s+", re.IGNORECASE)
+_LINK_RE = re.compile(r"\[([^\]]+)\]\([^)]*\)")
+_ITALIC_RE = re.compile(r"(?<![\w*])\*(?!\s)([^*]+?)(?<!\s)\*(?![\w*])")
+_RULE_RE = re.compile(r"^\s*(?:-{3,}|\*{3,}|_{3,}|={3,})\s*$")
+_METADATA_RE = re.compile(r"^([A-Za-z][A-Za-z /&()'-]{0,30}):\s+(\S.*)$")
+
+
+class ParsedJD(BaseModel):
+    """Section-level parse of a reviewed job description."""
+    title: str = Field(description="Job title")
+    metadata: list[tuple[str, str]] = Field(
+        default_factory=list,
+        description="Key/value lines from the title block (Job ID, Location, ...)"
+    )
+    sections: dict[str, list[tuple[str, str]]] = Field(
+        default_factory=dict,
+        description="Section key -> blocks as (kind, text), kind is 'bullet', 'para' or 'label'"
+    )
+    extra: list[tuple[str, str]] = Field(
+        default_factory=list,
+        description="Title-block lines that are neither the title nor metadata, as blocks"
+    )
+    other_sections: dict[str, list[tuple[str, str]]] = Field(
+        default_factory=dict,
+        description="Sections with an unrecognized heading: heading -> blocks, in document order"
+    )
+
+
+def clean_inline(text: str) -> str:
+    """Strip inline Markdown (bold, italics, code, links) from a line."""
+    text = _LINK_RE.sub(r"\1", text)
+    text = text.replace("**", "").replace("__", "").replace("`", "")
+    text = _ITALIC_RE.sub(r"\1", text)
+    return text.strip()
+
+
+def _normalize_heading(line: str) -> str:
+    """Reduce a candidate heading line to its lowercase label text."""
+    text = clean_inline(line.strip().lstrip("#"))
+    text = _HEADING_NUMBER_RE.sub("", text)
+    text = text.rstrip(":").strip().lower().replace("’", "'")
+    return re.sub(r"\s+", " ", text)
+
+
+def _match_section(line: str) -> Optional[str]:
+    """Return the section key if the line is a known section heading."""
+    stripped = line.strip()
+    if not stripped:
+        return None
+    # Dash/star bullets are list items; numbered lines may still be headings
+    if _BULLET_RE.match(stripped) and not _HEADING_NUMBER_RE.match(stripped):
+        return None
+
+    # "Label: value" lines are content, not headings
+    plain = clean_inline(stripped.lstrip("#"))
+    if ":" in plain and plain.split(":", 1)[1].strip():
+        return None
+
+    label = _normalize_heading(stripped)
+    if len(label) > 60:
+        return None
+    if label in SECTION_ALIASES:
+        return SECTION_ALIASES[label]
+    if label.startswith("about ") and label not in ("about you", "about the team"):
+        return "about"
+    return None
+
+
+def _heading_style(line: str) -> Optional[tuple]:
+    """How a heading line is marked up: (marker, numbered, trailing colon), or None for plain text."""
+    stripped = line.strip()
+    numbered = bool(_HEADING_NUMBER_RE.match(stripped))
+    text = _HEADING_NUMBER_RE.sub("", stripped)
+    if text.startswith("#"):
+        marker = "#" * (len(text) - len(text.lstrip("#")))
+    elif text.startswith(("**", "__")) and text.rstrip(":").endswith(("**", "__")):
+        marker = "bold"
+    else:
+        # Plain (even numbered) lines are too easily list items or prose
+        return None
+    return marker, numbered, clean_inline(text.lstrip("#")).endswith(":")
+
+
+def _section_keys(lines) -> list[Optional[str]]:
+    """
+    Per line: the key of the section heading it is, or None for content.
+    After the title block, a line styled exactly like this JD's own section
+    headings but not a known one starts an OTHER_SECTION, so it is kept
+    apart instead of being read as part of the section before it.
+    """
+    keys = [_match_section(line) for line in lines]
+    styles = {_heading_style(line) for line, key in zip(lines, keys) if key and key != "title"}
+    styles.discard(None)
+    if not styles:
+        return keys
+
+    body = False
+    for index, (line, key) in enumerate(zip(lines, keys)):
+        if key:
+            body = body or key != "title"
+            continue
+        plain = clean_inline(line.strip().lstrip("#"))
+        if (body and _heading_style(line) in styles and len(plain) <= 60
+                and not (_BULLET_RE.match(line.strip()) and not _HEADING_NUMBER_RE.match(line.strip()))
+                and not (":" in plain and plain.split(":", 1)[1].strip())):
+            keys[index] = OTHER_SECTION
+    return keys
+
+
+def _is_label(line: str) -> bool:
+    """Sub-headings inside a section, e.g. '### Technical Skills' or '**Soft Skills:**'."""
+    stripped = line.strip()
+    if stripped.startswith("#"):
+        return True
+    plain = clean_inline(stripped)
+    if stripped.startswith("**") and stripped.rstrip(":").endswith("**"):
+        return True
+    return plain.endswith(":") and len(plain) <= 60
+
+
+# ---------------------------------------------------------------
+# PARSING
+# ---------------------------------------------------------------
+def split_sections(text: Optional[str]) -> dict[str, list[tuple[str, str]]]:
+    """
+    Split a JD into {section key: blocks} for whichever known sections it has.
+    Text before the first heading is treated as the title block.
+    """
+    sections: dict[str, list[tuple[str, str]]] = {}
+    if not text:
+        return sections
+
+    current = "title"
+    lines = text.splitlines()
+
+    for raw, key in zip(lines, _section_keys(lines)):
+        line = raw.strip()
+        if not line or _RULE_RE.match(line):
+            continue
+
+        if key == OTHER_SECTION:
+            # Unrecognized sections share one key, each opened by its heading
+            current = key
+            sections.setdefault(current, []).append(("heading", _normalize_heading_text(line)))
+            continue
+        if key:
+            current = key
+            sections.setdefault(current, [])
+            continue
+
+        if _BULLET_RE.match(line):
+            block = ("bullet", clean_inline(_BULLET_RE.sub("", line, count=1)))
+        elif _is_label(line):
+            block = ("label", _normalize_label(line))
+        else:
+            block = ("para", clean_inline(line.lstrip("#")))
+
+        if block[1]:
+            sections.setdefault(current, []).append(block)
+
+    return sections
+
+
+def parse_sections(text: Optional[str]) -> Optional[ParsedJD]:
+    """
+    Parse a reviewed JD into the sections draft_node requires.
+    Returns None if the text does not have the expected structure,
+    in which case callers should fall back to the LLM formatters.
+    """
+    if not text or not text.strip():
+        return None
+
+    sections = split_sections(text)
+    if any(not sections.get(key) for key in REQUIRED_SECTIONS):
+        return None
+
+    title, metadata, extra = _parse_title_block(sections.pop("title", []))
+    if not title:
+        return None
+
+    other_sections = {}
+    blocks = []
+    for kind, block in sections.pop(OTHER_SECTION, []):
+        if kind == "heading":
+            blocks = other_sections.setdefault(block, [])
+        else:
+            blocks.append((kind, block))
+
+    return ParsedJD(title=title, metadata=metadata, sections=sections, extra=extra, other_sections=other_sections)
+
+
+def split_section_text(text: Optional[str]) -> list[tuple[str, str]]:
+    """
+    Split a JD into raw (section key, text) chunks in document order, each
+    chunk starting with its heading line and keeping its original
+    formatting. Text before the first heading is keyed "title".
+    Joining the chunk texts with newlines restores the document.
+    """
+    chunks = []
+    current, lines = "title", []
+    raw_lines = (text or "").splitlines()
+
+    for raw, key in zip(raw_lines, _section_keys(raw_lines)):
+        if key:
+            if any(line.strip() for line in lines):
+                chunks.append((current, "\n".join(lines)))
+            current, lines = key, [raw]
+        else:
+            lines.append(raw)
+
+    if any(line.strip() for line in lines):
+        chunks.append((current, "\n".join(lines)))
+    return chunks
+
+
+def splice_sections(text: str, replacements: dict[str, str]) -> str:
+    """
+    Replace whole sections of a JD with new text (heading added if the
+    replacement lacks it). Sections the JD does not have yet are inserted
+    at their usual position.
+    """
+    order = list(SECTION_HEADINGS)
+    chunks = split_section_text(text)
+    present = {key for key, _ in chunks}
+
+    def section(key, body):
+        lines = body.strip().splitlines()
+        if not lines or _match_section(lines[0]) != key:
+            lines.insert(0, f"**{SECTION_HEADINGS[key]}**")
+        return "\n".join(lines) + "\n"
+
+    result = []
+    for key, chunk in chunks:
+        result.append((key, section(key, replacements[key]) if key in replacements else chunk))
+
+    for key in sorted(set(replacements) - present, key=order.index):
+        # After the last section that normally comes before it
+        position = 0
+        for index, (existing, _) in enumerate(result):
+            if existing in order and order.index(existing) < order.index(key):
+                position = index + 1
+        result.insert(position, (key, section(key, replacements[key])))
+
+    return "\n".join(chunk for _, chunk in result)
+
+
+# Input field key -> metadata labels a JD may use for it (first one is used for new lines)
+METADATA_LABELS = {
+    "job_id": ("Job ID", "Requisition ID", "Req ID"),
+    "location": ("Location", "Job Location"),
+    "work_mode": ("Work Mode", "Work Model", "Workplace Type", "Work Arrangement"),
+    "employment_type": ("Employment Type", "Job Type"),
+    "max_salary": ("Salary", "Max Salary", "Salary Range", "Compensation", "CTC"),
+    "positions_filled": ("Positions", "Number of Positions", "Openings", "Positions Filled"),
+}
+
+_LABEL_FIELDS = {label.lower(): key for key, labels in METADATA_LABELS.items() for label in labels}
+
+# "- **Location:** Pune", "Location: Pune", "**Location**: Pune", ...
+_METADATA_PART_RE = re.compile(
+    r"^(?P<lead>\s*(?:[-*•]\s+)?)(?P<open>\*\*|__)?(?P<label>[A-Za-z][A-Za-z /&()'-]{0,30}?)"
+    r"(?P<sep>\s*:\s*(?:\*\*|__)?\s*:?\s*|(?:\*\*|__)\s*:\s*)(?P<value>\S.*?)\s*$"
+)
+
+
+def update_metadata(text: str, values: dict[str, str], add=()) -> str:
+    """
+    Set metadata values (field key -> value) in a JD's title block, keeping
+    each line's formatting. An empty value removes the entry. Keys in `add`
+    that the block does not mention are appended as new lines.
+    """
+    chunks = split_section_text(text)
+    index = next((i for i, (key, _) in enumerate(chunks) if key == "title"), None)
+    if index is None:
+        return text
+
+    lines, seen, template = [], set(), None
+    for line in chunks[index][1].split("\n"):
+        parts = []
+        for part in line.split(" | "):
+            match = _METADATA_PART_RE.match(part)
+            field = match and _LABEL_FIELDS.get(match.group("label").strip().lower())
+            if match:
+                template = match
+            if not field or field not in values:
+                parts.append(part)
+                continue
+            seen.add(field)
+            if values[field]:
+                parts.append(part[:match.start("value")] + values[field])
+        if parts or not line.strip():
+            lines.append(" | ".join(parts))
+
+    new = [key for key in add if key not in seen and values.get(key)]
+    if new:
+        # After the last non-blank line of the block, styled like its metadata lines
+        position = max((i + 1 for i, line in enumerate(lines) if line.strip()), default=0)
+        for offset, key in enumerate(new):
+            label = METADATA_LABELS[key][0]
+            if template is None:
+                line = f"{label}: {values[key]}"
+            else:
+                close = template.group("sep")
+                line = f"{template.group('lead')}{template.group('open') or ''}{label}{close}{values[key]}"
+            lines.insert(position + offset, line)
+
+    chunks[index] = ("title", "\n".join(lines))
+    return "\n".join(chunk for _, chunk in chunks)
+
+
+def parsed_from_structured(jd) -> ParsedJD:
+    """
+    Build a ParsedJD from a StructuredJD (the single-shot review output),
+    so it renders through the same Markdown/text renderers.
+    """
+    metadata = [
+        (label, value.strip())
+        for label, value in (
+            ("Job ID", jd.job_id),
+            ("Company", jd.company),
+            ("Location", jd.location),
+            ("Work Mode", jd.work_mode),
+            ("Employment Type", jd.employment_type),
+        )
+        if value and value.strip()
+    ]
+
+    def paragraphs(text):
+        return [("para", part.strip()) for part in re.split(r"\n\s*\n", text or "") if part.strip()]
+
+    def bullets(items):
+        return [("bullet", clean_inline(_BULLET_RE.sub("", item, count=1))) for item in items if item.strip()]
+
+    sections = {
+        "about": paragraphs(jd.about_us),
+        "summary": paragraphs(jd.summary),
+        "responsibilities": bullets(jd.responsibilities),
+        "skills": bullets(jd.required_skills),
+        "preferred": bullets(jd.preferred_qualifications),
+        "education": paragraphs(jd.education),
+        "experience": paragraphs(jd.experience),
+    }
+
+    return ParsedJD(
+        title=jd.job_title.strip() or "Job Description",
+        metadata=metadata,
+        sections={key: blocks for key, blocks in sections.items() if blocks},
+        other_sections={heading.strip(): paragraphs(text) for heading, text in jd.other_sections.items() if heading.strip()}
+    )
+
+
+def structured_from_parsed(parsed: ParsedJD):
+    """
+    Build a StructuredJD from a ParsedJD (the inverse of
+    parsed_from_structured), so JSON can be rendered without the LLM.
+    """
+    from jd_agent.utils.validators import StructuredJD
+
+    metadata = {_LABEL_FIELDS.get(label.lower(), label.lower()): value for label, value in parsed.metadata}
+
+    def text(key, blocks=None):
+        blocks = parsed.sections.get(key, []) if blocks is None else blocks
+        return "\n\n".join(block for kind, block in blocks if kind != "label")
+
+    def items(key):
+        return [block for kind, block in parsed.sections.get(key, []) if kind != "label"]
+
+    return StructuredJD(
+        job_title=parsed.title,
+        job_id=metadata.get("job_id"),
+        company=metadata.get("company"),
+        location=metadata.get("location"),
+        work_mode=metadata.get("work_mode"),
+        employment_type=metadata.get("employment_type"),
+        about_us=text("about"),
+        summary=text("summary"),
+        responsibilities=items("responsibilities"),
+        required_skills=items("skills"),
+        preferred_qualifications=items("preferred"),
+        education=text("education"),
+        experience=text("experience"),
+        # Sections outside the schema keep their heading instead of joining Experience
+        other_sections={heading: text(None, blocks) for heading, blocks in parsed.other_sections.items()}
+    )
+
+
+def _normalize_label(line: str) -> str:
+    """Sub-heading text without Markdown markers or a trailing colon."""
+    return clean_inline(line.lstrip("#")).rstrip(":").strip()
+
+
+def _normalize_heading_text(line: str) -> str:
+    """Heading text as written (case kept), without Markdown, numbering or a trailing colon."""
+    return _HEADING_NUMBER_RE.sub("", clean_inline(line.strip().lstrip("#"))).rstrip(":").strip()
+
+
+def _parse_title_block(blocks):
+    """Split the title/metadata block into the job title, key/value pairs and any other lines."""
+    title = None
+    metadata = []
+    extra = []
+
+    for kind, text in blocks:
+        # Metadata is often packed on one line: "Job ID: X | Location: Y"
+        parts = [part.strip() for part in text.split(" | ")]
+        matches = [_METADATA_RE.match(part) for part in parts]
+        if not all(matches):
+            if title is None:
+                title = text
+            else:
+                extra.append((kind, text))
+            continue
+
+        for match in matches:
+            key, value = match.group(1).strip(), match.group(2).strip()
+            if key.lower() == "job title":
+                title = title or value
+            else:
+                metadata.append((key, value))
+
+    return title, metadata, extra
+
+
+# ---------------------------------------------------------------
+# RENDERING
+# ---------------------------------------------------------------
+def _iter_sections(parsed: ParsedJD):
+    for key, heading in SECTION_HEADINGS.items():
+        blocks = parsed.sections.get(key)
+        if blocks:
+            yield heading, blocks
+    # Unrecognized sections keep their own heading, after the known ones
+    for heading, blocks in parsed.other_sections.items():
+        if blocks:
+            yield heading, blocks
+
+
+def _render_blocks(blocks, bullet: str, label_format: str) -> list[str]:
+    """Render section blocks, keeping bullet runs together and other blocks apart."""
+    lines = []
+    previous = None
+    for kind, text in blocks:
+        if lines and not (kind == "bullet" and previous == "bullet"):
+            lines.append("")
+        if kind == "bullet":
+            lines.append(f"{bullet} {text}")
+        elif kind == "label":
+            lines.append(label_format.format(text))
+        else:
+            lines.append(text)
+        previous = kind
+    return lines
+
+
+def render_markdown(parsed: ParsedJD) -> str:
+    """Render a parsed JD as clean Markdown."""
+    lines = [f"# {parsed.title}", ""]
+    if parsed.metadata:
+        lines.extend(f"- **{key}:** {value}" for key, value in parsed.metadata)
+        lines.append("")
+    if parsed.extra:
+        lines.extend(_render_blocks(parsed.extra, "-", "**{}:**"))
+        lines.append("")
+
+    for heading, blocks in _iter_sections(parsed):
+        lines.extend([f"## {heading}", ""])
+        lines.extend(_render_blocks(blocks, "-", "**{}:**"))
+        lines.append("")
+
+    return "\n".join(lines).strip() + "\n"
+
+
+def render_text(parsed: ParsedJD) -> str:
+    """Render a parsed JD as printable plain text."""
+    lines = [parsed.title, "=" * len(parsed.title), ""]
+    if parsed.metadata:
+        lines.extend(f"{key}: {value}" for key, value in parsed.metadata)
+        lines.append("")
+    if parsed.extra:
+        lines.extend(_render_blocks(parsed.extra, "-", "{}:"))
+        lines.append("")
+
+    for heading, blocks in _iter_sections(parsed):
+        lines.extend([heading.upper(), "-" * len(heading), ""])
+        lines.extend(_render_blocks(blocks, "-", "{}:"))
+        lines.append("")
+
+    return "\n".join(lines).strip() + "\n"
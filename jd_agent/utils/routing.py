@@ -0,0 +1,132 @@
+from collections import Counter
+from jd_agent.utils.budget import charge
+from jd_agent.utils.llm import TIERS, get_llm
+from jd_agent.utils.scheduler import acall_llm, call_llm
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------------
+# ROUTING TABLE
+# ---------------------------------------------------------------
+# LLM stage -> model tier. Writing and reviewing need the strong model;
+# normalizing, judging against a rubric and reformatting do not
+STAGE_TIERS = {
+    "validation": "fast",
+    "draft": "strong",
+    "adapt": "strong",
+    "quality_check": "fast",
+    "rewrite": "strong",
+    "section_rewrite": "strong",
+    "review": "strong",
+    "final_markdown": "fast",
+    "final_json": "fast",
+    "final_text": "fast",
+}
+
+
+def _parse_routes(text):
+    """'quality_check=strong,final_json=fast' -> {stage: tier}."""
+    routes = {}
+    for item in (text or "").split(","):
+        if not item.strip():
+            continue
+        stage, _, tier = item.partition("=")
+        stage, tier = stage.strip(), tier.strip().lower()
+        if stage not in STAGE_TIERS or tier not in TIERS:
+            raise ValueError(f"Invalid JD_AGENT_MODEL_ROUTES entry {item.strip()!r}")
+        routes[stage] = tier
+    return routes
+
+
+# JD_AGENT_MODEL_ROUTES overrides single stages, e.g. "quality_check=strong"
+STAGE_TIERS.update(_parse_routes(os.getenv("JD_AGENT_MODEL_ROUTES")))
+
+_escalations = Counter()
+_lock = threading.Lock()
+
+
+def tier_for(stage: str) -> str:
+    return STAGE_TIERS.get(stage, "strong")
+
+
+def model_for(stage: str):
+    """The chat model `stage` is routed to."""
+    return get_llm(tier_for(stage))
+
+
+# ---------------------------------------------------------------
+# ESCALATION
+# ---------------------------------------------------------------
+def _escalation_model(stage):
+    """The strong model, if it differs from the one `stage` just used."""
+    strong = get_llm("strong")
+    if strong is model_for(stage):
+        return None
+
+    with _lock:
+        _escalations[stage] += 1
+    logger.warning("⤴️ %s output from the fast model failed validation — retrying on the strong model.", stage)
+    return strong
+
+
+def call_stage(stage, messages, valid=None, prepare=None):
+    """
+    Call the model routed for `stage`. When `valid(result)` is False and
+    the stage ran on the fast model, the call is repeated once on the
+    strong one. `prepare(model)` wraps the model first (e.g. JSON mode).
+    Every call is charged to the run's budget.
+    """
+    prepare = prepare or (lambda model: model)
+    model = model_for(stage)
+    result = call_llm(messages, prepare(model))
+    charge(model, messages, result)
+    if valid is None or valid(result):
+        return result
+
+    strong = _escalation_model(stage)
+    if strong is None:
+        return result
+    result = call_llm(messages, prepare(strong))
+    charge(strong, messages, result)
+    return result
+
+
+async def acall_stage(stage, messages, valid=None, prepare=None):
+    """Async version of call_stage."""
+    prepare = prepare or (lambda model: model)
+    model = model_for(stage)
+    result = await acall_llm(messages, prepare(model))
+    charge(model, messages, result)
+    if valid is None or valid(result):
+        return result
+
+    strong = _escalation_model(stage)
+    if strong is None:
+        return result
+    result = await acall_llm(messages, prepare(strong))
+    charge(strong, messages, result)
+    return result
+
+
+def routing_stats() -> dict:
+    """Tier and escalation count per stage."""
+    with _lock:
+        return {
+            stage: {"tier": tier, "escalations": _escalations[stage]}
+            for stage, tier in STAGE_TIERS.items()
+        }
+
+
+def render_prometheus() -> str:
+    """Escalations per stage as Prometheus text."""
+    lines = [
+        "# HELP jd_agent_llm_escalations_total Stage outputs from the fast model retried on the strong model.",
+        "# TYPE jd_agent_llm_escalations_total counter",
+    ]
+    for stage, stats in routing_stats().items():
+        lines.append(f'jd_agent_llm_escalations_total{{stage="{stage}",tier="{stats["tier"]}"}} {stats["escalations"]}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,464 @@
+from jd_agent.utils.llm import get_llm
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------------
+# PRIORITY
+# ---------------------------------------------------------------
+# Lower runs first: a waiting interactive call is admitted before queued batch calls
+PRIORITIES = {"interactive": 0, "normal": 1, "batch": 2}
+
+_priority = ContextVar("jd_agent_llm_priority", default="normal")
+
+
+@contextmanager
+def llm_priority(level: str):
+    """Run the LLM calls made inside this block (and the graph runs it starts) at `level`."""
+    if level not in PRIORITIES:
+        raise ValueError(f"Unknown priority {level!r}, expected one of {sorted(PRIORITIES)}")
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+# ---------------------------------------------------------------
+# RETRY POLICY
+# ---------------------------------------------------------------
+# HTTP statuses worth retrying (timeouts, conflicts, rate limits, server errors)
+TRANSIENT_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+
+# Provider exception names for the same cases, matched by name so no SDK is imported
+TRANSIENT_ERRORS = {
+    "RateLimitError",
+    "APITimeoutError",
+    "APIConnectionError",
+    "InternalServerError",
+    "ServiceUnavailableError",
+}
+
+
+def is_transient(error: BaseException) -> bool:
+    """True for errors a retry can fix (rate limits, timeouts, dropped connections, 5xx)."""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if status in TRANSIENT_STATUS:
+        return True
+    return any(cls.__name__ in TRANSIENT_ERRORS for cls in type(error).__mro__)
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    """Seconds from a Retry-After header on the error's HTTP response, if any."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+# ---------------------------------------------------------------
+# RATE LIMITS
+# ---------------------------------------------------------------
+class _TokenBucket:
+    """Continuously refilled bucket holding at most one minute of budget."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` (capped at one minute's budget) is available."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        self.level -= min(amount, self.capacity)
+
+    def settle(self, delta: float):
+        """Refund (positive) or charge (negative) the difference from the reservation."""
+        self.level = min(self.capacity, self.level + delta)
+
+
+def _estimate_tokens(messages) -> int:
+    """Rough prompt size (~4 characters per token)."""
+    if isinstance(messages, str):
+        return len(messages) // 4
+    return sum(len(m.content) for m in messages if isinstance(getattr(m, "content", None), str)) // 4
+
+
+def _usage(result) -> Optional[dict]:
+    # include_raw structured output wraps the message in {"raw": ...}
+    message = result.get("raw") if isinstance(result, dict) else result
+    return getattr(message, "usage_metadata", None)
+
+
+# ---------------------------------------------------------------
+# SCHEDULER
+# ---------------------------------------------------------------
+# How often a queued call that is not at the head re-checks from async code
+_POLL_SECONDS = 0.05
+
+# Wait-time samples kept per priority for percentiles
+MAX_SAMPLES = 10_000
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class LLMScheduler:
+    """
+    Admission control for LLM calls shared by every node and worker.
+
+    - deadline: `timeout` seconds per call, covering queueing, attempts and
+      backoff (async attempts are cancelled at the deadline; sync attempts
+      rely on the client's own timeout)
+    - retries: up to `max_retries` on transient errors, with jittered
+      exponential backoff (at least the server's Retry-After)
+    - rate limits: token buckets for requests and tokens per minute; a
+      call reserves its estimated tokens and settles with the reported usage
+    - priority: queued calls are admitted in priority order, FIFO within one
+
+    Without rpm/tpm limits, calls are admitted immediately.
+    """
+
+    def __init__(
+        self,
+        rpm: Optional[int] = None,
+        tpm: Optional[int] = None,
+        timeout: Optional[float] = 120.0,
+        max_retries: int = 3,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        output_reserve: int = 800,
+    ):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.output_reserve = output_reserve
+
+        self._requests = _TokenBucket(rpm) if rpm else None
+        self._tokens = _TokenBucket(tpm) if tpm else None
+
+        self._cond = threading.Condition()
+        self._queue = []
+        self._seq = itertools.count()
+
+        self._waits = defaultdict(lambda: deque(maxlen=MAX_SAMPLES))
+        self._counters = defaultdict(int)
+
+    @property
+    def limited(self) -> bool:
+        return self._requests is not None or self._tokens is not None
+
+    # -----------------------------------------------------------
+    # ADMISSION
+    # -----------------------------------------------------------
+    def _try_admit(self, entry, tokens: int, now: float) -> Optional[float]:
+        """
+        Admit the call if it is first in line and the budget allows.
+        Returns 0 when admitted, the seconds to wait if it is first in line,
+        or None while other calls are ahead of it. Caller holds the lock.
+        """
+        if self._queue[0] is not entry:
+            return None
+        wait = max(
+            self._requests.wait_time(1, now) if self._requests else 0.0,
+            self._tokens.wait_time(tokens, now) if self._tokens else 0.0,
+        )
+        if wait > 0:
+            return wait
+
+        if self._requests:
+            self._requests.take(1)
+        if self._tokens:
+            self._tokens.take(tokens)
+        heapq.heappop(self._queue)
+        self._cond.notify_all()
+        return 0.0
+
+    def _enqueue(self, priority: str):
+        entry = [PRIORITIES[priority], next(self._seq)]
+        heapq.heappush(self._queue, entry)
+        self._counters["max_queued"] = max(self._counters["max_queued"], len(self._queue))
+        return entry
+
+    def _dequeue(self, entry):
+        """Drop a call that gave up waiting. Caller holds the lock."""
+        if entry in self._queue:
+            self._queue.remove(entry)
+            heapq.heapify(self._queue)
+            self._cond.notify_all()
+
+    def _expired(self, deadline: Optional[float], now: float) -> bool:
+        if deadline is not None and now >= deadline:
+            self._counters["timeouts"] += 1
+            return True
+        return False
+
+    def _record_wait(self, priority: str, started: float):
+        waited = time.monotonic() - started
+        with self._cond:
+            self._waits[priority].append(waited * 1000)
+            self._counters["calls"] += 1
+            self._counters["throttled"] += waited > 0.001
+
+    def acquire(self, tokens: int, deadline: Optional[float] = None):
+        """Block until the call may start; raises TimeoutError past `deadline`."""
+        priority, started = _priority.get(), time.monotonic()
+        if self.limited:
+            with self._cond:
+                entry = self._enqueue(priority)
+                try:
+                    while True:
+                        now = time.monotonic()
+                        wait = self._try_admit(entry, tokens, now)
+                        if wait == 0:
+                            break
+                        if self._expired(deadline, now):
+                            raise TimeoutError("LLM call deadline passed while queued")
+                        # Woken early when the call ahead is admitted or a refund lands
+                        limits = [x for x in (wait, deadline - now if deadline is not None else None) if x is not None]
+                        self._cond.wait(min(limits) if limits else None)
+                except BaseException:
+                    self._dequeue(entry)
+                    raise
+        self._record_wait(priority, started)
+
+    async def aacquire(self, tokens: int, deadline: Optional[float] = None):
+        """Async version of acquire (polls instead of blocking the event loop)."""
+        priority, started = _priority.get(), time.monotonic()
+        if self.limited:
+            with self._cond:
+                entry = self._enqueue(priority)
+            try:
+                while True:
+                    now = time.monotonic()
+                    with self._cond:
+                        wait = self._try_admit(entry, tokens, now)
+                        if wait == 0:
+                            break
+                        if self._expired(deadline, now):
+                            raise TimeoutError("LLM call deadline passed while queued")
+                    delay = _POLL_SECONDS if wait is None else wait
+                    if deadline is not None:
+                        delay = min(delay, deadline - now)
+                    await asyncio.sleep(delay)
+            except BaseException:
+                with self._cond:
+                    self._dequeue(entry)
+                raise
+        self._record_wait(priority, started)
+
+    def _settle(self, reserved: int, result):
+        """Correct the token bucket with the usage the provider reported."""
+        if self._tokens is None:
+            return
+        usage = _usage(result)
+        if not usage:
+            return
+        # Cached responses (total_cost zeroed by LangChain) cost nothing
+        actual = 0 if usage.get("total_cost") == 0 else usage.get("total_tokens", reserved)
+        with self._cond:
+            self._tokens.settle(reserved - actual)
+            self._cond.notify_all()
+
+    # -----------------------------------------------------------
+    # RETRIES
+    # -----------------------------------------------------------
+    def _retry_delay(self, error, attempt: int, deadline: Optional[float]) -> Optional[float]:
+        """Backoff before the next attempt, or None if the error should propagate."""
+        if not is_transient(error) or attempt >= self.max_retries:
+            return None
+        cap = min(self.max_delay, self.base_delay * 2 ** attempt)
+        delay = max(cap / 2 + random.uniform(0, cap / 2), _retry_after(error) or 0.0)
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            return None
+        return delay
+
+    def _on_failure(self, error, attempt: int, delay: Optional[float]):
+        with self._cond:
+            self._counters["failures" if delay is None else "retries"] += 1
+        if delay is not None:
+            logger.warning(
+                "🔁 LLM call failed (%s: %s) — retry %s/%s in %.1fs",
+                type(error).__name__, error, attempt + 1, self.max_retries, delay
+            )
+
+    def run(self, call, messages):
+        """Run `call()` (one LLM request for `messages`) under the scheduler's policy."""
+        deadline = time.monotonic() + self.timeout if self.timeout else None
+        tokens = _estimate_tokens(messages) + self.output_reserve
+
+        for attempt in itertools.count():
+            self.acquire(tokens, deadline)
+            try:
+                result = call()
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, deadline)
+                self._on_failure(e, attempt, delay)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            self._settle(tokens, result)
+            return result
+
+    async def arun(self, acall, messages):
+        """Async version of run; each attempt is cancelled at the deadline."""
+        deadline = time.monotonic() + self.timeout if self.timeout else None
+        tokens = _estimate_tokens(messages) + self.output_reserve
+
+        for attempt in itertools.count():
+            await self.aacquire(tokens, deadline)
+            try:
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                result = await asyncio.wait_for(acall(), remaining)
+            except Exception as e:
+                if isinstance(e, TimeoutError):
+                    with self._cond:
+                        self._counters["timeouts"] += 1
+                delay = self._retry_delay(e, attempt, deadline)
+                self._on_failure(e, attempt, delay)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            self._settle(tokens, result)
+            return result
+
+    # -----------------------------------------------------------
+    # METRICS
+    # -----------------------------------------------------------
+    def stats(self) -> dict:
+        """Queue depth, counters and p50/p95/p99 queue wait (ms) per priority."""
+        with self._cond:
+            queued = defaultdict(int)
+            for priority, _ in self._queue:
+                queued[priority] += 1
+            names = {value: name for name, value in PRIORITIES.items()}
+            return {
+                "queued": {names[p]: n for p, n in queued.items()},
+                **{key: self._counters[key] for key in
+                   ("calls", "throttled", "retries", "timeouts", "failures", "max_queued")},
+                "wait_ms": {
+                    priority: {
+                        "count": len(samples),
+                        "sum": round(sum(samples), 3),
+                        **{f"p{int(q * 100)}": round(_percentile(samples, q), 3) for q in QUANTILES},
+                    }
+                    for priority, samples in self._waits.items()
+                },
+            }
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition of stats()."""
+        stats = self.stats()
+        lines = [
+            "# HELP jd_agent_llm_queue_depth LLM calls waiting for admission.",
+            "# TYPE jd_agent_llm_queue_depth gauge",
+        ]
+        for priority in PRIORITIES:
+            lines.append(f'jd_agent_llm_queue_depth{{priority="{priority}"}} {stats["queued"].get(priority, 0)}')
+
+        lines.append("# HELP jd_agent_llm_queue_wait_seconds Time LLM calls spent queued.")
+        lines.append("# TYPE jd_agent_llm_queue_wait_seconds summary")
+        for priority, waits in stats["wait_ms"].items():
+            for q in QUANTILES:
+                value = round(waits[f"p{int(q * 100)}"] / 1000, 6)
+                lines.append(f'jd_agent_llm_queue_wait_seconds{{priority="{priority}",quantile="{q}"}} {value}')
+            lines.append(f'jd_agent_llm_queue_wait_seconds_sum{{priority="{priority}"}} {round(waits["sum"] / 1000, 6)}')
+            lines.append(f'jd_agent_llm_queue_wait_seconds_count{{priority="{priority}"}} {waits["count"]}')
+
+        for key, help_text in (
+            ("retries", "LLM call attempts retried after a transient error."),
+            ("timeouts", "LLM calls that hit their deadline."),
+            ("failures", "LLM calls that failed after all retries."),
+        ):
+            lines.append(f"# HELP jd_agent_llm_{key}_total {help_text}")
+            lines.append(f"# TYPE jd_agent_llm_{key}_total counter")
+            lines.append(f"jd_agent_llm_{key}_total {stats[key]}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))]
+
+
+# ---------------------------------------------------------------
+# SHARED INSTANCE
+# ---------------------------------------------------------------
+_scheduler = None
+_lock = threading.Lock()
+
+
+def build_scheduler() -> LLMScheduler:
+    """
+    Create the shared scheduler from environment settings.
+
+    JD_AGENT_LLM_TIMEOUT    - seconds per call incl. queueing and retries (default: 120, 0 = none)
+    JD_AGENT_LLM_RETRIES    - retries on transient errors (default: 3)
+    JD_AGENT_LLM_RPM        - requests per minute (default: 0 = unlimited)
+    JD_AGENT_LLM_TPM        - tokens per minute (default: 0 = unlimited)
+    """
+    return LLMScheduler(
+        rpm=int(os.getenv("JD_AGENT_LLM_RPM", "0")) or None,
+        tpm=int(os.getenv("JD_AGENT_LLM_TPM", "0")) or None,
+        timeout=float(os.getenv("JD_AGENT_LLM_TIMEOUT", "120")) or None,
+        max_retries=int(os.getenv("JD_AGENT_LLM_RETRIES", "3")),
+    )
+
+
+def get_scheduler() -> LLMScheduler:
+    """The scheduler every node's LLM calls go through, built on first use."""
+    global _scheduler
+    if _scheduler is None:
+        with _lock:
+            if _scheduler is None:
+                _scheduler = build_scheduler()
+    return _scheduler
+
+
+def set_scheduler(scheduler: Optional[LLMScheduler]):
+    """Replace the shared scheduler (None rebuilds it from the environment). Returns the previous one."""
+    global _scheduler
+    with _lock:
+        previous, _scheduler = _scheduler, scheduler
+    return previous
+
+
+def call_llm(messages, model=None):
+    """Invoke `model` (default: the current llm) on `messages` through the scheduler."""
+    model = model or get_llm()
+    return get_scheduler().run(lambda: model.invoke(messages), messages)
+
+
+async def acall_llm(messages, model=None):
+    """Async version of call_llm."""
+    model = model or get_llm()
+    return await get_scheduler().arun(lambda: model.ainvoke(messages), messages)
@@ -0,0 +1,314 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+from jd_agent.utils.renderer import SECTION_HEADINGS, split_sections
+from jd_agent.utils.validators import QualityScore, PASS_THRESHOLD
+import argparse
+import json
+import os
+import re
+import threading
+
+
+# ---------------------------------------------------------------
+# SETTINGS
+# ---------------------------------------------------------------
+# Pre-scorer on/off, and how far from PASS_THRESHOLD an estimate must be
+# before the LLM judge is skipped
+PRESCORE_ENABLED = os.getenv("JD_AGENT_PRESCORE", "1").strip().lower() in ("1", "true", "yes", "on")
+PRESCORE_MARGIN = int(os.getenv("JD_AGENT_PRESCORE_MARGIN", "15"))
+
+# Optional JSONL file where (draft, heuristic, llm) score samples are appended
+SCORE_LOG_PATH = os.getenv("JD_AGENT_SCORE_LOG")
+
+# Structure points per section (sums to 30)
+SECTION_POINTS = {
+    "title": 3,
+    "about": 4,
+    "summary": 4,
+    "responsibilities": 5,
+    "skills": 5,
+    "preferred": 3,
+    "education": 3,
+    "experience": 3,
+}
+
+BUZZWORDS = [
+    "rockstar", "rock star", "ninja", "guru", "wizard", "unicorn", "10x",
+    "synergy", "synergies", "wear many hats", "work hard, play hard",
+    "work hard play hard", "hit the ground running", "self-starter", "go-getter",
+    "think outside the box", "best-in-class", "world-class", "cutting-edge",
+    "bleeding-edge", "game-changer", "game changer", "fast-paced", "crushing it",
+    "paradigm", "leverage synergies", "move the needle", "thought leader",
+]
+
+# Wording that narrows the applicant pool (age, gender, culture-fit coding)
+EXCLUSIONARY_TERMS = [
+    "young", "digital native", "recent graduate only", "manpower", "salesman",
+    "chairman", "he will", "his role", "she will", "native english",
+    "culture fit", "able-bodied",
+]
+
+_WORD_RE = re.compile(r"[A-Za-z][A-Za-z'+#.-]*")
+_SENTENCE_RE = re.compile(r"[.!?]+(?:\s|$)")
+_YEARS_RE = re.compile(r"(\d{1,2})\s*\+?\s*(?:-\s*\d{1,2}\s*)?years?", re.IGNORECASE)
+_ACRONYM_RE = re.compile(r"\b[A-Z]{2,}[A-Za-z]*\b")
+
+
+class QualityEstimate(BaseModel):
+    """Local pre-score of a draft and whether it is confident enough to skip the LLM"""
+    score: QualityScore = Field(description="Estimated rubric scores (source='heuristic')")
+    decision: Optional[bool] = Field(
+        default=None,
+        description="True/False for a confident pass/fail, None when the LLM should decide"
+    )
+
+
+# ---------------------------------------------------------------
+# TEXT METRICS
+# ---------------------------------------------------------------
+def _syllables(word: str) -> int:
+    word = word.lower().strip("'.-")
+    if len(word) <= 3:
+        return 1
+    word = re.sub(r"(?:es|ed|e)$", "", word)
+    return max(1, len(re.findall(r"[aeiouy]+", word)))
+
+
+def reading_grade(text: str) -> float:
+    """Flesch-Kincaid grade level of the prose."""
+    words = _WORD_RE.findall(text)
+    if not words:
+        return 0.0
+    sentences = max(1, len(_SENTENCE_RE.findall(text)))
+    syllables = sum(_syllables(w) for w in words)
+    return 0.39 * len(words) / sentences + 11.8 * syllables / len(words) - 15.59
+
+
+def _find_terms(text: str, terms) -> list[str]:
+    lowered = text.lower()
+    return [t for t in terms if re.search(r"(?<![a-z])" + re.escape(t) + r"(?![a-z])", lowered)]
+
+
+def _bullets(blocks) -> int:
+    return sum(1 for kind, _ in blocks if kind == "bullet")
+
+
+def _prose(sections) -> str:
+    """Body text of all sections, with each bullet/paragraph ended as a sentence."""
+    parts = []
+    for key, blocks in sections.items():
+        if key == "title":
+            continue
+        for kind, text in blocks:
+            if kind not in ("label", "heading"):
+                parts.append(text if text[-1] in ".!?" else text + ".")
+    return " ".join(parts)
+
+
+# ---------------------------------------------------------------
+# RUBRIC ESTIMATE
+# ---------------------------------------------------------------
+def estimate_quality(draft: Optional[str], margin: int = PRESCORE_MARGIN) -> QualityEstimate:
+    """
+    Estimate the quality rubric (Structure 30, Tone 25, Realism 25,
+    Clarity 20) from the draft text alone.
+    """
+    draft = draft or ""
+    sections = split_sections(draft)
+    issues = []
+    section_issues = {}
+
+    def flag(issue, *keys):
+        # Every issue is also filed under the sections it concerns
+        issues.append(issue)
+        for key in keys or ("general",):
+            section_issues.setdefault(key, []).append(issue)
+
+    section_text = {
+        key: " ".join(text for _, text in blocks) for key, blocks in sections.items()
+    }
+
+    def located(terms):
+        return [key for key, text in section_text.items() if _find_terms(text, terms)]
+
+    # Structure: section presence and responsibility bullet count
+    missing = [key for key in SECTION_POINTS if not sections.get(key)]
+    structure = 30 - sum(SECTION_POINTS[key] for key in missing)
+    for key in missing:
+        flag(f"Missing section: {SECTION_HEADINGS[key]}", key)
+
+    responsibilities = _bullets(sections.get("responsibilities", []))
+    if "responsibilities" not in missing and not 5 <= responsibilities <= 8:
+        structure -= 4 if responsibilities < 3 or responsibilities > 12 else 2
+        flag(f"Key Responsibilities has {responsibilities} bullets (aim for 5-8)", "responsibilities")
+
+    # Tone: buzzwords, exclusionary wording, shouting
+    tone = 25
+    buzzwords = _find_terms(draft, BUZZWORDS)
+    if buzzwords:
+        tone -= min(12, 2 * len(buzzwords))
+        flag("Buzzwords: " + ", ".join(buzzwords), *located(buzzwords))
+    exclusionary = _find_terms(draft, EXCLUSIONARY_TERMS)
+    if exclusionary:
+        tone -= min(9, 3 * len(exclusionary))
+        flag("Exclusionary wording: " + ", ".join(exclusionary), *located(exclusionary))
+    if draft.count("!") > 2:
+        tone -= 2
+        flag("Too many exclamation marks", *[k for k, text in section_text.items() if "!" in text])
+
+    # Realism: requirement counts and experience asks
+    realism = 25
+    required = _bullets(sections.get("skills", []))
+    preferred = _bullets(sections.get("preferred", []))
+    if required > 12:
+        realism -= 6
+        flag(f"Required Skills lists {required} items (overstuffed)", "skills")
+    elif required > 9:
+        realism -= 3
+        flag(f"Required Skills lists {required} items", "skills")
+    if required + preferred > 20:
+        realism -= 5
+        flag(f"{required + preferred} total requirements", "skills", "preferred")
+
+    years = [int(y) for y in _YEARS_RE.findall(draft)]
+    if years and max(years) >= 12:
+        realism -= 4
+        flag(f"Asks for {max(years)}+ years of experience",
+             *[k for k, text in section_text.items() if any(int(y) >= 12 for y in _YEARS_RE.findall(text))])
+    if years and max(years) >= 5 and re.search(r"\b(entry[- ]level|junior|fresher)\b", draft, re.IGNORECASE):
+        realism -= 6
+        flag("Junior/entry-level role with a senior experience requirement")
+    if len(re.findall(r"\bexpert(?:ise)? (?:in|with)\b", draft, re.IGNORECASE)) > 3:
+        realism -= 3
+        flag("Too many 'expert in' requirements", "skills")
+
+    # Clarity: reading grade, sentence length, acronym density, length
+    clarity = 20
+    words = _WORD_RE.findall(draft)
+    prose = _prose(sections)
+    grade = reading_grade(prose)
+    if grade > 15:
+        clarity -= 6
+        flag(f"Reading grade {grade:.0f} (hard to read)")
+    elif grade > 12:
+        clarity -= 3
+
+    sentences = [s for s in _SENTENCE_RE.split(prose) if s.strip()]
+    if sentences:
+        average = sum(len(s.split()) for s in sentences) / len(sentences)
+        if average > 25:
+            clarity -= 4
+            flag(f"Long sentences (avg {average:.0f} words)")
+
+    if words and len(_ACRONYM_RE.findall(draft)) / len(words) > 0.08:
+        clarity -= 3
+        flag("Jargon/acronym heavy")
+    if len(words) < 150:
+        clarity -= 6
+        flag(f"Too short ({len(words)} words)")
+    elif len(words) > 1200:
+        clarity -= 3
+        flag(f"Too long ({len(words)} words)")
+
+    structure, tone, realism, clarity = (max(0, v) for v in (structure, tone, realism, clarity))
+    total = structure + tone + realism + clarity
+
+    score = QualityScore(
+        score=total,
+        structure_score=structure,
+        tone_score=tone,
+        realism_score=realism,
+        clarity_score=clarity,
+        issues=issues,
+        section_issues=section_issues,
+        source="heuristic",
+    )
+
+    # Missing two or more sections is a reliable fail regardless of the rest;
+    # a confident pass needs a high score with nothing flagged at all
+    if total >= PASS_THRESHOLD + margin and not issues:
+        decision = True
+    elif total <= PASS_THRESHOLD - margin or len(missing) >= 2:
+        decision = False
+    else:
+        decision = None
+
+    return QualityEstimate(score=score, decision=decision)
+
+
+# ---------------------------------------------------------------
+# SCORE LOG + CALIBRATION
+# ---------------------------------------------------------------
+_log_lock = threading.Lock()
+
+
+def log_score_sample(draft: str, estimate: QualityEstimate, llm_score: Optional[QualityScore]):
+    """Append a (draft, heuristic, llm) sample to SCORE_LOG_PATH, if set."""
+    if not SCORE_LOG_PATH or llm_score is None:
+        return
+    sample = {
+        "draft": draft,
+        "heuristic": estimate.score.model_dump(by_alias=True),
+        "llm": llm_score.model_dump(by_alias=True),
+    }
+    with _log_lock, open(SCORE_LOG_PATH, "a", encoding="utf-8") as f:
+        f.write(json.dumps(sample) + "\n")
+
+
+def calibrate(samples, margin: int = PRESCORE_MARGIN) -> dict:
+    """
+    Compare the pre-scorer with logged LLM scores.
+    `samples` are dicts with "draft" and "llm" (QualityScore fields); the
+    heuristic is recomputed so lexicon/weight changes can be evaluated.
+    Returns mean absolute error per dimension, overall pass/fail agreement,
+    and how often a confident (LLM-skipping) decision matched the LLM.
+    """
+    dimensions = ["score", "structure_score", "tone_score", "realism_score", "clarity_score"]
+    errors = {d: 0.0 for d in dimensions}
+    agree = confident = confident_agree = 0
+    n = 0
+
+    for sample in samples:
+        llm_score = QualityScore.model_validate(sample["llm"])
+        estimate = estimate_quality(sample["draft"], margin=margin)
+        n += 1
+
+        for d in dimensions:
+            errors[d] += abs(getattr(estimate.score, d) - getattr(llm_score, d))
+
+        heuristic_pass = estimate.score.score >= PASS_THRESHOLD
+        agree += heuristic_pass == llm_score.passed
+        if estimate.decision is not None:
+            confident += 1
+            confident_agree += estimate.decision == llm_score.passed
+
+    if n == 0:
+        return {"samples": 0}
+
+    return {
+        "samples": n,
+        "mae": {d: round(errors[d] / n, 2) for d in dimensions},
+        "pass_agreement": round(agree / n, 3),
+        "skip_rate": round(confident / n, 3),
+        "skip_accuracy": round(confident_agree / confident, 3) if confident else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compare the local pre-scorer against logged LLM quality scores."
+    )
+    parser.add_argument("score_log", help="JSONL written via JD_AGENT_SCORE_LOG")
+    parser.add_argument("--margin", type=int, default=PRESCORE_MARGIN,
+                        help=f"Confidence margin around the pass threshold (default: {PRESCORE_MARGIN})")
+    args = parser.parse_args(argv)
+
+    with open(args.score_log, encoding="utf-8") as f:
+        samples = [json.loads(line) for line in f if line.strip()]
+
+    print(json.dumps(calibrate(samples, margin=args.margin), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,298 @@
+from array import array
+from collections import Counter
+from jd_agent.utils.fields import parse_user_input
+from pydantic import BaseModel, Field
+from typing import Optional
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+
+# ---------------------------------------------------------------
+# SETTINGS
+# ---------------------------------------------------------------
+# MinHash signature length, split into BANDS bands of ROWS slots for LSH
+NUM_PERM = 64
+BANDS = 16
+ROWS = 4
+
+# Past JDs sharing fewer bands with the query are not candidates: keeps
+# >99% of pairs at 0.8 Jaccard while dropping most pairs around 0.5
+MIN_BAND_HITS = 3
+
+# A band shared by more past JDs than this is made of boilerplate every
+# requisition has (same education line, same department): it says little
+# about similarity and would dominate query time, so queries skip it
+MAX_BUCKET = 256
+
+# Candidates whose MinHash estimate is this far below the threshold are
+# not worth an exact check (the estimate's std. error is ~0.05 at 64 slots)
+ESTIMATE_MARGIN = 0.15
+
+# Input fields that decide whether two requisitions are the same role.
+# Job ID, location, work mode, salary etc. are left to the adapt step
+SIMILARITY_FIELDS = (
+    "client",
+    "job_title",
+    "department",
+    "description",
+    "experience",
+    "relevant_experience",
+    "skills",
+    "education",
+)
+
+# Spellings that should not make two requisitions look different
+_SYNONYMS = {
+    "sr": "senior",
+    "snr": "senior",
+    "jr": "junior",
+    "engineer": "developer",
+    "dev": "developer",
+    "programmer": "developer",
+    "mgr": "manager",
+    "yrs": "years",
+    "yr": "years",
+    "year": "years",
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9+#]*")
+
+
+def _tokens(text):
+    return [_SYNONYMS.get(token, token) for token in _TOKEN_RE.findall(text.lower())]
+
+
+def shingles(normalized_input: str) -> set:
+    """
+    Features of a requisition: words and word pairs per field (so "python"
+    in the title and in the skills count separately) and whole skill items.
+    Free-form input falls back to the words of the whole text.
+    """
+    fields = parse_user_input(normalized_input)
+    if fields is None:
+        fields = {"text": normalized_input}
+
+    features = set()
+    for key, value in fields.items():
+        if key not in SIMILARITY_FIELDS and key != "text":
+            continue
+        tokens = _tokens(value or "")
+        features.update(f"{key}:{token}" for token in tokens)
+        features.update(f"{key}:{first} {second}" for first, second in zip(tokens, tokens[1:]))
+        if key == "skills":
+            features.update(f"skill:{' '.join(_tokens(item))}" for item in value.split(",") if item.strip())
+    return features
+
+
+def minhash(features) -> array:
+    """
+    NUM_PERM-long MinHash signature of a feature set. Each feature's
+    SHAKE-128 digest is split into NUM_PERM independent 32-bit hashes,
+    so the per-slot minimum is taken in C rather than per permutation.
+    """
+    hashes = [array("I", hashlib.shake_128(feature.encode()).digest(4 * NUM_PERM)) for feature in features]
+    if not hashes:
+        return array("I", [0] * NUM_PERM)
+    return array("I", map(min, zip(*hashes)))
+
+
+def _band_keys(signature):
+    return [hash((band,) + tuple(signature[band * ROWS:(band + 1) * ROWS])) for band in range(BANDS)]
+
+
+def _jaccard(first, second):
+    union = len(first | second)
+    return len(first & second) / union if union else 0.0
+
+
+class SimilarJD(BaseModel):
+    """A past JD close enough to seed a new requisition."""
+    key: str = Field(description="Hash of the past run's normalized input")
+    similarity: float = Field(description="Jaccard similarity of the two inputs' features (0-1)")
+    normalized_input: str = Field(description="The past run's normalized input")
+    reviewed: str = Field(description="The past run's reviewed JD")
+
+
+# ---------------------------------------------------------------
+# INDEX
+# ---------------------------------------------------------------
+class SimilarJDIndex:
+    """
+    Near-duplicate index of past reviewed JDs, keyed on the normalized input.
+
+    MinHash signatures and LSH buckets live in memory (about 1 KB per JD),
+    so a query is a signature plus BANDS dict lookups regardless of corpus
+    size. The JD texts stay in SQLite (memory-mapped) and only the best
+    `candidates` are read back, to confirm them with exact Jaccard similarity.
+    Inserts are incremental; the buckets are rebuilt from SQLite on start.
+    """
+
+    def __init__(self, path: str = ":memory:", threshold: float = 0.8, candidates: int = 1):
+        self.path = path
+        self.threshold = threshold
+        self.candidates = candidates
+
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(path) if path != ":memory:" else ""
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA mmap_size=268435456")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jds (
+                id INTEGER PRIMARY KEY,
+                key TEXT UNIQUE NOT NULL,
+                signature BLOB NOT NULL,
+                normalized_input TEXT NOT NULL,
+                reviewed TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+        self._signatures = {}
+        self._buckets = {}
+        for row_id, blob in self._conn.execute("SELECT id, signature FROM jds"):
+            self._index(row_id, array("I", blob))
+
+    @staticmethod
+    def make_key(normalized_input: str) -> str:
+        return hashlib.sha256(normalized_input.strip().encode("utf-8")).hexdigest()
+
+    def _index(self, row_id, signature):
+        self._signatures[row_id] = signature
+        for band_key in _band_keys(signature):
+            bucket = self._buckets.get(band_key)
+            if bucket is None:
+                # Most buckets hold one JD: store the id, not a list
+                self._buckets[band_key] = row_id
+            elif isinstance(bucket, list):
+                bucket.append(row_id)
+            elif bucket != row_id:
+                self._buckets[band_key] = [bucket, row_id]
+
+    def add(self, normalized_input: str, reviewed: str) -> None:
+        """Store (or replace) the reviewed JD for this input."""
+        key = self.make_key(normalized_input)
+        signature = minhash(shingles(normalized_input))
+        with self._lock:
+            cursor = self._conn.execute(
+                """
+                INSERT INTO jds (key, signature, normalized_input, reviewed, created_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET reviewed = excluded.reviewed, created_at = excluded.created_at
+                RETURNING id
+                """,
+                (key, signature.tobytes(), normalized_input, reviewed, time.time()),
+            )
+            row_id = cursor.fetchone()[0]
+            self._conn.commit()
+            if row_id not in self._signatures:
+                self._index(row_id, signature)
+
+    def query(self, normalized_input: str) -> Optional[SimilarJD]:
+        """The most similar past JD at or above the threshold, or None."""
+        features = shingles(normalized_input)
+        signature = minhash(features)
+
+        with self._lock:
+            hits = Counter()
+            for band_key in _band_keys(signature):
+                bucket = self._buckets.get(band_key)
+                if isinstance(bucket, list):
+                    if len(bucket) <= MAX_BUCKET:
+                        hits.update(bucket)
+                elif bucket is not None:
+                    hits[bucket] += 1
+            found = [row_id for row_id, count in hits.items() if count >= MIN_BAND_HITS]
+
+            # Rank by estimated similarity (share of matching signature
+            # slots), dropping candidates clearly below the threshold ...
+            estimates = {
+                row_id: sum(map(int.__eq__, signature, self._signatures[row_id])) / NUM_PERM
+                for row_id in found
+            }
+            ranked = sorted(
+                (row_id for row_id, estimate in estimates.items() if estimate >= self.threshold - ESTIMATE_MARGIN),
+                key=estimates.get,
+                reverse=True,
+            )[:self.candidates]
+
+            # ... and confirm the best few exactly
+            best = None
+            for row_id in ranked:
+                key, past_input, reviewed = self._conn.execute(
+                    "SELECT key, normalized_input, reviewed FROM jds WHERE id = ?", (row_id,)
+                ).fetchone()
+                similarity = _jaccard(features, shingles(past_input))
+                if similarity >= self.threshold and (best is None or similarity > best.similarity):
+                    best = SimilarJD(key=key, similarity=round(similarity, 4),
+                                     normalized_input=past_input, reviewed=reviewed)
+
+            if best is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return best
+
+    def stats(self) -> dict:
+        """Query hit/miss counters for this process plus the index size."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._signatures),
+            "buckets": len(self._buckets),
+        }
+
+
+def build_similar_index() -> Optional[SimilarJDIndex]:
+    """
+    Create the shared similar-JD index from environment settings.
+
+    JD_AGENT_SIMILAR            - "1" seeds drafts from similar past JDs (default: disabled)
+    JD_AGENT_SIMILAR_PATH       - SQLite file (default: .cache/jd_agent_similar.sqlite, ":memory:" = not kept)
+    JD_AGENT_SIMILAR_THRESHOLD  - minimum input similarity to adapt a past JD (default: 0.8)
+    """
+    if os.getenv("JD_AGENT_SIMILAR", "0").strip().lower() not in ("1", "true", "yes", "on"):
+        return None
+
+    return SimilarJDIndex(
+        path=os.getenv("JD_AGENT_SIMILAR_PATH", os.path.join(".cache", "jd_agent_similar.sqlite")),
+        threshold=float(os.getenv("JD_AGENT_SIMILAR_THRESHOLD", "0.8")),
+    )
+
+
+_index = None
+_built = False
+_lock = threading.Lock()
+
+
+def get_similar_index() -> Optional[SimilarJDIndex]:
+    """The shared index (None when disabled), built on first use."""
+    global _index, _built
+    if not _built:
+        with _lock:
+            if not _built:
+                _index, _built = build_similar_index(), True
+    return _index
+
+
+def set_similar_index(index: Optional[SimilarJDIndex]):
+    """Replace the shared index (None disables it). Returns the previous one."""
+    global _index, _built
+    with _lock:
+        previous, _index, _built = _index, index, True
+    return previous
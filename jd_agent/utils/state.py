@@ -1,10 +1,17 @@
 from pydantic import BaseModel, Field
 from typing import Optional
+from jd_agent.utils.validators import QualityScore, RunBudget, ScoreRecord, StructuredJD
 
 
 class JDState(BaseModel):
     """State that flows through the job description generation pipeline."""
-    
+
+    # Correlation id shared by the logs and metrics of one run
+    run_id: Optional[str] = Field(
+        default=None,
+        description="Run correlation id (generated on the first node if not supplied)"
+    )
+
     # User's original input
     user_input: str = Field(
         default="",
@@ -22,6 +29,16 @@ class JDState(BaseModel):
         description="Normalized and structured user input"
     )
     
+    # Set by validation_node when a near-duplicate past JD exists (see utils/similar.py)
+    reference_jd: Optional[str] = Field(
+        default=None,
+        description="Reviewed JD of a similar past requisition, adapted instead of drafting from scratch"
+    )
+    reference_similarity: Optional[float] = Field(
+        default=None,
+        description="Input similarity (0-1) of that past requisition"
+    )
+
     # Generated by draft_node
     draft: Optional[str] = Field(
         default=None,
@@ -29,15 +46,41 @@ class JDState(BaseModel):
     )
     
     # Generated by quality_check_node
-    quality_check: Optional[str] = Field(
+    quality_check: Optional[QualityScore] = Field(
         default=None,
-        description="JSON result with quality score and issues"
+        description="Parsed quality score, sub-scores, pass status and issues"
     )
     
+    # Rewrite loop bookkeeping (quality_check_node / rewrite_node)
+    score_history: list[ScoreRecord] = Field(
+        default_factory=list,
+        description="Every quality check score of this run, oldest first"
+    )
+    best_draft: Optional[str] = Field(
+        default=None,
+        description="Highest-scoring draft so far; review_node reviews it if the latest rewrite scored lower"
+    )
+    best_score: Optional[int] = Field(
+        default=None,
+        description="Score of best_draft"
+    )
+    best_source: Optional[str] = Field(
+        default=None,
+        description="Source of best_score ('llm' or 'heuristic'); only scores from one source are compared"
+    )
+    loop_started_at: Optional[float] = Field(
+        default=None,
+        description="Epoch time of the first quality check (for the loop's time budget)"
+    )
+    loop_tokens: int = Field(
+        default=0,
+        description="LLM tokens spent on quality checks and rewrites (for the loop's token budget)"
+    )
+
     # Updated by rewrite_node
     rewrite_attempts: int = Field(
         default=0,
-        description="Number of times draft was rewritten (max 3)"
+        description="Number of times draft was rewritten (max JD_AGENT_MAX_REWRITES)"
     )
     
     # Generated by review_node
@@ -45,7 +88,24 @@ class JDState(BaseModel):
         default=None,
         description="Reviewed and ATS-optimized version"
     )
+
+    reviewed_jd: Optional[StructuredJD] = Field(
+        default=None,
+        description="Structured review (single-shot mode); final outputs are rendered from it"
+    )
     
+    # Set by the caller for an incremental run (see fields.regeneration_inputs)
+    regenerate: dict[str, list[str]] = Field(
+        default_factory=dict,
+        description="Sections to regenerate in the previous run's reviewed JD -> changes to apply (empty = full run)"
+    )
+
+    # Updated after every node (see utils/budget.py)
+    budget: RunBudget = Field(
+        default_factory=RunBudget,
+        description="Tokens and cost spent so far, and the steps degraded to stay within the run budget"
+    )
+
     # Generated by final_output_node
     final_markdown: Optional[str] = Field(
         default=None,
@@ -60,4 +120,21 @@ class JDState(BaseModel):
     final_text: Optional[str] = Field(
         default=None,
         description="Final JD in plain text format"
-    )
\ No newline at end of file
+    )
+
+
+def _plain(value):
+    if isinstance(value, BaseModel):
+        return value.model_dump(by_alias=True)
+    if isinstance(value, list):
+        return [_plain(item) for item in value]
+    return value
+
+
+def plain_result(result: dict) -> dict:
+    """
+    A graph result (the dict agent.invoke returns) with its nested models
+    dumped to plain dicts, for JSON output and UIs. Text fields are shared,
+    not copied.
+    """
+    return {key: _plain(value) for key, value in result.items()}
@@ -0,0 +1,52 @@
+# Nodes whose LLM tokens are worth showing to a user as they arrive
+STREAMED_NODES = ("draft", "adapt", "rewrite", "review")
+
+
+# Node path of each branch of the graph (see build_agent). The rewrite node
+# may run several times or not at all
+BRANCH_PATHS = {
+    "full": ("validation", "draft", "quality_check", "rewrite", "review", "final_output"),
+    "adapt": ("validation", "adapt", "review", "final_output"),
+    "regenerate": ("validation", "regenerate", "final_output"),
+}
+
+
+def branch_path(inputs=None, node=None):
+    """
+    Nodes a run goes through, for progress: the branch `node` belongs to
+    when given (the validation node only picks adapt at run time), else
+    the regenerate branch for incremental inputs and the full pipeline
+    otherwise.
+    """
+    if node is not None:
+        return next((path for path in BRANCH_PATHS.values() if node in path), BRANCH_PATHS["full"])
+    return BRANCH_PATHS["regenerate" if (inputs or {}).get("regenerate") else "full"]
+
+
+def stream_events(agent, inputs, token_nodes=STREAMED_NODES, config=None):
+    """
+    Run the agent and yield progress events as the graph executes:
+        ("start", node)        - the graph scheduled and started `node`
+        ("token", node, text, stream)
+                               - an LLM token produced inside one of `token_nodes`;
+                                 `stream` tells apart LLM calls a node makes in
+                                 parallel (e.g. section rewrites)
+        ("end", node)          - `node` finished
+        ("done", state)        - final state (same dict agent.invoke returns)
+    """
+    final_state = None
+
+    for mode, chunk in agent.stream(inputs, config, stream_mode=["tasks", "messages", "values"]):
+        if mode == "tasks":
+            yield ("end" if "result" in chunk else "start", chunk["name"])
+
+        elif mode == "messages":
+            message, metadata = chunk
+            node = metadata.get("langgraph_node")
+            if node in token_nodes and isinstance(message.content, str) and message.content:
+                yield ("token", node, message.content, message.id or node)
+
+        else:
+            final_state = chunk
+
+    yield ("done", final_state)
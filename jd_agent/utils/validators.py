@@ -1,4 +1,10 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
+from typing import Optional
+from jd_agent.utils.renderer import SECTION_ALIASES, SECTION_HEADINGS
+
+
+# Minimum overall score for a draft to pass the quality check
+PASS_THRESHOLD = 70
 
 
 class ValidationNodeOutput(BaseModel):
@@ -12,20 +18,144 @@ class DraftNodeOutput(BaseModel):
     draft: str = Field(description="First draft of job description")
 
 
+class AdaptNodeOutput(DraftNodeOutput):
+    """Output from adapt_node"""
+    reference_jd: Optional[str] = Field(
+        default=None,
+        description="Cleared: the past JD is superseded by the adapted draft"
+    )
+
+
+class QualityScore(BaseModel):
+    """Quality check verdict: rubric scores, pass status and issues"""
+    model_config = ConfigDict(populate_by_name=True)
+
+    score: int = Field(default=0, description="Overall score out of 100")
+    structure_score: int = Field(default=0, description="Structure, out of 30")
+    tone_score: int = Field(default=0, description="Tone, out of 25")
+    realism_score: int = Field(default=0, description="Realism, out of 25")
+    clarity_score: int = Field(default=0, description="Clarity, out of 20")
+    passed: Optional[bool] = Field(
+        default=None,
+        alias="pass",
+        description="Whether the draft passes; derived from score if omitted"
+    )
+    issues: list[str] = Field(default_factory=list, description="Issues to fix")
+    section_issues: dict[str, list[str]] = Field(
+        default_factory=dict,
+        description="Issues by section key (title, about, summary, ...); 'general' for document-wide ones"
+    )
+    source: str = Field(default="llm", description="'llm' or 'heuristic' (local pre-scorer)")
+
+    @field_validator("section_issues", mode="before")
+    @classmethod
+    def _section_keys(cls, value):
+        # Models answer with headings ("Job Summary") as often as with keys
+        if not isinstance(value, dict):
+            return {}
+        normalized = {}
+        for name, issues in value.items():
+            label = str(name).strip().lower().replace("_", " ")
+            key = label if label in SECTION_HEADINGS else SECTION_ALIASES.get(label, "general")
+            if isinstance(issues, str):
+                issues = [issues]
+            normalized.setdefault(key, []).extend(str(issue) for issue in issues or [])
+        return normalized
+
+    @model_validator(mode="after")
+    def _derive_pass(self):
+        if self.passed is None:
+            self.passed = self.score >= PASS_THRESHOLD
+        return self
+
+
+class ScoreRecord(BaseModel):
+    """One quality check in the rewrite loop"""
+    attempt: int = Field(description="Rewrites the scored draft had been through")
+    score: int = Field(description="Overall score out of 100")
+    passed: bool = Field(description="Whether the draft passed")
+    source: str = Field(default="llm", description="'llm' or 'heuristic' (local pre-scorer)")
+    elapsed_s: float = Field(default=0.0, description="Seconds since the run's first quality check")
+    loop_tokens: int = Field(default=0, description="LLM tokens spent on quality checks and rewrites so far")
+
+
+class RunBudget(BaseModel):
+    """Tokens and cost a run has spent so far (limits: see utils/budget.py)"""
+    prompt_tokens: int = Field(default=0, description="Prompt tokens sent, counted with the local tokenizer")
+    completion_tokens: int = Field(default=0, description="Completion tokens received, counted with the local tokenizer")
+    cost_usd: float = Field(default=0.0, description="Estimated cost in USD (models with a known price only)")
+    degraded: list[str] = Field(
+        default_factory=list,
+        description="Steps skipped, truncated or done locally to stay within the budget"
+    )
+
+
 class QualityCheckOutput(BaseModel):
     """Output from quality_check_node"""
-    quality_check: str = Field(description="JSON with score, issues, and pass status")
+    quality_check: Optional[QualityScore] = Field(
+        description="Parsed quality verdict, or None if the model's answer could not be parsed"
+    )
+    score_history: list[ScoreRecord] = Field(default_factory=list, description="Scores so far, oldest first")
+    best_draft: Optional[str] = Field(default=None, description="Highest-scoring draft so far")
+    best_score: Optional[int] = Field(default=None, description="Its score")
+    best_source: Optional[str] = Field(default=None, description="Source of best_score: 'llm' or 'heuristic'")
+    loop_started_at: Optional[float] = Field(default=None, description="Epoch time of the first quality check")
+    loop_tokens: int = Field(default=0, description="LLM tokens spent on quality checks and rewrites")
 
 
 class RewriteNodeOutput(BaseModel):
     """Output from rewrite_node"""
     draft: str = Field(description="Rewritten draft")
     rewrite_attempts: int = Field(description="Number of rewrite attempts")
+    loop_tokens: int = Field(default=0, description="LLM tokens spent on quality checks and rewrites")
+
+
+class StructuredJD(BaseModel):
+    """A reviewed job description as structured fields (same schema as final_json)"""
+    job_title: str = Field(default="", description="Job title")
+    job_id: Optional[str] = Field(default=None, description="Job/requisition ID")
+    company: Optional[str] = Field(default=None, description="Hiring company name")
+    location: Optional[str] = Field(default=None, description="Job location")
+    work_mode: Optional[str] = Field(default=None, description="Remote, Hybrid or On-site")
+    employment_type: Optional[str] = Field(default=None, description="Full-time, Part-time, Contract, ...")
+    about_us: str = Field(default="", description="About the company, 2-3 short paragraphs")
+    summary: str = Field(default="", description="Brief overview of the role")
+    responsibilities: list[str] = Field(default_factory=list, description="Key responsibilities, 5-8 items")
+    required_skills: list[str] = Field(default_factory=list, description="Required technical and soft skills")
+    preferred_qualifications: list[str] = Field(default_factory=list, description="Nice-to-have qualifications")
+    education: str = Field(default="", description="Educational requirements")
+    experience: str = Field(default="", description="Experience requirements")
+    other_sections: dict[str, str] = Field(
+        default_factory=dict,
+        description="Any other sections, heading -> text (e.g. Benefits, How to Apply)"
+    )
 
 
 class ReviewNodeOutput(BaseModel):
     """Output from review_node"""
     reviewed: str = Field(description="Polished and ATS-ready version")
+    reviewed_jd: Optional[StructuredJD] = Field(
+        default=None,
+        description="Structured form of the review (single-shot structured review only)"
+    )
+    best_draft: Optional[str] = Field(
+        default=None,
+        description="Cleared: the rewrite loop's best draft is superseded by the review"
+    )
+
+
+class RegenerateNodeOutput(BaseModel):
+    """Output from regenerate_node"""
+    draft: str = Field(description="Previous JD with the affected sections regenerated")
+    reviewed: str = Field(description="Same as draft; the regenerated JD goes straight to final output")
+    reviewed_jd: Optional[StructuredJD] = Field(
+        default=None,
+        description="Cleared: the previous structured review no longer matches"
+    )
+    regenerate: dict[str, list[str]] = Field(
+        default_factory=dict,
+        description="Cleared once the sections are regenerated"
+    )
 
 
 class FinalOutputNodeOutput(BaseModel):
@@ -0,0 +1,184 @@
+from concurrent.futures import ThreadPoolExecutor
+from jd_agent.agent import get_agent
+from jd_agent.utils.fields import changed_fields, format_user_input, regeneration_inputs, stale_sections
+from jd_agent.utils.logger import new_run_id
+from jd_agent.utils.renderer import METADATA_LABELS, parse_sections, render_markdown, render_text, update_metadata
+from jd_agent.utils.state import plain_result
+import asyncio
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# Fields that only appear in the title block: a variant that changes nothing
+# else is patched locally, with no LLM call
+VARIANT_FIELDS = tuple(METADATA_LABELS)
+
+# Variant field -> key in final_json (salary and positions are not in the schema)
+_JSON_KEYS = {
+    "job_id": "job_id",
+    "location": "location",
+    "work_mode": "work_mode",
+    "employment_type": "employment_type",
+}
+
+
+def _is_valid(result):
+    return (result.get("validation_result") or "").upper().startswith("VALID")
+
+
+def _patch_json(final_json, changes):
+    """final_json with the variant's values set, or None if it is not a JSON object."""
+    try:
+        data = json.loads(final_json or "")
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(data, dict):
+        return None
+
+    for key, value in changes.items():
+        if key in _JSON_KEYS:
+            data[_JSON_KEYS[key]] = value or None
+    return json.dumps(data, indent=2, ensure_ascii=False)
+
+
+def local_variant(base_result, base_fields, fields):
+    """
+    The base run's outputs with the variant's metadata patched in, or None
+    when the variant needs the LLM: it changes more than the title block,
+    the body quotes an old value (e.g. the location in the summary), or
+    the base JD could not be parsed.
+    """
+    changes = changed_fields(base_fields, fields)
+    if any(key not in VARIANT_FIELDS for key in changes):
+        return None
+    if stale_sections(base_result["reviewed"], base_fields, fields):
+        return None
+
+    # Values the base JD left out on purpose stay out; new ones are added
+    add = [key for key in changes if not str(base_fields.get(key) or "").strip()]
+    reviewed = update_metadata(base_result["reviewed"], changes, add=add)
+
+    parsed = parse_sections(reviewed)
+    final_json = _patch_json(base_result.get("final_json"), changes)
+    if parsed is None or final_json is None:
+        return None
+
+    return {
+        **base_result,
+        "user_input": format_user_input(fields),
+        "reviewed": reviewed,
+        "draft": reviewed,
+        "reviewed_jd": None,
+        "final_markdown": render_markdown(parsed),
+        "final_json": final_json,
+        "final_text": render_text(parsed),
+    }
+
+
+def _variant_plan(base_result, base_fields, overrides):
+    """
+    Per variant: ("local", result) when it can be built without the LLM,
+    else ("regenerate", agent inputs) or, as a last resort, ("full", agent inputs).
+    """
+    plan = []
+    for override in overrides:
+        fields = {**base_fields, **override}
+        result = local_variant(base_result, base_fields, fields)
+        if result is not None:
+            plan.append(("local", result))
+            continue
+
+        inputs = regeneration_inputs(base_result, base_fields, fields)
+        if inputs is not None:
+            plan.append(("regenerate", inputs))
+        else:
+            plan.append(("full", {"user_input": format_user_input(fields)}))
+    return plan
+
+
+def _run_inputs(inputs):
+    """Inputs and config for one run (a checkpoint thread per run when checkpointing is on)."""
+    from jd_agent.utils.checkpoint import thread_config
+
+    run_id = new_run_id()
+    return {**inputs, "run_id": run_id}, thread_config(run_id)
+
+
+def _finish(agent, config, result):
+    if agent.checkpointer is not None:
+        agent.checkpointer.delete_thread(config["configurable"]["thread_id"])
+    return plain_result(result)
+
+
+def _invoke(agent, inputs):
+    inputs, config = _run_inputs(inputs)
+    return _finish(agent, config, agent.invoke(inputs, config))
+
+
+async def _ainvoke(agent, inputs):
+    inputs, config = _run_inputs(inputs)
+    return _finish(agent, config, await agent.ainvoke(inputs, config))
+
+
+def _variant_results(overrides, plan, results):
+    """Attach each variant's overrides and how it was produced to its result."""
+    results = [
+        {**result, "variant": override, "variant_mode": mode}
+        for override, (mode, _), result in zip(overrides, plan, results)
+    ]
+
+    counts = {mode: sum(1 for m, _ in plan if m == mode) for mode in ("local", "regenerate", "full")}
+    logger.info("🧬 %s variants: %s", len(plan), ", ".join(f"{n} {m}" for m, n in counts.items() if n))
+    return results
+
+
+def generate_variants(base_fields, overrides, concurrency=4):
+    """
+    Generate one JD per variant of a base requisition (e.g. one per location).
+    The base runs through the full pipeline once; each variant is
+    `base_fields` updated with one dict of `overrides`. Variants that only
+    change title-block fields (location, work mode, employment type,
+    salary, ...) and whose old values the body does not quote are patched
+    locally without LLM calls; others regenerate just the sections they
+    affect. Returns one result per override, in
+    order, each with "variant" (its overrides) and "variant_mode" ("local",
+    "regenerate" or "full"). If the base input is invalid, so is every variant.
+    """
+    agent = get_agent()
+    base_result = _invoke(agent, {"user_input": format_user_input(base_fields)})
+    if not _is_valid(base_result):
+        return [{**base_result, "variant": override, "variant_mode": "base"} for override in overrides]
+
+    plan = _variant_plan(base_result, base_fields, overrides)
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        futures = [
+            None if mode == "local" else pool.submit(_invoke, agent, payload)
+            for mode, payload in plan
+        ]
+        results = [
+            payload if future is None else future.result()
+            for (_, payload), future in zip(plan, futures)
+        ]
+    return _variant_results(overrides, plan, results)
+
+
+async def agenerate_variants(base_fields, overrides, concurrency=4):
+    """Async version of generate_variants."""
+    agent = get_agent()
+    base_result = await _ainvoke(agent, {"user_input": format_user_input(base_fields)})
+    if not _is_valid(base_result):
+        return [{**base_result, "variant": override, "variant_mode": "base"} for override in overrides]
+
+    plan = _variant_plan(base_result, base_fields, overrides)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(mode, payload):
+        if mode == "local":
+            return payload
+        async with semaphore:
+            return await _ainvoke(agent, payload)
+
+    results = await asyncio.gather(*(run(mode, payload) for mode, payload in plan))
+    return _variant_results(overrides, plan, results)
@@ -1,6 +1,44 @@
+import argparse
+import logging
+import os
+
+
 def main():
-    print("Hello from prod-jd-agent!")
+    parser = argparse.ArgumentParser(
+        description="Generate job descriptions in batch from a JSONL or CSV file of job fields."
+    )
+    parser.add_argument("input", help="JSONL or CSV file, one requisition per row")
+    parser.add_argument("-o", "--output", default="jd_output.jsonl",
+                        help="JSONL file results are appended to (default: jd_output.jsonl)")
+    parser.add_argument("-c", "--concurrency", type=int, default=4,
+                        help="Max JDs generated at once (default: 4)")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="Start over instead of skipping records already in the output")
+    parser.add_argument("--metrics", metavar="PATH",
+                        help="Write per-node latency/token metrics (Prometheus text) to PATH when done")
+    args = parser.parse_args()
+
+    # Imported here so --help works without building the agent
+    from jd_agent.batch import run_batch
+    from jd_agent.utils.metrics import dump_prometheus
+
+    # Batch progress is logged at INFO; show it unless a level was chosen explicitly
+    if "JD_AGENT_LOG_LEVEL" not in os.environ:
+        logging.getLogger("jd_agent.batch").setLevel(logging.INFO)
+
+    summary = run_batch(
+        args.input,
+        args.output,
+        concurrency=args.concurrency,
+        resume=not args.no_resume,
+    )
+
+    if args.metrics:
+        dump_prometheus(args.metrics)
+        print(f"📈 Metrics written to {args.metrics}")
+
+    return 0 if summary["error"] == 0 else 1
 
 
 if __name__ == "__main__":
-    main()
+    raise SystemExit(main())